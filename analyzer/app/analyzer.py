@@ -1,137 +1,481 @@
-import os
-import json
 import logging
+import os
+import signal
+import sys
 import time
 from datetime import datetime, timezone
+from functools import partial
 
 from kafka import KafkaConsumer
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from kafka.errors import NoBrokersAvailable
+
+# Shared components from python/analyzer and python/wizard (on PYTHONPATH in the image)
+from analyzer.batching import next_offsets
+from analyzer.columnar import ParquetSink
+from analyzer.dedup import Deduplicator
+from analyzer.writer import ResultWriter
+from wizard.core.baselines import BaselineStore
+from wizard.core.features import FeatureStore, feature_fields
+from wizard.core.rules import rule_engine
+from wizard.models import EVENT_TELEMETRY, AnalysisResult, CollectorEvent, normalize_event
+from wizard.settings import get_settings, settings_store
+from wizard.transport import DECODE_ERRORS, decode_message
+from wizard.utils.clients import Backoff, Unavailable, kafka_consumer_options, registry, retry
+from wizard.utils.health import HealthServer
+from wizard.utils.logging import set_level, setup_logging
 
 # --- Configuration ---
-KAFKA_BROKERS = os.getenv('KAFKA_BROKERS', 'kafka:9092').split(',')
-KAFKA_INPUT_TOPIC = os.getenv('KAFKA_INPUT_TOPIC', 'events').strip()
-MONGO_URI = os.getenv('MONGO_URI', 'mongodb://mongo:27017/').strip()
-MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'wizard_analysis').strip()
+# Every setting comes from wizard.settings: config/config.yaml, the
+# config/<WIZARD_ENV>/config.yaml overlay, then environment variables
+# (KAFKA_BROKERS, KAFKA_INPUT_TOPIC, MONGO_URI, MONGO_DB_NAME, ANALYZER_*).
+# Notable ones:
+#   pipeline.connect_timeout      seconds to retry (with backoff from 0.1s) an
+#                                 unreachable Kafka or MongoDB before the attempt
+#                                 counts as a fatal error
+#   service.restart_backoff_max   upper bound of the delay between restarts
+#   service.health_port           /health and /ready port (0 disables them); /ready
+#                                 answers 200 once MongoDB and Kafka are set up
+#   pipeline.mode                 "stream" processes one message at a time;
+#                                 "parallel" analyzes polled batches on
+#                                 pipeline.workers processes; "partitioned" runs
+#                                 a lane per assigned partition
+#   writer.*                      stream mode buffers results and writes them in
+#                                 bulk; the other modes write each batch
+#   columnar.*                    optional Parquet copy of the stored results
+#   baselines.*                   per-service latency baselines for TELEMETRY
+#                                 scoring, optionally snapshotted to a file
+#   features.*                    per-user history of the velocity rules,
+#                                 optionally snapshotted to a file
+#   inference.*                   optional model score blended into the rule
+#                                 score (no model_path: rules only)
+# Batch sizes, write buffering and the log level are re-read while the
+# service runs (main() watches the YAML files); the rest needs a restart.
 MONGO_COLLECTION_NAME = 'results'
 
-# --- Setup Logging ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# --- Scoring Rules ---
+# Compiled from config/rules/analyzer.yaml; the file is watched for changes
+# while the service runs. Parallel-mode workers keep the rules they started with.
+ANALYZER_RULES = rule_engine('analyzer')
+
+# --- Latency Baselines ---
+# Per-service (else per-user) latency history, set up by Analyzer() from the
+# `baselines` settings; None while disabled. Parallel-mode workers start from
+# the last snapshot (see init_worker) and keep their own (not snapshotted).
+LATENCY_BASELINES = None
+
+# --- Per-user Features ---
+# History for the velocity rules, set up by Analyzer() from the `features`
+# settings; None while disabled. Parallel-mode workers start from the last
+# snapshot (see init_worker) and keep their own (not snapshotted).
+USER_FEATURES = None
+
+# --- Model Inference ---
+# Set up by Analyzer() from the `inference` settings; None without a model.
+# Stream mode scores each event through the stage's micro-batcher; the
+# parallel and partitioned modes score each chunk with one forward pass
+# (model_scores). Parallel-mode workers load the model themselves (init_worker).
+MODEL_INFERENCE = None
+
+# Logging is configured by main(), so importing this module has no side effects
 logger = logging.getLogger('AnalyzerService')
 
+def latency_fields(event: CollectorEvent) -> dict:
+    """
+    The payload of a TELEMETRY event plus latency_z and latency_ratio, its
+    deviation from the key's latency baseline, for the rules. The latency is
+    added to the baseline afterwards. The payload is returned as is while
+    the key has no baseline yet.
+    """
+    baselines = LATENCY_BASELINES
+    latency = event.data.get('latency_ms')
+    key = event.source_service or event.user_id
+    if baselines is None or key is None or isinstance(latency, bool) or not isinstance(latency, (int, float)):
+        return event.data
+    deviation = baselines.observe(key, float(latency), event.timestamp)
+    if deviation is None:
+        return event.data
+    return {**event.data, 'latency_z': deviation.z, 'latency_ratio': deviation.ratio}
+
+
+def load_baselines(settings):
+    """The latency baselines configured by settings.baselines, restored from its snapshot_path if one exists."""
+    baselines = BaselineStore(
+        alpha=settings.alpha,
+        quantile=settings.quantile,
+        min_samples=settings.min_samples,
+        max_keys=settings.max_keys,
+        ttl_seconds=settings.ttl_s,
+    )
+    if settings.snapshot_path and os.path.exists(settings.snapshot_path):
+        try:
+            baselines.restore(settings.snapshot_path)
+            logger.info(f"Restored {len(baselines)} latency baselines.")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to restore latency baselines from {settings.snapshot_path}: {e}")
+    return baselines
+
+
+def init_worker():
+    """
+    Sets up a parallel-mode worker process. Workers are started by a fork
+    server, not forked from the service, so the baselines, feature store and
+    model are rebuilt here from the settings (the first two restored from
+    their last snapshot).
+    """
+    global LATENCY_BASELINES, USER_FEATURES, MODEL_INFERENCE
+    settings = get_settings()
+    setup_logging(settings.service.log_level, queued=False,
+                  formatter=logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    LATENCY_BASELINES = load_baselines(settings.baselines) if settings.baselines.enabled else None
+    USER_FEATURES = FeatureStore.from_settings(settings)
+    MODEL_INFERENCE = None
+    if settings.inference.model_path:
+        from wizard.core.inference import InferenceStage
+
+        MODEL_INFERENCE = InferenceStage.from_settings(settings)
+
+
+def model_scores(events) -> list:
+    """
+    The model scores of a batch of events, in one forward pass
+    (InferenceStage.predict), for run_analysis(event, model_score).
+
+    Kept at module level so worker processes can run it.
+    """
+    return MODEL_INFERENCE.predict([normalize_event(event) for event in events]).tolist()
+
+
+def run_analysis(event, model_score=None) -> AnalysisResult:
+    """
+    Simulated business logic: runs analysis on the event.
+
+    With a model (MODEL_INFERENCE), its score is blended into the rule score
+    before the tier is assigned: `model_score` when given (see model_scores),
+    else the event is scored through the stage's micro-batcher.
+
+    Kept at module level (no instance state) so worker processes can run it.
+    """
+    event = normalize_event(event)
+    data = latency_fields(event) if event.type == EVENT_TELEMETRY else event.data
+    data = feature_fields(USER_FEATURES, event, data)
+    rules = ANALYZER_RULES.current
+    score, labels = rules.evaluate(event.type, data)
+    stage = MODEL_INFERENCE
+    if stage is not None:
+        score = stage.blend(score, stage.score(event) if model_score is None else model_score)
+    score, labels, detail_message = rules.finalize(event.type, score, labels)
+
+    return AnalysisResult(
+        event_id=event.id,
+        user_id=event.user_id,
+        score=score,
+        labels=labels,
+        detail_message=detail_message,
+        processed_at=datetime.now(timezone.utc),
+        event_type=event.type,
+        rules=rules.name,
+    )
+
+
 class Analyzer:
     """
     Consumes events from Kafka, runs a simulated analysis, and persists results to MongoDB.
     """
     def __init__(self):
+        self.settings = get_settings()
+        self._pipeline = None
+
         # 1. MongoDB Setup
         self.mongo_client = None
         self.mongo_collection = None
-        # Give infrastructure services time to start before connecting
-        time.sleep(5) 
         self._setup_mongodb()
 
-        # 2. Kafka Consumer Setup
+        # 2. Redelivered events are skipped before analysis in stream mode (the
+        # other modes commit after every write; the unique event_id index
+        # absorbs their redeliveries)
+        self.dedup = None
+        if self.settings.pipeline.mode == 'stream':
+            self.dedup = Deduplicator.from_settings(self.settings, self.mongo_collection.database)
+
+        # 3. Kafka Consumer Setup
         self.consumer = self._setup_kafka_consumer()
 
+        # 4. Latency baselines, restored from the last snapshot
+        self._setup_baselines()
+        self._setup_features()
+        self._setup_inference()
+
+        # 5. Pick up rule and tuning changes without a redeploy
+        ANALYZER_RULES.watch(self.settings.service.rules_reload_interval)
+        settings_store.on_reload(self.apply_settings)
+
+    def apply_settings(self, settings):
+        """Applies reloaded batch sizes and write buffering to the writer and the running pipeline."""
+        self.settings = settings
+        self.writer.tune(
+            flush_size=settings.writer.flush_size,
+            flush_interval=settings.writer.flush_ms / 1000.0,
+            max_buffer=settings.writer.buffer_size,
+            max_retries=settings.writer.retries,
+        )
+        if self.dedup is not None:
+            self.dedup.save_interval = settings.dedup.save_ms / 1000.0
+        if LATENCY_BASELINES is not None:
+            baselines = settings.baselines
+            LATENCY_BASELINES.tune(alpha=baselines.alpha, quantile=baselines.quantile,
+                                   min_samples=baselines.min_samples)
+        if MODEL_INFERENCE is not None:
+            MODEL_INFERENCE.apply_settings(settings)
+        if self._pipeline is not None:
+            self._pipeline.tune(batch_size=settings.pipeline.batch_size, linger_ms=settings.pipeline.linger_ms,
+                                max_pending=settings.pipeline.lane_max_pending)
+        logger.info(f"Applied settings (batch_size={settings.pipeline.batch_size}, "
+                    f"flush_size={settings.writer.flush_size}).")
+
+    def _setup_baselines(self):
+        """
+        Creates the process-wide latency baselines (kept across restarts of
+        the main loop), restoring them from baselines.snapshot_path, and starts
+        their periodic snapshots.
+        """
+        global LATENCY_BASELINES
+        settings = self.settings.baselines
+        if not settings.enabled:
+            LATENCY_BASELINES = None
+            return
+        if LATENCY_BASELINES is None:
+            LATENCY_BASELINES = load_baselines(settings)
+        if settings.snapshot_path:
+            LATENCY_BASELINES.persist(settings.snapshot_path, settings.snapshot_s)
+
+    def _setup_features(self):
+        """
+        Creates the process-wide feature store (kept across restarts of the
+        main loop), restored from features.snapshot_path, and starts its
+        periodic snapshots.
+        """
+        global USER_FEATURES
+        settings = self.settings.features
+        if USER_FEATURES is None or not settings.enabled:
+            USER_FEATURES = FeatureStore.from_settings(self.settings)
+        if USER_FEATURES is not None and settings.snapshot_path:
+            USER_FEATURES.persist(settings.snapshot_path, settings.snapshot_s)
+
+    def _setup_inference(self):
+        """Loads the model of inference.model_path (if any); run() closes it on exit."""
+        global MODEL_INFERENCE
+        MODEL_INFERENCE = None
+        if not self.settings.inference.model_path:
+            return
+        # Imported only with a model: NumPy (and the model runtime) stay off
+        # the cold-start path of the rules-only service
+        from wizard.core.inference import InferenceStage
+
+        MODEL_INFERENCE = InferenceStage.from_settings(self.settings)
+
     def _setup_mongodb(self):
-        """Initializes MongoDB connection and collection handle."""
+        """
+        Waits (pinging with backoff) for MongoDB and takes the collection handle
+        from the process-wide client, which is reused across restarts.
+        """
+        database, writer = self.settings.database, self.settings.writer
         try:
-            # Set serverSelectionTimeoutMS low since we rely on docker-compose depends_on for basic startup
-            self.mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000) 
-            # The ismaster command is a lightweight way to check connection
-            self.mongo_client.admin.command('ismaster') 
-            db = self.mongo_client[MONGO_DB_NAME]
+            self.mongo_client = registry.wait_for_mongo(database.mongodb_uri,
+                                                        timeout=self.settings.pipeline.connect_timeout)
+            db = self.mongo_client[database.name_analysis]
             self.mongo_collection = db[MONGO_COLLECTION_NAME]
-            logger.info(f"Successfully connected to MongoDB database: {MONGO_DB_NAME}")
-        except ConnectionFailure as e:
-            logger.error(f"Failed to connect to MongoDB at {MONGO_URI}: {e}")
+            self.writer = ResultWriter(
+                self.mongo_collection,
+                upsert=writer.upsert,
+                flush_size=writer.flush_size,
+                flush_interval=writer.flush_ms / 1000.0,
+                max_buffer=writer.buffer_size,
+                max_retries=writer.retries,
+                sink=ParquetSink.from_settings(self.settings),
+            )
+            logger.info(f"Successfully connected to MongoDB database: {database.name_analysis}")
+        except Unavailable as e:
+            logger.error(f"Failed to connect to MongoDB at {database.mongodb_uri}: {e}")
             raise
 
     def _setup_kafka_consumer(self):
-        """Initializes the Kafka Consumer."""
+        """Initializes the Kafka Consumer, retrying with backoff while no broker answers."""
+        # The parallel and partitioned pipelines commit manually after each
+        # write. Values are decoded by the service since a header may select
+        # the wire format.
+        kafka, pipeline = self.settings.kafka, self.settings.pipeline
+        manual_commit = pipeline.mode in ('parallel', 'partitioned')
         try:
-            consumer = KafkaConsumer(
-                KAFKA_INPUT_TOPIC,
-                bootstrap_servers=KAFKA_BROKERS,
-                group_id='analyzer-group',
-                auto_offset_reset='earliest',
-                value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+            consumer = retry(
+                partial(
+                    KafkaConsumer,
+                    kafka.topic_events,
+                    **kafka_consumer_options(
+                        bootstrap_servers=kafka.brokers,
+                        group_id=kafka.group_id,
+                        auto_offset_reset='earliest',
+                        enable_auto_commit=not manual_commit,
+                    ),
+                ),
+                "Kafka broker",
+                retry_on=(NoBrokersAvailable,),
+                timeout=pipeline.connect_timeout,
             )
-            logger.info(f"Kafka consumer set up for topic: {KAFKA_INPUT_TOPIC}")
+            logger.info(f"Kafka consumer set up for topic: {kafka.topic_events}")
             return consumer
         except Exception as e:
             logger.error(f"Failed to set up Kafka consumer: {e}")
             raise
 
-    def _run_analysis(self, event: dict) -> dict:
+    def _run_analysis(self, event: CollectorEvent) -> AnalysisResult:
         """
         Simulated business logic: runs analysis on the event.
         """
-        user_id = event.get('user_id')
-        event_type = event.get('type')
-        event_id = event.get('id')
-        
-        score = 0.0
-        labels = ["normal"]
-        detail_message = f"Basic processing for {event_type} event."
-
-        if event_type == "PURCHASE":
-            score = 0.9
-            labels = ["transaction", "high_value"]
-        elif event_type == "TELEMETRY":
-            latency = event.get('data', {}).get('latency_ms', 0)
-            if latency > 100:
-                score = 0.5
-                labels = ["telemetry", "high_latency"]
-        
-        # Define the analysis result structure (matches the Go model)
-        result = {
-            "event_id": event_id,
-            "user_id": user_id, 
-            "score": score,
-            "labels": labels,
-            "detail_message": detail_message,
-            "processed_at": datetime.now(timezone.utc).isoformat()
-        }
-        return result
-
-    def _persist_result(self, result: dict):
-        """Saves the analysis result to MongoDB."""
-        try:
-            # Ensure we only try to persist if the collection handle is ready
-            if self.mongo_collection:
-                insert_result = self.mongo_collection.insert_one(result)
-                logger.info(f"Analysis result persisted: ID={insert_result.inserted_id}, EventID={result['event_id']}")
-            else:
-                logger.error("MongoDB collection handle is not initialized. Cannot persist data.")
-        except OperationFailure as e:
-            logger.error(f"MongoDB persistence failed for event {result['event_id']}: {e}")
+        return run_analysis(event)
+
+    def _persist_result(self, result: AnalysisResult):
+        """Queues the analysis result for the next bulk write to MongoDB (write-behind)."""
+        self.writer.add(result.to_document())
             
+    def _persist_batch(self, results: list) -> bool:
+        """Saves a batch of AnalysisResults with one unordered bulk write (retrying transient errors)."""
+        if not self.writer.write([result.to_document() for result in results]):
+            return False
+        logger.info(f"Persisted batch of {len(results)} analysis results.")
+        return True
+
+    def run_parallel(self):
+        """Worker-pool loop; SIGTERM/SIGINT drain in-flight batches before exiting."""
+        # Pipelines are imported by the mode that uses them, off the cold-start path
+        from analyzer.workers import ParallelPipeline
+
+        settings = self.settings.pipeline
+        pipeline = self._pipeline = ParallelPipeline(
+            self.consumer,
+            run_analysis,
+            self._persist_batch,
+            workers=settings.worker_count,
+            batch_size=settings.batch_size,
+            linger_ms=settings.linger_ms,
+            decode=partial(decode_message, default_format=settings.wire_format, typed=True),
+            model_scores=model_scores if MODEL_INFERENCE is not None else None,
+            initializer=init_worker,
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: pipeline.stop())
+        pipeline.run()
+
+    def run_partitioned(self):
+        """One lane per assigned partition; SIGTERM/SIGINT drain and commit every lane before exiting."""
+        from analyzer.lanes import PartitionLanes
+
+        settings = self.settings.pipeline
+        pipeline = self._pipeline = PartitionLanes(
+            self.consumer,
+            run_analysis,
+            self._persist_batch,
+            batch_size=settings.batch_size,
+            max_pending=settings.lane_max_pending,
+            decode=partial(decode_message, default_format=settings.wire_format, typed=True),
+            model_scores=model_scores if MODEL_INFERENCE is not None else None,
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: pipeline.stop())
+        pipeline.run()
+
     def run(self):
-        """Main loop to consume and process messages."""
+        """
+        Main loop; ensures result indexes first, and on exit flushes buffered
+        results and leaves the consumer group.
+        """
+        global MODEL_INFERENCE
+        self.writer.start()
+        if self.dedup is not None and self.dedup.watermarks is not None:
+            self.dedup.watermarks.load()
+        try:
+            mode = self.settings.pipeline.mode
+            if mode == 'parallel':
+                return self.run_parallel()
+            if mode == 'partitioned':
+                return self.run_partitioned()
+            return self.run_stream()
+        finally:
+            if self.writer.close() and self.dedup is not None:
+                self.dedup.checkpoint(force=True)
+            if MODEL_INFERENCE is not None:
+                MODEL_INFERENCE.close()
+                MODEL_INFERENCE = None
+            if LATENCY_BASELINES is not None:
+                LATENCY_BASELINES.stop_persisting(self.settings.baselines.snapshot_path)
+            if USER_FEATURES is not None:
+                USER_FEATURES.stop_persisting(self.settings.features.snapshot_path)
+            self.consumer.close()
+
+    def run_stream(self):
+        """Per-message loop; results are written behind in bulk by the ResultWriter."""
+        # Exit through the finally in run() so buffered results are flushed
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
         logger.info("Analyzer Service started. Waiting for messages...")
+        wire_format = self.settings.pipeline.wire_format
         
         for message in self.consumer:
-            event = message.value
-            logger.info(f"Received event {event.get('id')} of type {event.get('type')} from partition {message.partition}")
+            if self.dedup is not None and not self.dedup.fresh_records((message,)):
+                continue
+            try:
+                event = normalize_event(decode_message(message.value, message.headers, wire_format, typed=True))
+            except DECODE_ERRORS as e:
+                logger.error(f"Failed to decode message from partition {message.partition}: {e}")
+                continue
+            if self.dedup is not None and self.dedup.duplicate(event.id):
+                logger.info(f"Skipped redelivered event {event.id} from partition {message.partition}")
+                continue
+            logger.info(f"Received event {event.id} of type {event.type} from partition {message.partition}")
             
             try:
                 analysis_result = self._run_analysis(event)
                 self._persist_result(analysis_result)
+                if self.dedup is not None:
+                    self.dedup.stored((event.id,), next_offsets((message,)))
+                    self.dedup.checkpoint(self.writer.flush)
                 
             except Exception as e:
                 logger.error(f"An unexpected error occurred during processing: {e}", exc_info=True)
 
 
-if __name__ == '__main__':
-    # Give services a brief moment to start up (if depends_on failed us)
-    time.sleep(10) 
-    
+def main():
+    """
+    Service entry point. Dependencies that are still starting are waited for
+    inside Analyzer() (with backoff); the pod reports ready as soon as they
+    answer. Restarts after a fatal error back off exponentially up to
+    service.restart_backoff_max; a run that lasted a minute starts over quickly.
+    """
+    settings = get_settings()
+    # Records are formatted and written on a background thread (see setup_logging)
+    setup_logging(settings.service.log_level,
+                  formatter=logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    settings_store.on_reload(lambda settings: set_level(settings.service.log_level))
+    settings_store.watch()
+    port = settings.service.health_port
+    health = HealthServer(port).start() if port else None
+    restarts = Backoff(maximum=settings.service.restart_backoff_max)
     while True:
+        started = time.monotonic()
         try:
             analyzer = Analyzer()
+            if health is not None:
+                health.set_ready()
             analyzer.run()
+            # Pipelines return after a graceful drain (SIGTERM/SIGINT)
+            return
         except Exception as e:
-            logger.error(f"Main Analyzer loop encountered a fatal error: {e}. Retrying in 5 seconds...")
-            time.sleep(5)
+            if health is not None:
+                health.set_ready(False)
+            if time.monotonic() - started > 60:
+                restarts.reset()
+            delay = restarts.next()
+            logger.error(f"Main Analyzer loop encountered a fatal error: {e}. Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+
+if __name__ == '__main__':
+    main()
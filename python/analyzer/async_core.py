@@ -0,0 +1,259 @@
+# Wizard/python/analyzer/async_core.py
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aiokafka import AIOKafkaConsumer
+from aiokafka.errors import KafkaConnectionError
+from aiokafka.structs import TopicPartition
+
+from wizard.settings import get_settings, settings_store
+from wizard.utils.clients import async_retry, registry
+from . import metrics
+from .columnar import ParquetSink
+from .core import analyze_all, decode_records, run_analysis, unique_events
+from .dedup import Deduplicator
+from .utils import load_analyzer_config
+from .writer import AsyncResultWriter
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAnalyzerCore:
+    """
+    asyncio-native variant of AnalyzerCore built on aiokafka and motor.
+
+    Batches are fetched with getmany() on the event loop, one batch per
+    partition. Decoding and analysis (CPU work) run on a thread pool through
+    the same steps as AnalyzerCore's batch mode, including the Deduplicator;
+    results are written with motor bulk writes (AsyncResultWriter: retries,
+    indexes and the Parquet sink of ResultWriter). Up to `max_in_flight`
+    batches are processed concurrently; once that limit is reached the loop
+    stops fetching until the oldest one finishes (backpressure). Batches of
+    one partition are processed one after the other, in offset order, since
+    analysis keeps per-key state. Offsets are committed (and event ids and
+    watermarks recorded as stored) strictly in fetch order and only for
+    batches that were durably written.
+    """
+
+    def __init__(self, consumer=None, collection=None, max_in_flight=None, on_persist=None):
+        """
+        Args:
+            consumer: Optional pre-built consumer (aiokafka API). Created from
+                the environment on start() when omitted.
+            collection: Optional pre-built results collection (motor API).
+                Watermarks are not persisted with an injected collection.
+            max_in_flight: Maximum concurrent batches
+                (defaults to ANALYZER_MAX_IN_FLIGHT).
+            on_persist: Optional callable(documents) run after each durable
+                batch write, e.g. to invalidate cached results.
+        """
+        config = load_analyzer_config()
+        self.kafka_broker = config['KAFKA_BROKER']
+        self.kafka_topic = config['KAFKA_TOPIC']
+        self.kafka_group_id = config['KAFKA_GROUP_ID']
+        self.mongodb_uri = config['MONGODB_URI']
+        self.mongodb_db_analysis = config['MONGODB_ANALYSIS_DB']
+        self.batch_size = config['BATCH_SIZE']
+        self.batch_linger_ms = config['BATCH_LINGER_MS']
+        self.max_in_flight = max_in_flight or config['MAX_IN_FLIGHT']
+        self.wire_format = config['WIRE_FORMAT']
+        self.connect_timeout = config['CONNECT_TIMEOUT']
+
+        self.consumer = consumer
+        self.on_persist = on_persist
+        self._owns_consumer = consumer is None
+        database = None
+        if collection is None:
+            # The process-wide motor client, shared with the API's read path.
+            # Watermarks are saved (rarely, on the thread pool) with the
+            # pooled pymongo client.
+            collection = registry.async_mongo(self.mongodb_uri)[self.mongodb_db_analysis]['results']
+            database = registry.mongo(self.mongodb_uri)[self.mongodb_db_analysis]
+        self.writer = AsyncResultWriter(
+            collection,
+            upsert=config['WRITE_UPSERT'],
+            max_retries=config['WRITE_RETRIES'],
+            sink=ParquetSink.from_settings(get_settings()),
+        )
+        self.dedup = Deduplicator.from_settings(get_settings(), database)
+        self._executor = None
+        self._slots = None
+        self._pending = deque()
+        self._last_batches = {}  # TopicPartition -> task of its latest batch
+        self._stopping = None
+        self._task = None
+        settings_store.on_reload(self.apply_settings)
+
+    def apply_settings(self, settings):
+        """Applies reloaded batch size, linger and write settings from the next fetch on."""
+        config = load_analyzer_config(settings)
+        self.batch_size = config['BATCH_SIZE']
+        self.batch_linger_ms = config['BATCH_LINGER_MS']
+        if self.dedup is not None:
+            self.dedup.save_interval = config['DEDUP_SAVE_MS'] / 1000.0
+        self.writer.tune(max_retries=config['WRITE_RETRIES'])
+
+    @property
+    def results_collection(self):
+        """The results collection (written through self.writer)."""
+        return self.writer.collection
+
+    async def start(self):
+        """Connects (if needed) and starts the consume loop as a background task."""
+        if self.consumer is None:
+            self.consumer = await async_retry(self._start_consumer, "Kafka broker",
+                                              retry_on=(KafkaConnectionError,), timeout=self.connect_timeout)
+            logger.info(f"Async Kafka consumer started for topic '{self.kafka_topic}' on broker: {self.kafka_broker}")
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="async-analyzer")
+        await self.writer.ensure_indexes()
+        if self.dedup is not None and self.dedup.watermarks is not None:
+            await self._in_executor(self.dedup.watermarks.load)
+
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def _start_consumer(self):
+        consumer = AIOKafkaConsumer(
+            self.kafka_topic,
+            bootstrap_servers=self.kafka_broker,
+            group_id=self.kafka_group_id,
+            auto_offset_reset='latest',
+            enable_auto_commit=False,
+            retry_backoff_ms=100,
+            metadata_max_age_ms=30_000,
+        )
+        try:
+            await consumer.start()
+        except KafkaConnectionError:
+            await consumer.stop()
+            raise
+        return consumer
+
+    def _in_executor(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def stop(self):
+        """Stops fetching, drains in-flight batches and stops an owned consumer."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await self.writer.close()
+        if self.dedup is not None:
+            await self._in_executor(partial(self.dedup.checkpoint, force=True))
+        self._executor.shutdown()
+        self._executor = None
+        if self._owns_consumer:
+            await self.consumer.stop()
+        logger.info("Async analyzer pipeline stopped.")
+
+    async def run(self):
+        """Fetch/analyze/write loop; runs until stop() is requested, then drains."""
+        logger.info(f"Async analyzer pipeline running (batch_size={self.batch_size}, max_in_flight={self.max_in_flight})...")
+        while not self._stopping.is_set():
+            try:
+                polled = await self.consumer.getmany(timeout_ms=self.batch_linger_ms, max_records=self.batch_size)
+            except Exception as e:
+                logger.error(f"Failed to fetch from Kafka: {e}")
+                await asyncio.sleep(self.batch_linger_ms / 1000.0)
+                continue
+            for tp, records in polled.items():
+                if not records:
+                    continue
+                # Backpressure: wait for a free slot before taking on more work.
+                await self._slots.acquire()
+                metrics.observe_batch(records)
+                task = asyncio.create_task(self._write_batch(records, self._last_batches.get(tp)))
+                self._last_batches[tp] = task
+                self._pending.append((records, task))
+                metrics.BATCHES_IN_FLIGHT.inc()
+            await self._commit_completed(block=False)
+        await self._commit_completed(block=True)
+
+    async def _write_batch(self, records, previous=None):
+        """
+        Analyzes one partition's batch on the thread pool once the partition's
+        previous batch (`previous`, a task of this method) is done, then
+        stores the results. A batch after a failed one is not processed: it
+        is rewound with it.
+
+        Returns:
+            list: The ids of the stored events (possibly empty), or None if the
+                batch failed.
+        """
+        try:
+            if previous is not None and await previous is None:
+                return None
+            events, results = await self._in_executor(self._analyze_batch, records)
+            if results:
+                if not await self.writer.write(results):
+                    return None
+                logger.info(f"Persisted batch of {len(results)} documents.")
+                if self.on_persist is not None:
+                    self.on_persist(results)
+            return [event.id for event in events]
+        except Exception as e:
+            logger.error(f"Failed to process a batch of {len(records)} records: {e}")
+            return None
+        finally:
+            self._slots.release()
+
+    def _analyze_batch(self, records):
+        """Skips, decodes and analyzes one batch (on the thread pool). Returns (events, results)."""
+        fresh = self.dedup.fresh_records(records) if self.dedup is not None else records
+        events = unique_events(decode_records(fresh, self.wire_format), self.dedup)
+        return events, analyze_all(events, run_analysis)
+
+    async def _commit_completed(self, block):
+        """Commits finished batches in fetch order; rewinds on the first failed write."""
+        while self._pending and (block or self._pending[0][1].done()):
+            records, task = self._pending[0]
+            event_ids = await task
+            if event_ids is None:
+                metrics.PERSIST_FAILURES.inc()
+                await self._abort_pending()
+                return
+            self._pending.popleft()
+            metrics.BATCHES_IN_FLIGHT.dec()
+            offsets = self._next_offsets(records)
+            for tp in offsets:
+                if self._last_batches.get(tp) is task:
+                    del self._last_batches[tp]
+            if self.dedup is not None:
+                # In commit order: a watermark must never pass an unwritten batch
+                self.dedup.stored(event_ids, offsets)
+                await self._in_executor(self.dedup.checkpoint)
+            try:
+                await self.consumer.commit(offsets)
+            except Exception as e:
+                # The batch is already stored; an uncommitted batch is simply redelivered.
+                logger.error(f"Failed to commit offsets: {e}")
+
+    async def _abort_pending(self):
+        """Waits for every in-flight write, then seeks back to the oldest uncommitted record."""
+        first_offsets = {}
+        for records, task in self._pending:
+            await task
+            for record in records:
+                tp = TopicPartition(record.topic, record.partition)
+                first_offsets[tp] = min(record.offset, first_offsets.get(tp, record.offset))
+        metrics.BATCHES_IN_FLIGHT.dec(len(self._pending))
+        self._pending.clear()
+        self._last_batches.clear()
+        for tp, offset in first_offsets.items():
+            self.consumer.seek(tp, offset)
+        logger.warning(f"Rewound {len(first_offsets)} partitions after a failed write.")
+
+    @staticmethod
+    def _next_offsets(records):
+        offsets = {}
+        for record in records:
+            tp = TopicPartition(record.topic, record.partition)
+            offsets[tp] = max(record.offset + 1, offsets.get(tp, 0))
+        return offsets
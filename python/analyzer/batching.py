@@ -0,0 +1,73 @@
+# Wizard/python/analyzer/batching.py
+
+import time
+from kafka import TopicPartition
+from kafka.structs import OffsetAndMetadata
+from pymongo.errors import BulkWriteError
+
+# MongoDB error code for duplicate key violations
+DUPLICATE_KEY_ERROR = 11000
+
+
+def poll_batch(consumer, batch_size, linger_ms):
+    """
+    Polls the consumer until batch_size records are buffered or linger_ms expires.
+
+    Returns:
+        list: The polled ConsumerRecords, in partition order as returned by poll.
+    """
+    records = []
+    deadline = time.monotonic() + linger_ms / 1000.0
+    while len(records) < batch_size:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            break
+        polled = consumer.poll(timeout_ms=remaining_ms, max_records=batch_size - len(records))
+        for partition_records in polled.values():
+            records.extend(partition_records)
+    return records
+
+
+def next_offsets(records):
+    """
+    Computes the offset to commit for every partition: one past its last record.
+
+    Returns:
+        dict: TopicPartition -> OffsetAndMetadata
+    """
+    offsets = {}
+    for record in records:
+        tp = TopicPartition(record.topic, record.partition)
+        if tp not in offsets or record.offset + 1 > offsets[tp].offset:
+            offsets[tp] = OffsetAndMetadata(record.offset + 1, None)
+    return offsets
+
+
+def rewind(consumer, records):
+    """
+    Seeks every partition present in records back to its first record.
+    """
+    first_offsets = {}
+    for record in records:
+        tp = TopicPartition(record.topic, record.partition)
+        first_offsets[tp] = min(record.offset, first_offsets.get(tp, record.offset))
+    for tp, offset in first_offsets.items():
+        consumer.seek(tp, offset)
+
+
+def insert_batch(collection, documents):
+    """
+    Writes documents with a single unordered insert_many.
+
+    Duplicate key errors are tolerated since the document is already stored
+    (e.g. a redelivered batch). Any other write error is re-raised.
+    """
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        failed = [
+            err for err in e.details.get('writeErrors', [])
+            if err.get('code') != DUPLICATE_KEY_ERROR
+        ]
+        if failed or e.details.get('writeConcernErrors'):
+            raise
@@ -0,0 +1,240 @@
+# Wizard/python/analyzer/columnar.py
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from wizard.models.stored import detail_message, label_codes
+
+logger = logging.getLogger(__name__)
+
+# Columns of the result files; fields of either result shape (analyzer.core's
+# analysis_type documents, AnalysisResult's scored ones) absent from a
+# document are null. Low-cardinality strings are dictionary-encoded. Compact
+# documents (wizard.models.stored) are written in the API shape: label names
+# and the derived detail message.
+STRING, DICTIONARY, LABELS, FLOAT, TIMESTAMP, JSON_TEXT = "string", "dictionary", "labels", "float", "ts", "json"
+COLUMNS = (
+    ("event_id", STRING),
+    ("user_id", STRING),
+    ("original_action", DICTIONARY),
+    ("analysis_type", DICTIONARY),
+    ("score", FLOAT),
+    ("labels", LABELS),
+    ("detail_message", DICTIONARY),
+    ("event_time", TIMESTAMP),
+    ("processed_at", TIMESTAMP),
+    ("event_details", JSON_TEXT),
+)
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The Parquet result sink needs the pyarrow package (pip install pyarrow).") from None
+    return pyarrow
+
+
+def arrow_schema():
+    """The Arrow schema of the result files."""
+    pa = _arrow()
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        STRING: pa.string(),
+        DICTIONARY: dictionary,
+        LABELS: pa.list_(dictionary),
+        FLOAT: pa.float64(),
+        TIMESTAMP: pa.timestamp("us", tz="UTC"),
+        JSON_TEXT: pa.string(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+def to_datetime(value):
+    """A UTC datetime from a datetime, an ISO 8601 string or epoch seconds; None otherwise."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc)
+    if not isinstance(value, datetime):
+        return None
+    # Naive values are UTC, as in MongoDB
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _column_value(kind, value):
+    if value is None:
+        return None
+    if kind == TIMESTAMP:
+        return to_datetime(value)
+    if kind == JSON_TEXT:
+        return json.dumps(value, default=str, separators=(",", ":"))
+    if kind == LABELS:
+        return label_codes().decode(value)
+    if kind == FLOAT:
+        return float(value)
+    return str(value)
+
+
+class _OpenFile:
+    """A Parquet file being written (under a .tmp name until it is closed)."""
+
+    def __init__(self, writer, path, tmp_path):
+        self.writer = writer
+        self.path = path
+        self.tmp_path = tmp_path
+        self.opened = time.monotonic()
+        self.rows = 0
+
+    def size(self):
+        try:
+            return os.path.getsize(self.tmp_path)
+        except OSError:
+            return 0
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ParquetSink:
+    """
+    Columnar copy of the stored results, for offline analytics.
+
+    Results are buffered column by column and written as Arrow record batches
+    (one Parquet row group each, at most `batch_rows` rows) to rolling files
+    in `directory`/date=YYYY-MM-DD/, partitioned by processed_at. A file is
+    closed once it reaches `roll_bytes` or is `roll_seconds` old, or when the
+    sink closes; files are written under a .tmp name and renamed when
+    complete, so scans only ever see whole files (e.g.
+    pyarrow.dataset.dataset(directory, partitioning="hive")). Rows are
+    buffered for at most `flush_seconds` before being written.
+
+    `labels`, `analysis_type` and the other low-cardinality strings are
+    dictionary-encoded, timestamps are native UTC timestamps and the event
+    payload is kept as JSON text. The sink mirrors what the ResultWriter
+    stored, so redelivered events can appear twice; deduplicate by event_id
+    when exactness matters.
+
+    Thread-safe: writers of several lanes may add concurrently.
+    """
+
+    def __init__(self, directory, batch_rows=10_000, roll_bytes=128 << 20, roll_seconds=3600.0,
+                 flush_seconds=60.0, compression="zstd"):
+        self._pa = _arrow()
+        self.schema = arrow_schema()
+        self.directory = directory
+        self.batch_rows = batch_rows
+        self.roll_bytes = roll_bytes
+        self.roll_seconds = roll_seconds
+        self.flush_seconds = flush_seconds
+        self.compression = compression
+        self.files_written = 0
+        self._buffers = {}  # date -> {column: [values]}
+        self._files = {}  # date -> _OpenFile
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._buffered_since = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        """The sink configured by settings.columnar, or None if it is disabled."""
+        columnar = settings.columnar
+        if not columnar.enabled:
+            return None
+        return cls(columnar.directory, batch_rows=columnar.batch_rows, roll_bytes=columnar.roll_mb << 20,
+                   roll_seconds=columnar.roll_s, flush_seconds=columnar.flush_s,
+                   compression=columnar.compression)
+
+    def __len__(self):
+        """Buffered rows not yet written."""
+        return sum(len(columns["event_id"]) for columns in self._buffers.values())
+
+    def add(self, documents):
+        """Buffers result documents; writes a record batch for every date holding batch_rows rows."""
+        with self._lock:
+            for document in documents:
+                processed_at = to_datetime(document.get("processed_at")) or datetime.now(timezone.utc)
+                date = processed_at.date().isoformat()
+                columns = self._buffers.get(date)
+                if columns is None:
+                    columns = self._buffers[date] = {name: [] for name, _ in COLUMNS}
+                    if self._buffered_since is None:
+                        self._buffered_since = time.monotonic()
+                for name, kind in COLUMNS:
+                    value = detail_message(document) if name == "detail_message" else document.get(name)
+                    columns[name].append(_column_value(kind, value))
+                if len(columns["event_id"]) >= self.batch_rows:
+                    self._write(date)
+            self._flush(force=False)
+
+    def flush(self, force=False):
+        """
+        Writes the buffered rows if they are flush_seconds old (or force is
+        set) and closes the files that are due to roll.
+        """
+        with self._lock:
+            self._flush(force)
+
+    def _flush(self, force):
+        since = self._buffered_since
+        if since is not None and (force or time.monotonic() - since >= self.flush_seconds):
+            for date in list(self._buffers):
+                self._write(date)
+        self._roll(due_only=True)
+
+    def close(self):
+        """Writes every buffered row and closes (publishes) all open files."""
+        with self._lock:
+            for date in list(self._buffers):
+                self._write(date)
+            self._roll(due_only=False)
+
+    def _write(self, date):
+        columns = self._buffers.pop(date)
+        if not self._buffers:
+            self._buffered_since = None
+        if not columns["event_id"]:
+            return
+        batch = self._pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        current = self._files.get(date)
+        if current is None:
+            current = self._files[date] = self._open(date)
+        current.writer.write_batch(batch)
+        current.rows += batch.num_rows
+        if current.size() >= self.roll_bytes:
+            self._close(date)
+
+    def _open(self, date):
+        partition = os.path.join(self.directory, f"date={date}")
+        os.makedirs(partition, exist_ok=True)
+        self._sequence += 1
+        name = f"results-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.getpid()}-{self._sequence}.parquet"
+        path = os.path.join(partition, name)
+        tmp_path = f"{path}.tmp"
+        writer = self._pa.parquet.ParquetWriter(tmp_path, self.schema, compression=self.compression)
+        return _OpenFile(writer, path, tmp_path)
+
+    def _roll(self, due_only):
+        now = time.monotonic()
+        for date, current in list(self._files.items()):
+            if due_only and current.size() < self.roll_bytes and now - current.opened < self.roll_seconds:
+                continue
+            self._close(date)
+
+    def _close(self, date):
+        current = self._files.pop(date)
+        try:
+            current.close()
+            self.files_written += 1
+            logger.info(f"Wrote {current.rows} results to {current.path}")
+        except OSError as e:
+            logger.error(f"Failed to close result file {current.tmp_path}: {e}")
@@ -1,37 +1,150 @@
 # Wizard/python/analyzer/core.py
 
-import json
-import os
 import logging
+import signal
+from functools import partial
 from kafka import KafkaConsumer
-from pymongo import MongoClient
-from datetime import datetime
+from kafka.errors import NoBrokersAvailable
+from datetime import datetime, timezone
 
-# Setup basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from wizard.models import normalize_event
+from wizard.models.stored import PAYLOAD_COPY, SCHEMA_VERSION
+from wizard.transport import DECODE_ERRORS, decode_message
+from wizard.settings import get_settings, settings_store
+from wizard.utils.clients import kafka_consumer_options, registry, retry
+from . import metrics
+from .batching import next_offsets, poll_batch, rewind
+from .columnar import ParquetSink
+from .dedup import Deduplicator
+from .utils import load_analyzer_config
+from .writer import ResultWriter
+
+# Logging is configured by the entry point (see setup_logging)
 logger = logging.getLogger(__name__)
 
+# results.payload, read on the first analysis of each process
+_payload_mode = None
+
+
+def _copy_payload():
+    global _payload_mode
+    if _payload_mode is None:
+        _payload_mode = get_settings().results.payload
+    return _payload_mode == PAYLOAD_COPY
+
+
+def run_analysis(event):
+    """
+    Performs basic analysis on the incoming event data.
+
+    Returns a version 1 result document (see wizard.models.stored): native UTC
+    timestamps, and the event payload in event_details unless results.payload
+    is "none". Kept at module level (no instance state) so worker processes
+    can run it.
+    """
+    # Accepts every event spelling in use (legacy UserID/Action, Go, proto)
+    event = normalize_event(event)
+    user_id = event.user_id if event.user_id is not None else 'unknown_user'
+    action = event.type if event.type is not None else 'unknown_action'
+    processed_at = datetime.now(timezone.utc)
+    event_time = datetime.fromtimestamp(event.timestamp, timezone.utc) if event.timestamp is not None else processed_at
+    
+    # Example analysis: Determine event type and score
+    event_type = "HighValue" if action in ["checkout", "add_to_cart"] else "LowValue"
+    
+    analysis = {
+        "v": SCHEMA_VERSION,
+        "event_id": event.id,
+        "user_id": user_id,
+        "original_action": action,
+        "event_time": event_time,
+        "analysis_type": event_type,
+        "processed_at": processed_at,
+    }
+    if _copy_payload():
+        analysis["event_details"] = event.data
+    
+    return analysis
+
+
+def decode_records(records, wire_format):
+    """
+    Decodes raw record values (JSON or protobuf), skipping (and logging) malformed ones.
+    """
+    events = []
+    with metrics.DECODE_SECONDS.time():
+        for record in records:
+            try:
+                events.append(decode_message(record.value, record.headers, wire_format))
+            except DECODE_ERRORS as e:
+                metrics.EVENTS_UNDECODABLE.inc()
+                logger.error(
+                    f"Failed to decode message at {record.topic}[{record.partition}]@{record.offset}: {e}"
+                )
+    return events
+
+
+def unique_events(events, dedup=None):
+    """Normalizes decoded events, dropping redelivered ones (see Deduplicator.unique)."""
+    events = [normalize_event(event) for event in events]
+    return dedup.unique(events) if dedup is not None else events
+
+
+def analyze_all(events, analyze):
+    """Analyzes events, skipping (and logging) the ones that fail."""
+    results = []
+    with metrics.ANALYZE_SECONDS.time():
+        for event in events:
+            try:
+                results.append(analyze(event))
+            except Exception as e:
+                metrics.EVENTS_FAILED.inc()
+                logger.error(f"An error occurred during event processing: {e}")
+    metrics.EVENTS_ANALYZED.inc(len(results))
+    return results
+
+
 class AnalyzerCore:
     """
     Core class responsible for consuming Kafka events, running analysis, 
     and persisting results to MongoDB.
     """
     def __init__(self):
-        # Configuration loaded from environment variables
-        self.kafka_broker = os.getenv("KAFKA_BROKER", "localhost:9092")
-        self.kafka_topic = os.getenv("KAFKA_TOPIC", "events")
-        self.mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-        self.mongodb_db_analysis = os.getenv("MONGODB_ANALYSIS_DB", "wizard_analysis_dev")
+        # Configuration from wizard.settings (YAML layers, then environment variables)
+        config = load_analyzer_config()
+        self.kafka_broker = config['KAFKA_BROKER']
+        self.kafka_topic = config['KAFKA_TOPIC']
+        self.mongodb_uri = config['MONGODB_URI']
+        self.mongodb_db_analysis = config['MONGODB_ANALYSIS_DB']
+        self.pipeline_mode = config['PIPELINE_MODE']
+        self.batch_size = config['BATCH_SIZE']
+        self.batch_linger_ms = config['BATCH_LINGER_MS']
+        self.workers = config['WORKERS']
+        self.lane_max_pending = config['LANE_MAX_PENDING']
+        self.wire_format = config['WIRE_FORMAT']
+        self._pipeline = None
+        batched = self.pipeline_mode in ("batch", "parallel", "partitioned")
         
         # Initialize Kafka Consumer
+        # In batch mode offsets are committed manually once a batch is durably
+        # written. Values are decoded by the service (not a value_deserializer)
+        # because the wire format may be selected by a message header.
+        # An unreachable broker is retried with backoff for CONNECT_TIMEOUT seconds.
         try:
-            self.consumer = KafkaConsumer(
-                self.kafka_topic,
-                bootstrap_servers=[self.kafka_broker],
-                auto_offset_reset='latest', # Start consuming at the latest offset
-                enable_auto_commit=True,
-                group_id='analyzer-group',
-                value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+            self.consumer = retry(
+                partial(
+                    KafkaConsumer,
+                    self.kafka_topic,
+                    **kafka_consumer_options(
+                        bootstrap_servers=self.kafka_broker.split(','),
+                        auto_offset_reset='latest', # Start consuming at the latest offset
+                        enable_auto_commit=not batched,
+                        group_id=config['KAFKA_GROUP_ID'],
+                    ),
+                ),
+                "Kafka broker",
+                retry_on=(NoBrokersAvailable,),
+                timeout=config['CONNECT_TIMEOUT'],
             )
             logger.info(f"Kafka Consumer initialized for topic '{self.kafka_topic}' on broker: {self.kafka_broker}")
         except Exception as e:
@@ -39,67 +152,263 @@ class AnalyzerCore:
             raise
 
         # Initialize MongoDB Client and Collection
+        # The client is the process-wide pooled one (shared with any other
+        # component of this process); it connects lazily on first use.
         try:
-            self.mongo_client = MongoClient(self.mongodb_uri)
+            self.mongo_client = registry.mongo(self.mongodb_uri)
             self.db_analysis = self.mongo_client[self.mongodb_db_analysis]
-            self.results_collection = self.db_analysis['results']
+            self.writer = ResultWriter(
+                self.db_analysis['results'],
+                upsert=config['WRITE_UPSERT'],
+                flush_size=config['WRITE_FLUSH_SIZE'],
+                flush_interval=config['WRITE_FLUSH_MS'] / 1000.0,
+                max_buffer=config['WRITE_BUFFER_SIZE'],
+                max_retries=config['WRITE_RETRIES'],
+                sink=ParquetSink.from_settings(get_settings()),
+            )
             logger.info(f"MongoDB connection established to database: {self.mongodb_db_analysis}")
         except Exception as e:
             logger.error(f"Failed to initialize MongoDB client: {e}")
             raise
 
+        # Redelivered events are skipped before analysis in the stream and
+        # batch modes (the others commit after every write, and the unique
+        # event_id index absorbs their redeliveries).
+        self.dedup = None
+        if self.pipeline_mode in ("stream", "batch"):
+            self.dedup = Deduplicator.from_settings(get_settings(), self.db_analysis)
+
+        # Batch sizes and write buffering follow settings reloads (see apply_settings)
+        settings_store.on_reload(self.apply_settings)
+
+    def apply_settings(self, settings):
+        """
+        Applies the hot-reloadable settings (batch size, linger, lane backlog,
+        write buffering) to this instance and its running pipeline.
+        """
+        config = load_analyzer_config(settings)
+        self.batch_size = config['BATCH_SIZE']
+        self.batch_linger_ms = config['BATCH_LINGER_MS']
+        self.lane_max_pending = config['LANE_MAX_PENDING']
+        if self.dedup is not None:
+            self.dedup.save_interval = config['DEDUP_SAVE_MS'] / 1000.0
+        self.writer.tune(
+            flush_size=config['WRITE_FLUSH_SIZE'],
+            flush_interval=config['WRITE_FLUSH_MS'] / 1000.0,
+            max_buffer=config['WRITE_BUFFER_SIZE'],
+            max_retries=config['WRITE_RETRIES'],
+        )
+        if self._pipeline is not None:
+            self._pipeline.tune(batch_size=self.batch_size, linger_ms=self.batch_linger_ms,
+                                max_pending=self.lane_max_pending)
+        logger.info(f"Applied settings (batch_size={self.batch_size}, linger_ms={self.batch_linger_ms}).")
+
+    @property
+    def results_collection(self):
+        """The results collection (written through self.writer)."""
+        return self.writer.collection
+
+    @results_collection.setter
+    def results_collection(self, collection):
+        self.writer.collection = collection
+
     def run(self):
         """
         Main loop to continuously consume messages and process events.
+
+        Indexes on the results collection are ensured first; buffered results
+        are flushed when the loop exits.
+        """
+        self.writer.start()
+        if self.dedup is not None and self.dedup.watermarks is not None:
+            self.dedup.watermarks.load()
+        try:
+            if self.pipeline_mode == "batch":
+                return self.run_batched()
+            if self.pipeline_mode == "parallel":
+                return self.run_parallel()
+            if self.pipeline_mode == "partitioned":
+                return self.run_partitioned()
+            return self.run_stream()
+        finally:
+            if self.writer.close() and self.dedup is not None:
+                self.dedup.checkpoint(force=True)
+
+    def run_stream(self):
+        """
+        Per-message loop; results are written behind by the ResultWriter in bulk.
         """
         logger.info("Analyzer core service starting main consumption loop...")
         for message in self.consumer:
+            metrics.observe_batch((message,))
+            if self.dedup is not None and not self.dedup.fresh_records((message,)):
+                continue
             try:
-                event_data = message.value
+                with metrics.DECODE_SECONDS.time():
+                    event = normalize_event(decode_message(message.value, message.headers, self.wire_format))
+                if self.dedup is not None and self.dedup.duplicate(event.id):
+                    continue
                 
                 # Process and analyze the event
-                analysis_result = self._run_analysis(event_data)
+                with metrics.ANALYZE_SECONDS.time():
+                    analysis_result = self._run_analysis(event)
+                metrics.EVENTS_ANALYZED.inc()
                 
                 # Persist the result to MongoDB
                 self._persist_result(analysis_result)
+                if self.dedup is not None:
+                    self.dedup.stored((event.id,), next_offsets((message,)))
+                    self.dedup.checkpoint(self.writer.flush)
 
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to decode JSON message: {e}")
+            except DECODE_ERRORS as e:
+                metrics.EVENTS_UNDECODABLE.inc()
+                logger.error(f"Failed to decode message: {e}")
             except Exception as e:
+                metrics.EVENTS_FAILED.inc()
                 logger.error(f"An error occurred during event processing: {e}")
 
+    def run_batched(self):
+        """
+        Micro-batched loop: poll, decode, analyze and persist records in batches.
+        """
+        logger.info(
+            f"Analyzer core service starting batched loop "
+            f"(batch_size={self.batch_size}, linger_ms={self.batch_linger_ms})..."
+        )
+        while True:
+            records = self._poll_batch()
+            if records:
+                self._process_batch(records)
+
+    def run_parallel(self):
+        """
+        Worker-pool loop: batches are analyzed on `workers` processes and written
+        in poll order by this process. SIGTERM/SIGINT trigger a graceful drain.
+        """
+        # Imported here: the other modes never need the process pool machinery
+        from .workers import ParallelPipeline
+
+        pipeline = self._pipeline = ParallelPipeline(
+            self.consumer,
+            run_analysis,
+            self._persist_batch,
+            workers=self.workers,
+            batch_size=self.batch_size,
+            linger_ms=self.batch_linger_ms,
+            decode=partial(decode_message, default_format=self.wire_format),
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: pipeline.stop())
+        pipeline.run()
+        self.consumer.close()
+
+    def run_partitioned(self):
+        """
+        Partition-lane loop: every assigned partition is analyzed and written
+        by its own lane, in offset order, and committed independently, so a
+        slow partition does not hold up the others. SIGTERM/SIGINT trigger a
+        graceful drain.
+        """
+        from .lanes import PartitionLanes
+
+        pipeline = self._pipeline = PartitionLanes(
+            self.consumer,
+            run_analysis,
+            self._persist_batch,
+            batch_size=self.batch_size,
+            max_pending=self.lane_max_pending,
+            decode=partial(decode_message, default_format=self.wire_format),
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: pipeline.stop())
+        pipeline.run()
+        self.consumer.close()
+
+    def _poll_batch(self):
+        """
+        Polls until batch_size records are buffered or the linger time expires.
+        """
+        return poll_batch(self.consumer, self.batch_size, self.batch_linger_ms)
+
+    def _process_batch(self, records):
+        """
+        Decodes, analyzes and persists a batch of raw records, then commits offsets.
+
+        Offsets are only committed after the batch is durably written. If the
+        write fails the consumer is rewound to the start of the batch so the
+        records are delivered again (at-least-once).
+
+        Returns:
+            bool: True if the batch was persisted and committed.
+        """
+        metrics.observe_batch(records)
+        fresh = self.dedup.fresh_records(records) if self.dedup is not None else records
+        events = self._unique_events(self._decode_batch(fresh))
+        results = analyze_all(events, self._run_analysis)
+
+        if results and not self._persist_batch(results):
+            metrics.PERSIST_FAILURES.inc()
+            self._rewind(records)
+            return False
+
+        if self.dedup is not None:
+            self.dedup.stored([event.id for event in events], next_offsets(records))
+            self.dedup.checkpoint()
+        self._commit(records)
+        return True
+
+    def _decode_batch(self, records):
+        """
+        Decodes raw record values (JSON or protobuf), skipping (and logging) malformed ones.
+        """
+        return decode_records(records, self.wire_format)
+
+    def _unique_events(self, events):
+        """Normalizes decoded events, dropping redelivered ones (see Deduplicator.unique)."""
+        return unique_events(events, self.dedup)
+
+    def _persist_batch(self, results):
+        """
+        Writes a batch of analysis results with a single unordered bulk write,
+        retrying transient errors (see ResultWriter.write).
+
+        Duplicate key errors are tolerated: the document is already stored.
+
+        Returns:
+            bool: True if every result is durably stored.
+        """
+        if not self.writer.write(results):
+            return False
+        logger.info(f"Persisted batch of {len(results)} documents.")
+        return True
+
+    def _commit(self, records):
+        """
+        Commits the offset following the last record of every partition in the batch.
+        """
+        try:
+            self.consumer.commit(next_offsets(records))
+        except Exception as e:
+            # The batch is already stored; an uncommitted batch is simply redelivered.
+            logger.error(f"Failed to commit offsets: {e}")
+
+    def _rewind(self, records):
+        """
+        Seeks every partition in the batch back to its first record.
+        """
+        rewind(self.consumer, records)
+
     def _run_analysis(self, event):
         """
         Performs basic analysis on the incoming event data.
         """
-        # --- CRITICAL FIX: Ensure keys match the Go event model ---
-        user_id = event.get('UserID', 'unknown_user')
-        action = event.get('Action', 'unknown_action')
-        timestamp = event.get('Timestamp', datetime.now().timestamp())
-        
-        # Example analysis: Determine event type and score
-        event_type = "HighValue" if action in ["checkout", "add_to_cart"] else "LowValue"
-        
-        analysis = {
-            "user_id": user_id,
-            "original_action": action,
-            "event_time": datetime.fromtimestamp(timestamp).isoformat(),
-            "analysis_type": event_type,
-            "processed_at": datetime.now().isoformat(),
-            "event_details": event.get('Payload', {}), # Store payload details
-        }
-        
-        return analysis
+        return run_analysis(event)
 
     def _persist_result(self, result):
         """
-        Inserts the analysis result into the MongoDB collection.
+        Queues the analysis result for the next bulk write (write-behind).
         """
-        try:
-            self.results_collection.insert_one(result)
-            logger.info(f"Persisted document for user {result['user_id']} ({result['original_action']}).")
-        except Exception as e:
-            logger.error(f"Failed to persist result to MongoDB: {e}")
+        self.writer.add(result)
             
 # NOTE: This file is the core logic. The actual execution (main loop) 
 # will be triggered by an entry point file (like main.py) that imports this class.
@@ -0,0 +1,196 @@
+# Wizard/python/analyzer/dedup.py
+
+import logging
+import time
+
+from kafka import TopicPartition
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from wizard.utils.dedup import recent_ids
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Collection (in the analysis database) holding the persisted high-water marks
+WATERMARKS_COLLECTION = 'dedup_watermarks'
+
+
+class Watermarks:
+    """
+    Per-partition high-water marks: the offset after the last record whose
+    result is durably stored, persisted so they outlive the process.
+
+    Kafka redelivers everything after the last committed offset when a
+    consumer restarts, which with auto-commit (or a crash between a write and
+    its commit) includes records that were already stored. Records below
+    their partition's mark are such redeliveries.
+
+    Marks only ever grow ($max). If a topic is recreated (offsets start over)
+    its documents must be deleted, or its new records would be skipped.
+    """
+
+    def __init__(self, collection, group_id):
+        self.collection = collection
+        self.group_id = group_id
+        self._marks = {}
+        self._dirty = {}
+
+    def _key(self, tp):
+        return f"{self.group_id}:{tp.topic}:{tp.partition}"
+
+    def load(self):
+        """Reads the persisted marks of this consumer group. Failures are logged, not raised."""
+        try:
+            for document in self.collection.find({"group": self.group_id}):
+                tp = TopicPartition(document["topic"], document["partition"])
+                self._marks[tp] = max(self._marks.get(tp, 0), document["offset"])
+        except PyMongoError as e:
+            logger.error(f"Failed to load dedup watermarks, redeliveries will be re-analyzed: {e}")
+        return self
+
+    def below(self, topic, partition, offset):
+        """True if the record at offset was already stored."""
+        mark = self._marks.get(TopicPartition(topic, partition))
+        return mark is not None and offset < mark
+
+    def advance(self, offsets):
+        """Raises the marks (in memory) to the given {TopicPartition: next offset} for the next save()."""
+        for tp, offset in offsets.items():
+            offset = getattr(offset, "offset", offset)
+            if offset > self._marks.get(tp, -1):
+                self._marks[tp] = self._dirty[tp] = offset
+
+    def save(self):
+        """Persists the marks advanced since the last save. Returns False (and keeps them) on failure."""
+        if not self._dirty:
+            return True
+        dirty, self._dirty = self._dirty, {}
+        requests = [
+            UpdateOne(
+                {"_id": self._key(tp)},
+                {"$max": {"offset": offset},
+                 "$set": {"group": self.group_id, "topic": tp.topic, "partition": tp.partition}},
+                upsert=True,
+            )
+            for tp, offset in dirty.items()
+        ]
+        try:
+            self.collection.bulk_write(requests, ordered=False)
+            return True
+        except PyMongoError as e:
+            for tp, offset in dirty.items():
+                self._dirty.setdefault(tp, offset)
+            logger.error(f"Failed to save dedup watermarks: {e}")
+            return False
+
+
+class Deduplicator:
+    """
+    Skips redelivered events before they are analyzed or written.
+
+    Two checks, both before decoding or analysis work is spent:
+    - the record's offset is below its partition's persisted Watermarks
+      (redelivery after a restart);
+    - the event_id is among the last `window` stored ones (redelivery within
+      this process, e.g. after a rebalance, or a producer retry). The window
+      is exact, or a Bloom filter for a non-zero `error_rate`: far less
+      memory, but that fraction of new events is wrongly skipped.
+
+    Callers report ids with stored() once their results are written (queued,
+    in stream mode), so a batch whose write fails and is redelivered is not
+    mistaken for a duplicate.
+    """
+
+    def __init__(self, window=100_000, error_rate=0.0, watermarks=None, save_interval=1.0):
+        self.seen = recent_ids(window, error_rate)
+        self.watermarks = watermarks
+        self.save_interval = save_interval
+        self._next_save = 0.0
+        self.checked = 0
+        self.duplicates = 0
+
+    @classmethod
+    def from_settings(cls, settings, database=None):
+        """Builds the deduplicator configured by settings.dedup, or None if it is disabled."""
+        dedup = settings.dedup
+        if not dedup.enabled:
+            return None
+        watermarks = None
+        if database is not None and dedup.watermarks:
+            watermarks = Watermarks(database[WATERMARKS_COLLECTION], settings.kafka.group_id)
+        deduplicator = cls(dedup.window, dedup.error_rate, watermarks, dedup.save_ms / 1000.0)
+        metrics.DEDUP_WINDOW_BYTES.set(deduplicator.seen.nbytes)
+        return deduplicator
+
+    def fresh_records(self, records):
+        """The records that are not below their partition's watermark (the others are counted)."""
+        self.checked += len(records)
+        metrics.DEDUP_CHECKS.inc(len(records))
+        if self.watermarks is None:
+            return records
+        below = self.watermarks.below
+        fresh = [record for record in records if not below(record.topic, record.partition, record.offset)]
+        if len(fresh) < len(records):
+            self.duplicates += len(records) - len(fresh)
+            metrics.DUPLICATES_OFFSET.inc(len(records) - len(fresh))
+        return fresh
+
+    def duplicate(self, event_id):
+        """True (and counted) if the event_id was stored recently. Events without an id never are."""
+        if event_id is None or event_id not in self.seen:
+            return False
+        self.duplicates += 1
+        metrics.DUPLICATES_EVENT_ID.inc()
+        return True
+
+    def unique(self, events):
+        """
+        The events (normalized, with an `id`) that were not stored recently,
+        without repeats within `events`; the others are counted.
+        """
+        unique = []
+        batch_ids = set()
+        for event in events:
+            event_id = event.id
+            if event_id is not None:
+                if event_id in batch_ids or event_id in self.seen:
+                    self.duplicates += 1
+                    metrics.DUPLICATES_EVENT_ID.inc()
+                    continue
+                batch_ids.add(event_id)
+            unique.append(event)
+        return unique
+
+    def stored(self, event_ids, offsets=None):
+        """
+        Remembers the ids of durably stored events and advances the watermarks
+        to {TopicPartition: next offset} (see checkpoint()).
+        """
+        for event_id in event_ids:
+            if event_id is not None:
+                self.seen.add(event_id)
+        if offsets and self.watermarks is not None:
+            self.watermarks.advance(offsets)
+        metrics.DEDUP_WINDOW_BYTES.set(self.seen.nbytes)
+
+    def checkpoint(self, flush=None, force=False):
+        """
+        Persists advanced watermarks, at most every save_interval seconds
+        unless forced. Write-behind callers pass flush (e.g. ResultWriter.flush):
+        it runs first and the marks are only saved if it returns True, since
+        a mark must never get ahead of the stored results.
+        """
+        if self.watermarks is None:
+            return True
+        now = time.monotonic()
+        if not force and now < self._next_save:
+            return True
+        self._next_save = now + self.save_interval
+        if flush is not None and not flush():
+            return False
+        return self.watermarks.save()
+
+    @property
+    def hit_rate(self):
+        return self.duplicates / self.checked if self.checked else 0.0
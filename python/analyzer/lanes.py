@@ -0,0 +1,258 @@
+# Wizard/python/analyzer/lanes.py
+
+import logging
+import threading
+import time
+from collections import deque
+
+from kafka import ConsumerRebalanceListener
+from kafka.structs import OffsetAndMetadata
+
+from wizard.transport import decode_message
+from . import metrics
+from .workers import analyze_chunk
+
+logger = logging.getLogger(__name__)
+
+
+class _Lane:
+    """
+    One assigned partition: a thread that analyzes and persists the
+    partition's records strictly in offset order.
+
+    The consumer thread submits polled records; the lane publishes the next
+    offset to commit (`completed`) and, after a failed write, the offset the
+    consumer must seek back to (`rewind_to`). Queued records are dropped on
+    failure and submissions are ignored until the consumer has seeked, since
+    every one of them will be fetched again.
+    """
+
+    def __init__(self, tp, process, batch_size):
+        self.tp = tp
+        self.batch_size = batch_size
+        self.pending = 0
+        self.completed = None
+        self.committed = None
+        self.rewind_to = None
+        self._process = process
+        self._batches = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"lane-{tp.topic}-{tp.partition}", daemon=True)
+        self._thread.start()
+
+    def submit(self, records):
+        with self._cond:
+            if self.rewind_to is not None or self._closing:
+                return
+            self._batches.append(records)
+            self.pending += len(records)
+            metrics.BATCHES_IN_FLIGHT.inc()
+            self._cond.notify()
+
+    def rewound(self):
+        """Called by the consumer thread after seeking to rewind_to."""
+        with self._cond:
+            self.rewind_to = None
+
+    def close(self):
+        """Lets the lane finish its queued records, then stop (see join)."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def join(self):
+        self._thread.join()
+
+    def _next(self):
+        # Queued batches are coalesced into one write of up to ~batch_size records.
+        with self._cond:
+            while not self._batches and not self._closing:
+                self._cond.wait()
+            records = []
+            taken = 0
+            while self._batches and len(records) < self.batch_size:
+                records.extend(self._batches.popleft())
+                taken += 1
+            return records, taken
+
+    def _run(self):
+        while True:
+            records, taken = self._next()
+            if not records:
+                return
+            try:
+                stored = self._process(records)
+            except Exception as e:
+                logger.error(f"Lane {self.tp.topic}[{self.tp.partition}] failed to process a batch: {e}")
+                stored = False
+            with self._cond:
+                self.pending -= len(records)
+                if stored:
+                    self.completed = records[-1].offset + 1
+                else:
+                    metrics.PERSIST_FAILURES.inc()
+                    self.rewind_to = records[0].offset
+                    self.pending -= sum(len(batch) for batch in self._batches)
+                    taken += len(self._batches)
+                    self._batches.clear()
+                metrics.BATCHES_IN_FLIGHT.dec(taken)
+
+
+class PartitionLanes(ConsumerRebalanceListener):
+    """
+    Processes every assigned partition in its own lane, concurrently.
+
+    The consumer thread polls and hands each partition's records to that
+    partition's lane (a thread), so a partition whose writes are slow or
+    failing delays only itself: once a lane holds `max_pending` unprocessed
+    records its partition is paused (and resumed at half that), while the
+    other partitions keep being fetched. Records of one partition, and thus of
+    one user since events are keyed by user, are still handled in offset order.
+
+    Offsets are tracked and committed per partition (every
+    `commit_interval_ms`) once the lane has durably written the records. A
+    failed write rewinds only that partition to its first unwritten record
+    (at-least-once). Lanes follow the group's assignment: revoked partitions
+    are drained and committed before they move to another consumer, and
+    newly assigned ones get a fresh lane.
+
+    Analysis runs on the lane threads, so lanes overlap writes and other I/O
+    rather than CPU work; use the parallel pipeline for CPU-bound analysis.
+    """
+
+    def __init__(self, consumer, analyze, persist_batch, batch_size, poll_ms=100,
+                 max_pending=None, commit_interval_ms=500, decode=decode_message, model_scores=None):
+        """
+        Args:
+            consumer: A KafkaConsumer created with enable_auto_commit=False and
+                no value_deserializer. Only this object's thread uses it.
+            analyze: Function mapping an event dict to a result document.
+            persist_batch: Callable(results) -> bool, called on lane threads.
+            batch_size: Maximum records per poll and (about) per write.
+            poll_ms: Poll timeout.
+            max_pending: Unprocessed records per lane before its partition is
+                paused (defaults to four batches).
+            commit_interval_ms: Minimum time between offset commits.
+            decode: Function(value, headers) decoding a raw record.
+            model_scores: Optional function mapping a batch of events to their
+                model scores (see analyze_chunk).
+        """
+        self.consumer = consumer
+        self.analyze = analyze
+        self.decode = decode
+        self.model_scores = model_scores
+        self.persist_batch = persist_batch
+        self.batch_size = batch_size
+        self.poll_ms = poll_ms
+        self.max_pending = max_pending or 4 * batch_size
+        self.commit_interval = commit_interval_ms / 1000.0
+        self._lanes = {}
+        self._paused = set()
+        self._last_commit = 0.0
+        self._running = False
+
+    def tune(self, batch_size, linger_ms=None, max_pending=None):
+        """
+        Changes the batch size (of every lane too) and the backlog that pauses
+        a partition (defaults to four batches); linger_ms is unused here.
+        """
+        self.batch_size = batch_size
+        self.max_pending = max_pending or 4 * batch_size
+        for lane in list(self._lanes.values()):
+            lane.batch_size = batch_size
+
+    def stop(self):
+        """Requests a graceful drain: stop polling, finish and commit every lane."""
+        self._running = False
+
+    def run(self):
+        """Runs until stop() is called, then drains all lanes."""
+        self._running = True
+        topics = self.consumer.subscription()
+        if topics:
+            # Same topics, so this only attaches the rebalance listener
+            self.consumer.subscribe(topics=list(topics), listener=self)
+        logger.info(f"Partitioned pipeline started (batch_size={self.batch_size}, max_pending={self.max_pending}).")
+        try:
+            while self._running:
+                polled = self.consumer.poll(timeout_ms=self.poll_ms, max_records=self.batch_size)
+                for tp, records in polled.items():
+                    if records:
+                        metrics.observe_batch(records)
+                        self._lane(tp).submit(records)
+                self._service_lanes()
+        finally:
+            logger.info(f"Draining {len(self._lanes)} partition lanes...")
+            self._close_lanes(list(self._lanes))
+        logger.info("Partitioned pipeline stopped.")
+
+    def on_partitions_revoked(self, revoked):
+        """Drains the lanes of revoked partitions and commits their offsets (runs inside poll)."""
+        self._close_lanes([tp for tp in revoked if tp in self._lanes])
+
+    def on_partitions_assigned(self, assigned):
+        for tp in assigned:
+            self._lane(tp)
+        logger.info(f"Assigned partitions: {sorted((tp.topic, tp.partition) for tp in assigned)}")
+
+    def _process(self, records):
+        results = analyze_chunk(self.decode, self.analyze, [(record.value, record.headers) for record in records],
+                                model_scores=self.model_scores)
+        return not results or self.persist_batch(results)
+
+    def _lane(self, tp):
+        lane = self._lanes.get(tp)
+        if lane is None:
+            lane = self._lanes[tp] = _Lane(tp, self._process, self.batch_size)
+            metrics.PARTITION_LANES.set(len(self._lanes))
+        return lane
+
+    def _service_lanes(self):
+        """Applies rewinds, pauses backlogged partitions, resumes drained ones and commits."""
+        for tp, lane in self._lanes.items():
+            if lane.rewind_to is not None:
+                self.consumer.seek(tp, lane.rewind_to)
+                logger.warning(f"Rewound {tp.topic}[{tp.partition}] to offset {lane.rewind_to} after a failed write.")
+                lane.rewound()
+            if tp not in self._paused and lane.pending >= self.max_pending:
+                self.consumer.pause(tp)
+                self._paused.add(tp)
+            elif tp in self._paused and lane.pending <= self.max_pending // 2:
+                self.consumer.resume(tp)
+                self._paused.discard(tp)
+        metrics.PAUSED_PARTITIONS.set(len(self._paused))
+        if time.monotonic() - self._last_commit >= self.commit_interval:
+            self._commit(list(self._lanes.values()))
+
+    def _commit(self, lanes):
+        offsets = {
+            lane.tp: OffsetAndMetadata(lane.completed, None)
+            for lane in lanes
+            if lane.completed is not None and lane.completed != lane.committed
+        }
+        self._last_commit = time.monotonic()
+        if not offsets:
+            return
+        try:
+            self.consumer.commit(offsets)
+        except Exception as e:
+            # The records are stored; uncommitted ones are simply redelivered.
+            logger.error(f"Failed to commit offsets: {e}")
+            return
+        for lane in lanes:
+            if lane.tp in offsets:
+                lane.committed = offsets[lane.tp].offset
+
+    def _close_lanes(self, tps):
+        lanes = [self._lanes.pop(tp) for tp in tps]
+        for lane in lanes:
+            lane.close()
+        for lane in lanes:
+            lane.join()
+        self._commit(lanes)
+        # Pauses end with the assignment (or the consumer)
+        self._paused.difference_update(tps)
+        metrics.PARTITION_LANES.set(len(self._lanes))
+        metrics.PAUSED_PARTITIONS.set(len(self._paused))
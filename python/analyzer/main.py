@@ -1,22 +1,28 @@
 # File: python/wizard/main.py
 
 import os
-import uvicorn
 import logging
-import asyncio
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from typing import Callable
+from pymongo.errors import PyMongoError
 
 # Import utilities and core logic
-from wizard.utils.logging import setup_logging
-# NOTE: We assume a database utility file for connection checks exists
-# from wizard.utils.db_utils import check_db_connection 
+from wizard.api.analysis import router as analysis_router
+from wizard.api.metrics import MetricsMiddleware, router as metrics_router
+from wizard.api.results import create_result_store
+from wizard.core.analysis_engine import risk_rules, set_feature_store, set_inference
+from wizard.core.features import FeatureStore
+from wizard.core.inference import InferenceStage
+from wizard.settings import get_settings, settings_store
+from wizard.utils.clients import registry
+from wizard.utils.logging import set_level, setup_logging
+from .utils import load_analyzer_config
 
 # --- Application Initialization ---
 
 # 1. Setup Structured Logging as the very first step
-setup_logging(level=os.environ.get("WIZARD_LOG_LEVEL", "INFO"))
+setup_logging(level=get_settings().service.log_level)
 logger = logging.getLogger(__name__)
 
 # Initialize the FastAPI app
@@ -43,38 +49,65 @@ async def startup_event():
     """Executed when the FastAPI application starts up."""
     logger.info("Starting up Wizard Analyzer API...", extra={'port': os.environ.get("ANALYZER_PORT", 8000)})
     
-    # 1. Database Readiness Check (Crucial for production services)
-    db_host = os.environ.get("DB_HOST", "db_local")
-    db_port = int(os.environ.get("DB_PORT", 5432))
-    
-    # NOTE: This part requires the check_db_connection function to be defined elsewhere.
-    # For now, we simulate the check.
-    
-    max_retries = 10
-    for attempt in range(max_retries):
-        try:
-            # check_db_connection(host=db_host, port=db_port)
-            # SIMULATION: Assume DB is ready on the third attempt
-            if attempt < 2:
-                raise ConnectionError("Database not ready yet.")
-                
-            logger.info("Database connection verified.", extra={'db_host': db_host})
-            break # Exit the loop if connection succeeds
-        except ConnectionError as e:
-            if attempt == max_retries - 1:
-                logger.critical("Failed to connect to database after max retries. Exiting.")
-                # In a real app, you might raise an exception to halt startup
-                raise Exception(f"Fatal: DB connection failed: {e}")
-            logger.warning(f"Database not ready. Retrying in 2s... (Attempt {attempt + 1}/{max_retries})")
-            await asyncio.sleep(2)
+    # 1. Database Readiness Check: ping MongoDB with exponential backoff
+    # (from 0.1s) until it answers, for at most CONNECT_TIMEOUT seconds.
+    config = load_analyzer_config()
+    try:
+        await registry.async_wait_for_mongo(config['MONGODB_URI'], timeout=config['CONNECT_TIMEOUT'])
+        logger.info("Database connection verified.")
+    except PyMongoError as e:
+        logger.critical("Failed to connect to database before the connect timeout. Exiting.")
+        raise Exception(f"Fatal: DB connection failed: {e}")
+
+    # 2. Cached read path for persisted results
+    app.state.results = create_result_store(
+        config['MONGODB_URI'], config['MONGODB_ANALYSIS_DB'],
+        max_entries=config['RESULTS_CACHE_SIZE'], ttl_seconds=config['RESULTS_CACHE_TTL'],
+    )
+    app.state.results.start_watching()
+    # Pick up scoring rule changes (config/rules/risk.yaml) without a redeploy
+    risk_rules.watch()
+    # Per-user history for the velocity rules, restored from the last snapshot.
+    # Read-only: requests do not add to it, so the same event scores the same.
+    set_feature_store(FeatureStore.from_settings(get_settings()), record=False)
+    # Optional model score, blended into the rule score
+    stage = InferenceStage.from_settings(get_settings())
+    if stage is not None:
+        set_inference(stage)
+        settings_store.on_reload(stage.apply_settings)
+    # ...and tuning changes in config/*.yaml (log level, batch sizes) without a restart
+    settings_store.on_reload(lambda settings: set_level(settings.service.log_level))
+    settings_store.watch()
+
+    # 3. Event pipeline: in "async" mode this process also drains Kafka and
+    # invalidates cached results as it persists new ones.
+    app.state.pipeline = None
+    if config['PIPELINE_MODE'] == "async":
+        # aiokafka and the pipeline are only imported when they are used
+        from .async_core import AsyncAnalyzerCore
+
+        app.state.pipeline = AsyncAnalyzerCore(on_persist=app.state.results.invalidate_documents)
+        await app.state.pipeline.start()
+        logger.info("Async analyzer pipeline started.")
 
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """Executed when the FastAPI application is shutting down."""
     logger.info("Wizard Analyzer API shutting down gracefully.")
-    # Here you would typically close database connection pools, 
-    # Kafka consumers, or clean up temporary resources.
+    # Drain in-flight batches and commit their offsets before closing clients.
+    pipeline = getattr(app.state, "pipeline", None)
+    if pipeline is not None:
+        await pipeline.stop()
+    settings_store.stop_watching()
+    stage = set_inference(None)
+    if stage is not None:
+        stage.close()
+    set_feature_store(None)
+    results = getattr(app.state, "results", None)
+    if results is not None:
+        await results.close()
+    registry.close()
 
 
 # --- API Endpoints (from previous step) ---
@@ -86,18 +119,30 @@ async def health_check():
     return JSONResponse(content={"status": "UP", "service": "Analyzer API"})
 
 @app.get("/api/v1/analysis/{item_id}", tags=["Core API"])
-async def get_analysis_result(item_id: int, authorized: bool = Depends(verify_api_key)):
-    """Retrieves the analysis result for a given item ID."""
-    # Logic imported from wizard.core.analysis_engine
-    # Placeholder: return analyze_event(item_id)
-    if item_id % 2 == 0:
-        return {"item_id": item_id, "result": "Analyzed and OK"}
-    else:
+async def get_analysis_result(item_id: str, authorized: bool = Depends(verify_api_key)):
+    """Retrieves the persisted analysis result for a given event ID."""
+    result = await app.state.results.get(item_id)
+    if result is None:
         raise HTTPException(status_code=404, detail=f"Analysis for Item ID {item_id} not found.")
+    return {"item_id": item_id, "result": result}
+
+@app.get("/api/v1/cache/stats", tags=["Monitoring"])
+async def cache_stats(authorized: bool = Depends(verify_api_key)):
+    """Hit/miss/eviction counters of the result cache, for sizing it under load."""
+    return {"results": app.state.results.stats()}
+
+# Batch scoring and bulk result lookup
+app.include_router(analysis_router, dependencies=[Depends(verify_api_key)])
+
+# Prometheus scrape endpoint and per-route request latency
+app.include_router(metrics_router)
+app.add_middleware(MetricsMiddleware)
 
 # --- Main Run Block ---
 
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.environ.get("ANALYZER_PORT", 8000))
     logger.info(f"Starting Uvicorn web server on port {port}")
     
@@ -0,0 +1,61 @@
+# Wizard/python/analyzer/metrics.py
+
+import time
+
+from wizard.utils import metrics
+
+# Seconds between a record being produced and being polled
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+EVENTS = metrics.counter(
+    "analyzer_events_total", "Consumed events by outcome.", ["outcome"])
+CONSUME_LAG = metrics.histogram(
+    "analyzer_consume_lag_seconds", "Age of the first record of each polled batch.", buckets=LAG_BUCKETS)
+BATCH_SIZE = metrics.histogram(
+    "analyzer_batch_size", "Records per polled batch.", buckets=metrics.SIZE_BUCKETS)
+STAGE_SECONDS = metrics.histogram(
+    "analyzer_stage_seconds", "Time spent on one batch (one event in stream mode) per pipeline stage.", ["stage"])
+PERSIST_FAILURES = metrics.counter(
+    "analyzer_persist_failures_total", "Batches whose write failed and was rewound.")
+BATCHES_IN_FLIGHT = metrics.gauge(
+    "analyzer_batches_in_flight", "Batches polled but not yet committed.")
+PARTITION_LANES = metrics.gauge(
+    "analyzer_partition_lanes", "Assigned partitions with a processing lane (partitioned mode).")
+PAUSED_PARTITIONS = metrics.gauge(
+    "analyzer_paused_partitions", "Partitions paused because their lane is backlogged.")
+DEDUP_CHECKS = metrics.counter(
+    "analyzer_dedup_checks_total", "Records checked for redelivery.")
+DUPLICATES = metrics.counter(
+    "analyzer_duplicates_total", "Redelivered events skipped before analysis, by the check that caught them.",
+    ["check"])
+DEDUP_WINDOW_BYTES = metrics.gauge(
+    "analyzer_dedup_window_bytes", "Approximate memory of the recent event_id window.")
+WRITES = metrics.counter(
+    "analyzer_writes_total", "Documents stored by ResultWriter.")
+WRITE_RETRIES = metrics.counter(
+    "analyzer_write_retries_total", "Bulk writes retried after a transient error.")
+WRITES_DROPPED = metrics.counter(
+    "analyzer_writes_dropped_total", "Buffered documents dropped after a failed write.")
+
+# Children are bound once; every call site below is per batch, not per event.
+EVENTS_ANALYZED = EVENTS.labels("analyzed")
+EVENTS_UNDECODABLE = EVENTS.labels("decode_error")
+EVENTS_FAILED = EVENTS.labels("analysis_error")
+DECODE_SECONDS = STAGE_SECONDS.labels("decode")
+ANALYZE_SECONDS = STAGE_SECONDS.labels("analyze")
+PERSIST_SECONDS = STAGE_SECONDS.labels("persist")
+DUPLICATES_OFFSET = DUPLICATES.labels("offset")
+DUPLICATES_EVENT_ID = DUPLICATES.labels("event_id")
+
+
+def observe_batch(records):
+    """
+    Records the size and consume lag of a polled batch.
+
+    Lag is taken from the first record only (Kafka timestamps are in ms, -1
+    when the producer set none) to keep the cost independent of batch size.
+    """
+    BATCH_SIZE.observe(len(records))
+    timestamp = getattr(records[0], "timestamp", None)
+    if timestamp is not None and timestamp >= 0:
+        CONSUME_LAG.observe(max(0.0, time.time() - timestamp / 1000.0))
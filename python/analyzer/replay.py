@@ -0,0 +1,370 @@
+# Wizard/python/analyzer/replay.py
+#
+# Re-scores events from local archives instead of replaying them through
+# Kafka, e.g. after a rule change. Run from the python/ directory:
+#
+#     python -m analyzer.replay archive/2026-10-*.ndjson
+#     python -m analyzer.replay events.pb --diff --dry-run --diff-out changes.ndjson
+#     PYTHONPATH=../analyzer python -m analyzer.replay events.ndjson --analysis app.analyzer:run_analysis
+#
+# Archives are NDJSON (one event per line) or length-prefixed protobuf: Event
+# messages of shared/proto/transport.proto, each preceded by its size as a
+# varint (the "delimited" format of writeDelimitedTo/protodelim). Files are
+# memory-mapped and split into chunks of about --chunk-mb; worker processes
+# decode, analyze and bulk-write their chunks directly, so the parent only
+# plans chunks and merges counters.
+
+import argparse
+import importlib
+import logging
+import mmap
+import os
+import sys
+import time
+from collections import Counter
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+from wizard.models.stored import expand_document
+from wizard.transport import DECODE_ERRORS, JSON, PROTOBUF, decode_message, encode_event
+from wizard.utils import codec
+from .core import analyze_all, unique_events
+from .writer import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    ".ndjson": JSON, ".jsonl": JSON, ".json": JSON,
+    ".pb": PROTOBUF, ".bin": PROTOBUF, ".protobuf": PROTOBUF,
+}
+
+# Result fields that differ on every run and are not compared by --diff
+VOLATILE_FIELDS = frozenset(("_id", "processed_at"))
+# ...and for events without a timestamp, whose event_time is their processed_at
+UNTIMED_VOLATILE_FIELDS = VOLATILE_FIELDS | {"event_time"}
+
+
+def archive_format(path, requested="auto"):
+    """The archive format: `requested`, else by extension, else sniffed from the first byte."""
+    if requested != "auto":
+        return requested
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+    with open(path, "rb") as f:
+        return JSON if f.read(1) in (b"{", b"[", b" ", b"\n") else PROTOBUF
+
+
+def _read_varint(buf, pos):
+    """Decodes the varint at buf[pos]; returns (value, position after it)."""
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def plan_chunks(buf, fmt, chunk_bytes):
+    """
+    Yields (start, end) byte ranges of about chunk_bytes that hold whole
+    records: NDJSON ranges end after a newline, protobuf ranges after a
+    record (found by hopping over the length prefixes, without reading the
+    messages).
+    """
+    size = len(buf)
+    start = 0
+    if fmt == JSON:
+        while start < size:
+            end = size
+            if start + chunk_bytes < size:
+                newline = buf.find(b"\n", start + chunk_bytes - 1)
+                end = size if newline < 0 else newline + 1
+            yield start, end
+            start = end
+        return
+    pos = 0
+    while pos < size:
+        try:
+            length, pos = _read_varint(buf, pos)
+        except IndexError:
+            pos = size
+            break
+        pos = min(pos + length, size)
+        if pos - start >= chunk_bytes:
+            yield start, pos
+            start = pos
+    if start < size:
+        yield start, size
+
+
+def iter_records(buf, fmt, start, end):
+    """
+    Yields the raw records in buf[start:end] (a range from plan_chunks).
+    A truncated protobuf record at the end of the file raises ValueError.
+    """
+    if fmt == JSON:
+        for line in buf[start:end].split(b"\n"):
+            if line.strip():
+                yield line
+        return
+    pos = start
+    while pos < end:
+        length, data = _read_varint(buf, pos)
+        pos = data + length
+        if pos > end:
+            raise ValueError(f"truncated record at byte {data} (needs {length} bytes, {end - data} left)")
+        yield buf[data:pos]
+
+
+def write_archive(path, events, fmt):
+    """Writes events (any representation accepted by normalize_event) as an archive file."""
+    with open(path, "wb") as f:
+        for event in events:
+            if fmt == JSON:
+                f.write(codec.dumps(event).encode("utf-8") + b"\n")
+            else:
+                message = encode_event(event)
+                f.write(_varint(len(message)) + message)
+
+
+def load_function(spec):
+    """Imports "module:function"."""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _comparable(value):
+    if isinstance(value, Mapping):
+        return {key: _comparable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_comparable(item) for item in value]
+    return value
+
+
+def diff_results(collection, results, untimed=frozenset()):
+    """
+    Compares fresh results with the stored ones (one $in query per call).
+    Results of the event ids in `untimed` (events without a timestamp) are
+    compared without their event_time.
+
+    Returns:
+        (Counter, list): counts of "unchanged", "changed", "missing" (not
+        stored) and "unkeyed" (no event_id) results, and one
+        {"event_id", "stored", "new"} entry per changed result with only the
+        fields that differ.
+    """
+    counts = Counter()
+    changes = []
+    ids = [result.get("event_id") for result in results if result.get("event_id") is not None]
+    stored = {doc["event_id"]: doc for doc in collection.find({"event_id": {"$in": ids}})} if ids else {}
+    for result in results:
+        event_id = result.get("event_id")
+        if event_id is None:
+            counts["unkeyed"] += 1
+            continue
+        old = stored.get(event_id)
+        if old is None:
+            counts["missing"] += 1
+            continue
+        # Compared in the API shape, so results of either schema version match
+        result, old = expand_document(result), expand_document(old)
+        volatile = UNTIMED_VOLATILE_FIELDS if event_id in untimed else VOLATILE_FIELDS
+        fields = [key for key in result if key not in volatile
+                  and _comparable(result[key]) != _comparable(old.get(key))]
+        if not fields:
+            counts["unchanged"] += 1
+            continue
+        counts["changed"] += 1
+        changes.append({"event_id": event_id,
+                        "stored": {key: _comparable(old.get(key)) for key in fields},
+                        "new": {key: _comparable(result[key]) for key in fields}})
+    return counts, changes
+
+
+def replay_range(path, fmt, start, end, analyze, collection, batch_size=1000, write=True, diff=False,
+                 upsert=True, max_changes=100):
+    """
+    Decodes, analyzes and (optionally) diffs and writes the records of one chunk.
+
+    Every batch of records goes through the analysis path of the service's
+    batch mode (unique_events, then analyze_all).
+
+    Returns:
+        (Counter, list): counters ("records", "undecodable", "analyzed",
+        "written", "write_failed", "truncated" and the diff_results counts)
+        and up to max_changes changed results.
+    """
+    counts = Counter()
+    changes = []
+    writer = ResultWriter(collection, upsert=upsert, flush_size=batch_size) if write else None
+    decode = partial(decode_message, default_format=fmt)
+
+    def flush(records):
+        decoded = []
+        for record in records:
+            try:
+                decoded.append(decode(record))
+            except DECODE_ERRORS as e:
+                counts["undecodable"] += 1
+                logger.error("%s: failed to decode a record: %s", path, e)
+        events = unique_events(decoded)
+        results = [result.to_document() if hasattr(result, "to_document") else result
+                   for result in analyze_all(events, analyze)]
+        counts["records"] += len(records)
+        counts["analyzed"] += len(results)
+        if diff and results:
+            untimed = {event.id for event in events if event.timestamp is None}
+            diff_counts, diff_changes = diff_results(collection, results, untimed)
+            counts.update(diff_counts)
+            changes.extend(diff_changes[:max_changes - len(changes)])
+        if writer is not None and results:
+            counts["written" if writer.write(results) else "write_failed"] += len(results)
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if hasattr(buf, "madvise"):
+            # Read-ahead for the chunk (the range must start on a page boundary)
+            aligned = start - start % mmap.PAGESIZE
+            buf.madvise(mmap.MADV_SEQUENTIAL, aligned, end - aligned)
+        records = []
+        try:
+            for record in iter_records(buf, fmt, start, end):
+                records.append(record)
+                if len(records) >= batch_size:
+                    flush(records)
+                    records = []
+        except ValueError as e:
+            counts["truncated"] += 1
+            logger.error(f"{path}: {e}")
+        if records:
+            flush(records)
+    return counts, changes
+
+
+# --- Worker processes ---
+
+_worker = {}
+
+
+def _init_worker(options):
+    """Builds the analysis function and results collection once per worker process."""
+    from wizard.settings import get_settings
+    from wizard.utils.clients import registry
+
+    settings = get_settings()
+    logging.basicConfig(level=options["log_level"], format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    _worker["analyze"] = load_function(options["analysis"])
+    client = registry.mongo(options["mongodb_uri"] or settings.database.mongodb_uri)
+    _worker["collection"] = client[options["database"] or settings.database.name_analysis][options["collection"]]
+    _worker["options"] = options
+
+
+def _replay_task(path, fmt, start, end):
+    options = _worker["options"]
+    return replay_range(path, fmt, start, end, _worker["analyze"], _worker["collection"],
+                        batch_size=options["batch_size"], write=not options["dry_run"], diff=options["diff"],
+                        upsert=options["upsert"], max_changes=options["max_changes"])
+
+
+def replay(paths, options, workers, chunk_bytes, out=sys.stdout, diff_out=None):
+    """
+    Replays every archive on `workers` processes, keeping at most two chunks
+    per worker in flight. Returns the merged counters.
+    """
+    totals = Counter()
+    changes_left = options["max_changes"]
+    started = time.perf_counter()
+    read_bytes = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+        pending = set()
+
+        def collect(done):
+            nonlocal changes_left
+            for future in done:
+                counts, changes = future.result()
+                totals.update(counts)
+                if diff_out is not None:
+                    for change in changes[:changes_left]:
+                        diff_out.write(codec.dumps(change) + "\n")
+                    changes_left -= min(changes_left, len(changes))
+
+        for path in paths:
+            if os.path.getsize(path) == 0:
+                continue
+            fmt = archive_format(path, options["format"])
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for start, end in plan_chunks(buf, fmt, chunk_bytes):
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(pool.submit(_replay_task, path, fmt, start, end))
+                    read_bytes += end - start
+        collect(wait(pending)[0])
+
+    elapsed = time.perf_counter() - started
+    print(f"replayed {totals['records']:,} records ({read_bytes / 1e6:,.1f} MB) in {elapsed:.1f}s: "
+          f"{totals['records'] / elapsed:,.0f} records/s, {read_bytes / 1e6 / elapsed:,.1f} MB/s", file=out)
+    return totals
+
+
+def main(argv=None):
+    from wizard.settings import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Re-score archived events and bulk-write (or diff) the results.")
+    parser.add_argument("archives", nargs="+", help="NDJSON or length-prefixed protobuf files")
+    parser.add_argument("--format", choices=("auto", JSON, PROTOBUF), default="auto")
+    parser.add_argument("--analysis", default="analyzer.core:run_analysis",
+                        help="module:function producing a result per event")
+    parser.add_argument("--workers", type=int, default=settings.pipeline.worker_count)
+    parser.add_argument("--chunk-mb", type=float, default=16.0)
+    parser.add_argument("--batch-size", type=int, default=settings.writer.flush_size,
+                        help="events analyzed and written per bulk write")
+    parser.add_argument("--mongodb-uri", default=None, help="defaults to the database settings")
+    parser.add_argument("--database", default=None, help="defaults to the database settings")
+    parser.add_argument("--collection", default="results")
+    parser.add_argument("--insert", action="store_true",
+                        help="insert instead of replacing stored results by event_id (keeps existing ones)")
+    parser.add_argument("--diff", action="store_true", help="compare new results with the stored ones")
+    parser.add_argument("--diff-out", help="write changed results (NDJSON) to this file")
+    parser.add_argument("--max-changes", type=int, default=1000, help="changed results written to --diff-out")
+    parser.add_argument("--dry-run", action="store_true", help="analyze (and diff) without writing")
+    args = parser.parse_args(argv)
+
+    options = {
+        "format": args.format, "analysis": args.analysis, "batch_size": args.batch_size,
+        "mongodb_uri": args.mongodb_uri, "database": args.database, "collection": args.collection,
+        "upsert": not args.insert, "diff": args.diff or bool(args.diff_out), "dry_run": args.dry_run,
+        "max_changes": args.max_changes if args.diff_out else 0, "log_level": settings.service.log_level.upper(),
+    }
+    diff_out = open(args.diff_out, "w", encoding="utf-8") if args.diff_out else None
+    try:
+        totals = replay(args.archives, options, max(1, args.workers), int(args.chunk_mb * 1024 * 1024),
+                        diff_out=diff_out)
+    finally:
+        if diff_out is not None:
+            diff_out.close()
+    for key in ("records", "undecodable", "analyzed", "written", "write_failed", "truncated",
+                "unchanged", "changed", "missing", "unkeyed"):
+        if totals[key]:
+            print(f"  {key:<13} {totals[key]:>14,}")
+    return 1 if totals["write_failed"] or totals["truncated"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
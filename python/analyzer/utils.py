@@ -1,37 +1,81 @@
 # Wizard/python/analyzer/utils.py
 
-import os
-from dotenv import load_dotenv
+from wizard.settings import Settings, get_settings
 
-# Optional: Load environment variables from a .env file if running locally
-load_dotenv() 
 
-def load_analyzer_config():
+def load_analyzer_config(settings: Settings = None):
     """
-    Loads necessary configuration settings for the Analyzer service from 
-    environment variables.
-    
+    Flat view of the Analyzer settings, under the keys the service has always
+    used. Values come from wizard.settings: config/config.yaml, the
+    config/<WIZARD_ENV>/config.yaml overlay, then environment variables (a
+    local .env file is loaded first, if there is one).
+
+    Args:
+        settings: Settings to flatten (defaults to the process's current ones).
+
     Returns:
         dict: A dictionary containing all required configuration values.
     """
+    settings = settings or get_settings()
     config = {}
     
     # Kafka Configuration
-    config['KAFKA_BROKER'] = os.getenv("KAFKA_BROKER", "localhost:9092")
-    config['KAFKA_TOPIC'] = os.getenv("KAFKA_TOPIC", "events")
+    config['KAFKA_BROKER'] = settings.kafka.broker
+    config['KAFKA_TOPIC'] = settings.kafka.topic_events
+    config['KAFKA_GROUP_ID'] = settings.kafka.group_id
     
     # MongoDB Configuration
-    config['MONGODB_URI'] = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-    config['MONGODB_ANALYSIS_DB'] = os.getenv("MONGODB_ANALYSIS_DB", "wizard_analysis_dev")
+    config['MONGODB_URI'] = settings.database.mongodb_uri
+    config['MONGODB_ANALYSIS_DB'] = settings.database.name_analysis
+
+    # Seconds to keep retrying (with exponential backoff) when Kafka or
+    # MongoDB is unreachable at startup before giving up
+    config['CONNECT_TIMEOUT'] = settings.pipeline.connect_timeout
+
+    # Pipeline Tuning: "stream" handles one message at a time, "batch" polls
+    # up to BATCH_SIZE records (or waits at most BATCH_LINGER_MS) per round and
+    # "parallel" analyzes those batches on WORKERS processes (0 = one per CPU).
+    # "partitioned" processes every assigned partition in its own lane; a
+    # lane's partition is paused once LANE_MAX_PENDING records wait in it.
+    config['PIPELINE_MODE'] = settings.pipeline.mode
+    config['BATCH_SIZE'] = settings.pipeline.batch_size
+    config['BATCH_LINGER_MS'] = settings.pipeline.linger_ms
+    config['WORKERS'] = settings.pipeline.worker_count
+    config['LANE_MAX_PENDING'] = settings.pipeline.lane_max_pending
+    # "async" runs the pipeline inside the API process; MAX_IN_FLIGHT bounds
+    # the number of concurrent batch writes before fetching pauses.
+    config['MAX_IN_FLIGHT'] = settings.pipeline.max_in_flight
+    
+    # Result writes: stream mode buffers results and flushes every
+    # WRITE_FLUSH_SIZE documents or WRITE_FLUSH_MS (write-behind, at most
+    # WRITE_BUFFER_SIZE buffered); batch modes write each batch synchronously.
+    # WRITE_UPSERT replaces documents by event_id instead of inserting them.
+    config['WRITE_FLUSH_SIZE'] = settings.writer.flush_size
+    config['WRITE_FLUSH_MS'] = settings.writer.flush_ms
+    config['WRITE_BUFFER_SIZE'] = settings.writer.buffer_size
+    config['WRITE_RETRIES'] = settings.writer.retries
+    config['WRITE_UPSERT'] = settings.writer.upsert
+    
+    # Redelivered events are skipped before analysis: records below their
+    # partition's persisted watermark (saved every DEDUP_SAVE_MS in stream
+    # mode) and event_ids among the last DEDUP_WINDOW stored ones (a Bloom
+    # filter with DEDUP_ERROR_RATE false positives when that is non-zero).
+    config['DEDUP_ENABLED'] = settings.dedup.enabled
+    config['DEDUP_WINDOW'] = settings.dedup.window
+    config['DEDUP_ERROR_RATE'] = settings.dedup.error_rate
+    config['DEDUP_WATERMARKS'] = settings.dedup.watermarks
+    config['DEDUP_SAVE_MS'] = settings.dedup.save_ms
+    
+    # Read-through cache in front of the results collection (API read path)
+    config['RESULTS_CACHE_SIZE'] = settings.cache.results_size
+    config['RESULTS_CACHE_TTL'] = settings.cache.results_ttl
+    
+    # Wire format of messages without a content-type header: "json" or "protobuf"
+    config['WIRE_FORMAT'] = settings.pipeline.wire_format
     
     # Logging Level
-    config['LOG_LEVEL'] = os.getenv("LOG_LEVEL", "INFO")
+    config['LOG_LEVEL'] = settings.service.log_level
     
-    # Validation check (add more robust checks if needed)
-    if not config['KAFKA_BROKER'] or not config['MONGODB_URI']:
-        print("FATAL: Required environment variables (KAFKA_BROKER or MONGODB_URI) are missing.")
-        # In a real app, you would raise an exception here
-        
     return config
 
 def setup_logging(level_str="INFO"):
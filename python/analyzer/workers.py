@@ -0,0 +1,230 @@
+# Wizard/python/analyzer/workers.py
+
+import logging
+import math
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import partial
+
+from wizard.transport import DECODE_ERRORS, decode_message
+from . import metrics
+from .batching import next_offsets, poll_batch, rewind
+
+logger = logging.getLogger(__name__)
+
+
+def analyze_chunk(decode, analyze, messages, model_scores=None):
+    """
+    Decodes and analyzes a chunk of (value, headers) pairs inside a worker process.
+
+    With `model_scores`, a function mapping the decoded events to one model
+    score each (one forward pass for the chunk), every event is analyzed as
+    analyze(event, score); if it fails, as analyze(event).
+    Malformed or failing events are logged and skipped, like the serial loop.
+    Stage timings are recorded in the worker's own metrics (exported when
+    WIZARD_METRICS_DIR is set).
+
+    Returns:
+        list: Analysis results, in the order of the input messages.
+    """
+    events = []
+    with metrics.DECODE_SECONDS.time():
+        for value, headers in messages:
+            try:
+                events.append(decode(value, headers))
+            except DECODE_ERRORS as e:
+                metrics.EVENTS_UNDECODABLE.inc()
+                logger.error(f"Failed to decode message: {e}")
+    results = []
+    with metrics.ANALYZE_SECONDS.time():
+        scores = None
+        if model_scores is not None and events:
+            try:
+                scores = model_scores(events)
+            except Exception as e:
+                logger.error(f"Failed to score {len(events)} events with the model: {e}")
+        for i, event in enumerate(events):
+            try:
+                results.append(analyze(event) if scores is None else analyze(event, scores[i]))
+            except Exception as e:
+                metrics.EVENTS_FAILED.inc()
+                logger.error(f"An error occurred during event processing: {e}")
+    metrics.EVENTS_ANALYZED.inc(len(results))
+    return results
+
+
+def _pool_context():
+    """
+    forkserver where the platform has it, else spawn. Forking the consumer
+    process, which runs threads (Kafka I/O, log listener, settings watcher),
+    could copy a lock held by one of them into every worker.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class _PendingBatch:
+    """A polled batch whose chunks are being analyzed by the worker pool."""
+
+    def __init__(self, records, futures):
+        self.records = records
+        self.futures = futures
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def results(self):
+        # Chunks were submitted in record order, so concatenating them keeps
+        # the per-partition order of the input.
+        results = []
+        for future in self.futures:
+            results.extend(future.result())
+        return results
+
+
+class ParallelPipeline:
+    """
+    Feeds polled batches from one consumer to N analysis worker processes.
+
+    The consumer thread polls raw records, splits every batch into per-partition
+    chunks and submits them to a process pool. Completed batches are handed to a
+    single writer strictly in poll order, so results within a partition are
+    persisted in offset order. Offsets are committed only after a batch is
+    written; a failed write rewinds the consumer to the oldest uncommitted
+    record (at-least-once).
+
+    Workers are started fresh (forkserver or spawn, never fork), so they
+    inherit none of the state the consumer process built at runtime; anything
+    `analyze` needs beyond what importing its module sets up is rebuilt by
+    `initializer`.
+    """
+
+    def __init__(self, consumer, analyze, persist_batch, workers, batch_size,
+                 linger_ms, max_in_flight=None, decode=decode_message, model_scores=None,
+                 initializer=None, initargs=()):
+        """
+        Args:
+            consumer: A KafkaConsumer created with enable_auto_commit=False and
+                no value_deserializer (workers decode the raw bytes).
+            analyze: A picklable, module-level function mapping an event dict
+                to a result document.
+            persist_batch: Callable(results) -> bool, run on the writer side.
+            workers: Number of worker processes.
+            batch_size: Maximum records per polled batch.
+            linger_ms: Maximum time to wait for a batch to fill up.
+            max_in_flight: Maximum batches being analyzed at once
+                (defaults to twice the number of workers).
+            decode: Picklable function(value, headers) decoding a raw record.
+            model_scores: Optional picklable, module-level function mapping a
+                chunk of events to their model scores (see analyze_chunk).
+            initializer: Optional picklable function run once in every
+                worker process (with `initargs`) before its first chunk.
+            initargs: Arguments for `initializer`.
+        """
+        self.consumer = consumer
+        self.analyze = analyze
+        self.decode = decode
+        self.model_scores = model_scores
+        self.persist_batch = persist_batch
+        self.workers = workers
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self._running = False
+        self._executor = None
+        self._pending = deque()
+
+    def tune(self, batch_size, linger_ms, max_pending=None):
+        """Changes the batch size and linger time from the next poll on (max_pending is unused here)."""
+        self.batch_size = batch_size
+        self.linger_ms = linger_ms
+
+    def stop(self):
+        """Requests a graceful drain: stop polling, finish and commit in-flight batches."""
+        self._running = False
+
+    def run(self):
+        """
+        Runs the pipeline until stop() is called, then drains in-flight batches.
+        """
+        self._running = True
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context(),
+                                             initializer=self.initializer, initargs=self.initargs)
+        logger.info(f"Parallel pipeline started with {self.workers} worker processes.")
+        try:
+            while self._running:
+                if len(self._pending) < self.max_in_flight:
+                    records = poll_batch(self.consumer, self.batch_size, self.linger_ms)
+                    if records:
+                        metrics.observe_batch(records)
+                        self._pending.append(self._submit(records))
+                        metrics.BATCHES_IN_FLIGHT.inc()
+                else:
+                    # Pool is saturated: block until the oldest batch completes.
+                    wait(self._pending[0].futures)
+                self._write_completed(block=False)
+
+            logger.info(f"Draining {len(self._pending)} in-flight batches...")
+            self._write_completed(block=True)
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        logger.info("Parallel pipeline stopped.")
+
+    def _submit(self, records):
+        """Splits a batch into per-partition chunks and submits them to the pool."""
+        by_partition = {}
+        for record in records:
+            by_partition.setdefault((record.topic, record.partition), []).append(
+                (record.value, record.headers)
+            )
+
+        chunk_size = max(1, math.ceil(len(records) / self.workers))
+        task = partial(analyze_chunk, self.decode, self.analyze, model_scores=self.model_scores)
+        futures = []
+        for messages in by_partition.values():
+            for start in range(0, len(messages), chunk_size):
+                futures.append(self._executor.submit(task, messages[start:start + chunk_size]))
+        return _PendingBatch(records, futures)
+
+    def _write_completed(self, block):
+        """
+        Persists and commits completed batches in poll order.
+
+        With block=True every pending batch is waited for (used on drain).
+        """
+        while self._pending and (block or self._pending[0].done()):
+            batch = self._pending[0]
+            try:
+                results = batch.results()
+            except Exception as e:
+                logger.error(f"Worker failed while analyzing a batch: {e}")
+                self._abort_pending()
+                return
+            if results and not self.persist_batch(results):
+                metrics.PERSIST_FAILURES.inc()
+                self._abort_pending()
+                return
+            self._pending.popleft()
+            metrics.BATCHES_IN_FLIGHT.dec()
+            try:
+                self.consumer.commit(next_offsets(batch.records))
+            except Exception as e:
+                # The batch is already stored; an uncommitted batch is simply redelivered.
+                logger.error(f"Failed to commit offsets: {e}")
+
+    def _abort_pending(self):
+        """
+        Drops every in-flight batch and rewinds the consumer to the oldest of them.
+        """
+        records = []
+        for batch in self._pending:
+            wait(batch.futures)
+            records.extend(batch.records)
+        metrics.BATCHES_IN_FLIGHT.dec(len(self._pending))
+        self._pending.clear()
+        rewind(self.consumer, records)
+        logger.warning(f"Rewound consumer to redeliver {len(records)} records.")
@@ -0,0 +1,323 @@
+# Wizard/python/analyzer/writer.py
+
+import asyncio
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from pymongo import ASCENDING, DESCENDING, InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+
+from . import metrics
+from .batching import DUPLICATE_KEY_ERROR, insert_batch
+
+logger = logging.getLogger(__name__)
+
+# Indexes for reads by event, by user and by recency. event_id is unique
+# (among documents that have one; normalize_event makes every id a string)
+# so a redelivered insert fails with a duplicate key error, which
+# insert_batch treats as already stored.
+RESULT_INDEXES = (
+    ([("event_id", ASCENDING)], {"name": "event_id_unique", "unique": True,
+                                 "partialFilterExpression": {"event_id": {"$type": "string"}}}),
+    ([("user_id", ASCENDING), ("processed_at", DESCENDING)], {"name": "user_id_processed_at"}),
+    ([("processed_at", DESCENDING)], {"name": "processed_at"}),
+)
+
+
+def write_requests(documents, upsert):
+    """
+    The bulk_write requests storing documents: in upsert mode every document
+    with an event_id replaces the stored one, otherwise all are inserted.
+    """
+    if not upsert:
+        return [InsertOne(document) for document in documents]
+    return [
+        ReplaceOne({"event_id": document["event_id"]}, document, upsert=True)
+        if document.get("event_id") is not None else InsertOne(document)
+        for document in documents
+    ]
+
+
+def only_duplicates(error):
+    """True for a BulkWriteError whose only failures are duplicate keys (documents already stored)."""
+    details = error.details or {}
+    failed = [err for err in details.get('writeErrors', []) if err.get('code') != DUPLICATE_KEY_ERROR]
+    return not failed and not details.get('writeConcernErrors')
+
+
+def mirror(sink, documents):
+    """Hands stored documents to the sink; failures are logged, not raised."""
+    try:
+        sink.add(documents)
+    except Exception as e:
+        logger.error(f"Failed to add {len(documents)} results to the result sink: {e}")
+
+
+def is_transient(error):
+    """True for errors a retry may fix: lost connections, elections, write concern timeouts."""
+    if isinstance(error, ConnectionFailure):
+        return True
+    if isinstance(error, BulkWriteError):
+        details = error.details or {}
+        failed = [err for err in details.get('writeErrors', []) if err.get('code') != DUPLICATE_KEY_ERROR]
+        return not failed and bool(details.get('writeConcernErrors'))
+    return isinstance(error, PyMongoError) and error.has_error_label("RetryableWriteError")
+
+
+class ResultWriter:
+    """
+    Bulk writer for analysis results with a bounded write-behind buffer.
+
+    add() buffers a document; a background thread flushes the buffer when it
+    holds `flush_size` documents or `flush_interval` seconds after the last
+    flush. When the buffer is full, add() flushes on the caller's thread
+    (backpressure) instead of growing. write() stores a batch synchronously
+    and reports whether it is durable, for callers that commit offsets
+    afterwards.
+
+    Transient errors (see is_transient) are retried up to `max_retries` times
+    with exponentially growing, fully jittered delays. In upsert mode every
+    document with an event_id replaces the stored one, so redelivered events
+    never create duplicates; otherwise the unique event_id index makes
+    redelivered inserts fail harmlessly.
+
+    Every stored batch is also handed to `sink` (e.g. a ParquetSink), if any;
+    sink failures are logged and do not fail the write.
+
+    close() (registered with atexit by start()) flushes what is left.
+    """
+
+    def __init__(self, collection, upsert=False, flush_size=500, flush_interval=1.0,
+                 max_buffer=10_000, max_retries=5, backoff_base=0.1, backoff_max=5.0,
+                 sleep=time.sleep, sink=None):
+        self.collection = collection
+        self.sink = sink
+        self.upsert = upsert
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, flush_size)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        # Serializes flushes so buffered documents are written in order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def ensure_indexes(self):
+        """Creates the RESULT_INDEXES (a no-op for existing ones). Failures are logged, not raised."""
+        for keys, options in RESULT_INDEXES:
+            try:
+                self.collection.create_index(keys, **options)
+            except PyMongoError as e:
+                # e.g. existing duplicate event_ids; reads still work, only slower.
+                logger.error(f"Failed to create index {options['name']} on results: {e}")
+
+    def start(self):
+        """Ensures indexes and starts the background flusher."""
+        self.ensure_indexes()
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        """Stops the flusher and writes every buffered document; returns True if they are stored."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+            atexit.unregister(self.close)
+        stored = self.flush()
+        if self.sink is not None:
+            try:
+                self.sink.close()
+            except Exception as e:
+                logger.error(f"Failed to close the result sink: {e}")
+        return stored
+
+    def tune(self, flush_size, flush_interval, max_buffer, max_retries):
+        """Changes the buffering and retry settings; takes effect at the next add() or flush."""
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, flush_size)
+        self.max_retries = max_retries
+        self._wakeup.set()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, document):
+        """Buffers a document for the next flush."""
+        with self._lock:
+            self._buffer.append(document)
+            size = len(self._buffer)
+        if size >= self.max_buffer or (size >= self.flush_size and self._thread is None):
+            self.flush()
+        elif size >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Writes the buffered documents. After a transient failure that outlasted
+        the retries the documents are put back (as far as the buffer has room)
+        for the next flush; after any other failure they are dropped.
+
+        Returns:
+            bool: True if everything that was buffered is stored.
+        """
+        with self._flush_lock:
+            with self._lock:
+                documents = list(self._buffer)
+                self._buffer.clear()
+            if not documents:
+                return True
+            error = self._write(documents)
+            if error is None:
+                return True
+            kept = []
+            if is_transient(error):
+                with self._lock:
+                    kept = documents[:max(0, self.max_buffer - len(self._buffer))]
+                    self._buffer.extendleft(reversed(kept))
+            if len(kept) < len(documents):
+                metrics.WRITES_DROPPED.inc(len(documents) - len(kept))
+                logger.error(f"Dropped {len(documents) - len(kept)} buffered results after a failed write.")
+            return False
+
+    def write(self, documents):
+        """
+        Stores documents with one unordered bulk write, retrying transient errors.
+
+        Returns:
+            bool: True if every document is durably stored.
+        """
+        return self._write(documents) is None
+
+    def _write(self, documents):
+        """Writes with retries; returns None on success, else the last error."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.PERSIST_SECONDS.time():
+                    self._write_once(documents)
+                metrics.WRITES.inc(len(documents))
+                self._mirror(documents)
+                return None
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    logger.error(f"Failed to persist batch of {len(documents)} results to MongoDB: {e}")
+                    return e
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                metrics.WRITE_RETRIES.inc()
+                logger.warning(f"Transient MongoDB error, retrying batch of {len(documents)} in {delay:.2f}s: {e}")
+                self._sleep(delay)
+
+    def _mirror(self, documents):
+        """Hands stored documents to the sink."""
+        if self.sink is not None:
+            mirror(self.sink, documents)
+
+    def _write_once(self, documents):
+        if not self.upsert:
+            insert_batch(self.collection, documents)
+            return
+        try:
+            self.collection.bulk_write(write_requests(documents, upsert=True), ordered=False)
+        except BulkWriteError as e:
+            # Two concurrent upserts of one new event_id: the loser hits the unique index.
+            if not only_duplicates(e):
+                raise
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if self.sink is not None:
+                    self.sink.flush()
+            except Exception as e:
+                logger.error(f"Result writer flush failed: {e}")
+
+
+class AsyncResultWriter:
+    """
+    asyncio counterpart of ResultWriter.write() for a motor collection.
+
+    Every batch is stored with one unordered bulk_write (see write_requests),
+    transient errors are retried with the same jittered backoff (awaited, so
+    the event loop keeps running), duplicate keys count as stored, and the
+    same RESULT_INDEXES are ensured. Stored batches are handed to `sink` on
+    the default executor, since its writes go to files.
+    """
+
+    def __init__(self, collection, upsert=False, max_retries=5, backoff_base=0.1, backoff_max=5.0,
+                 sleep=asyncio.sleep, sink=None):
+        self.collection = collection
+        self.sink = sink
+        self.upsert = upsert
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+
+    async def ensure_indexes(self):
+        """Creates the RESULT_INDEXES (a no-op for existing ones). Failures are logged, not raised."""
+        for keys, options in RESULT_INDEXES:
+            try:
+                await self.collection.create_index(keys, **options)
+            except PyMongoError as e:
+                logger.error(f"Failed to create index {options['name']} on results: {e}")
+
+    def tune(self, max_retries):
+        self.max_retries = max_retries
+
+    async def write(self, documents):
+        """
+        Stores documents with one unordered bulk write, retrying transient errors.
+
+        Returns:
+            bool: True if every document is durably stored.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.PERSIST_SECONDS.time():
+                    await self._write_once(documents)
+                metrics.WRITES.inc(len(documents))
+                if self.sink is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, mirror, self.sink, documents)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    logger.error(f"Failed to persist batch of {len(documents)} results to MongoDB: {e}")
+                    return False
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                metrics.WRITE_RETRIES.inc()
+                logger.warning(f"Transient MongoDB error, retrying batch of {len(documents)} in {delay:.2f}s: {e}")
+                await self._sleep(delay)
+
+    async def _write_once(self, documents):
+        try:
+            await self.collection.bulk_write(write_requests(documents, self.upsert), ordered=False)
+        except BulkWriteError as e:
+            # Redelivered inserts (or two concurrent upserts of one new event_id)
+            if not only_duplicates(e):
+                raise
+
+    async def close(self):
+        """Closes (publishes) the sink's files."""
+        if self.sink is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.sink.close)
+            except Exception as e:
+                logger.error(f"Failed to close the result sink: {e}")
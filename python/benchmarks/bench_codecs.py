@@ -0,0 +1,75 @@
+# File: python/benchmarks/bench_codecs.py
+#
+# Compares the installed JSON codecs on Kafka-sized event payloads shaped like
+# data/sample_event.json. Run from the python/ directory:
+#
+#     python -m benchmarks.bench_codecs --messages 50000
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+from wizard.utils import codec
+
+SAMPLE_EVENT = Path(__file__).resolve().parents[2] / "data" / "sample_event.json"
+
+
+def generate_payloads(count, seed=42):
+    """Encodes count CollectorEvent messages using the sample event's payload as template."""
+    template = json.loads(SAMPLE_EVENT.read_text())
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(count):
+        data = dict(template["payload"])
+        data["value"] = round(rng.uniform(1, 2500), 2)
+        event = {
+            "id": f"evt-{i}",
+            "timestamp": template["timestamp"],
+            "type": rng.choice(["LOGIN", "PURCHASE", "CLICK", "TELEMETRY"]),
+            "user_id": f"u-{i % 5000}",
+            "source_service": "collector",
+            "data": data,
+        }
+        payloads.append(json.dumps(event).encode("utf-8"))
+    return payloads
+
+
+def _best_of(repeats, func):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON codecs on event payloads.")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = generate_payloads(args.messages)
+    decoded = [json.loads(payload) for payload in payloads]
+
+    # The pre-codec baseline: decode to str first, then parse.
+    baseline = _best_of(args.repeats, lambda: [json.loads(p.decode("utf-8")) for p in payloads])
+    print(f"messages: {args.messages}  (avg {sum(map(len, payloads)) // len(payloads)} bytes)")
+    print(f"{'json.loads(x.decode())':<28}{baseline * 1000:9.1f} ms  1.0x")
+
+    for name in codec.available_codecs():
+        impl = codec.get_codec(name)
+        for label, func in (
+            ("loads", lambda: [impl.loads(p) for p in payloads]),
+            ("decode_event", lambda: [impl.decode_event(p) for p in payloads]),
+            ("dumps", lambda: [impl.dumps(d) for d in decoded]),
+        ):
+            seconds = _best_of(args.repeats, func)
+            speedup = f"{baseline / seconds:4.1f}x" if label != "dumps" else ""
+            print(f"{name + '.' + label:<28}{seconds * 1000:9.1f} ms  {speedup}")
+
+
+if __name__ == "__main__":
+    main()
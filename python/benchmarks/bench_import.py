@@ -0,0 +1,80 @@
+# File: python/benchmarks/bench_import.py
+#
+# Cold-start import budget for the service entry points. Every entry point is
+# imported in a fresh interpreter with `python -X importtime`; the fastest of
+# --repeats runs is compared against its budget and the modules that cost the
+# most are listed. Exits non-zero when an entry point is over budget, so it can
+# gate CI. Run from the python/ directory:
+#
+#     python -m benchmarks.bench_import
+#     python -m benchmarks.bench_import --top 15 --scale 1.5   # slower machine
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PYTHON_DIR = Path(__file__).resolve().parents[1]
+SERVICE_DIR = PYTHON_DIR.parent / "analyzer"
+
+# entry point -> (module, working directory, budget in ms). Budgets leave a
+# quarter to a third of headroom over the import times measured on Python
+# 3.11 (service ~220 ms, core ~205 ms, APIs ~870-980 ms); pymongo and kafka
+# make up most of the service's time, fastapi/pydantic most of the APIs'.
+ENTRY_POINTS = {
+    "analyzer service": ("app.analyzer", SERVICE_DIR, 300),
+    "analyzer core": ("analyzer.core", PYTHON_DIR, 280),
+    "analyzer API": ("analyzer.main", PYTHON_DIR, 1100),
+    "wizard API": ("wizard.main", PYTHON_DIR, 1250),
+}
+
+
+def import_times(module, cwd):
+    """
+    Imports module in a fresh interpreter under -X importtime.
+
+    Returns:
+        (total_us, {module: self_us}): cumulative time of the import and the
+        self time of every module it loaded.
+    """
+    env = dict(os.environ, PYTHONPATH=str(PYTHON_DIR))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    total = 0
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules[name] = int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure entry point import times against their budgets.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="most expensive modules to list per entry point")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slower machines)")
+    args = parser.parse_args()
+
+    over = []
+    for name, (module, cwd, budget_ms) in ENTRY_POINTS.items():
+        runs = [import_times(module, cwd) for _ in range(args.repeats)]
+        total, modules = min(runs, key=lambda run: run[0])
+        budget_ms *= args.scale
+        status = "ok" if total / 1000 <= budget_ms else "OVER BUDGET"
+        if status != "ok":
+            over.append(name)
+        print(f"{name:<18} import {module:<16} {total / 1000:8.1f} ms  (budget {budget_ms:.0f} ms)  {status}")
+        for dependency, self_us in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {self_us / 1000:7.1f} ms  {dependency}")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# File: python/benchmarks/bench_logging.py
+#
+# Per-event cost of logging in analyze_event (two INFO records per event)
+# with the synchronous JSON handler, the queued handler and queued + sampling.
+# Output goes to a sink that blocks for --sink-latency-us per write, standing
+# in for a container log pipe or terminal (0 measures CPU cost only). Run from
+# the python/ directory:
+#
+#     python -m benchmarks.bench_logging --events 50000
+
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import time
+
+from wizard.core.analysis_engine import analyze_event
+from wizard.utils.logging import setup_logging, stop_logging
+
+from .bench_analysis_engine import generate_events
+
+
+class SlowSink:
+    """Write-only stream whose writes block (without holding the GIL) like a busy pipe."""
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+@contextlib.contextmanager
+def configured(sink_latency=0.0, **options):
+    """Configures the root logger with setup_logging, writing to a SlowSink over /dev/null."""
+    root = logging.getLogger()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, SlowSink(devnull, sink_latency)
+        try:
+            root.handlers.clear()
+            if options.pop("disabled", False):
+                root.addHandler(logging.NullHandler())
+                root.setLevel(logging.WARNING)
+            else:
+                setup_logging("INFO", **options)
+            yield
+        finally:
+            stop_logging()
+            root.handlers.clear()
+            sys.stdout = stdout
+
+
+def _best_of(repeats, func):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark logging overhead per analyzed event.")
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sink-latency-us", type=float, default=20.0)
+    args = parser.parse_args()
+    sink_latency = args.sink_latency_us / 1e6
+
+    events = generate_events(args.events)
+    variants = (
+        ("logging disabled", {"disabled": True}),
+        ("synchronous JSON", {"queued": False}),
+        ("queued JSON", {"queued": True, "queue_size": 4 * args.events}),
+        ("queued, 1% sampled", {"queued": True, "sample_rates": {"wizard.core": 0.01}}),
+    )
+
+    timings = []
+    for name, options in variants:
+        with configured(sink_latency, **options):
+            seconds = _best_of(args.repeats, lambda: [analyze_event(event) for event in events])
+        timings.append((name, seconds))
+
+    baseline = timings[0][1]
+    print(f"events: {args.events}   sink latency: {args.sink_latency_us} us/write")
+    for name, seconds in timings:
+        print(f"{name:<22}{seconds / args.events * 1e6:8.2f} us/event"
+              f"  logging share {max(0.0, 1 - baseline / seconds):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
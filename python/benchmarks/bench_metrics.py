@@ -0,0 +1,137 @@
+# File: python/benchmarks/bench_metrics.py
+#
+# Overhead of the pipeline metrics (analyzer.metrics) on the batched analyzer
+# loop. Runs AnalyzerCore._process_batch (decode, analyze, persist to an
+# in-memory collection, commit) with the real metrics and with no-op stand-ins,
+# and reports the instrumentation cost against the per-event budget at
+# --rate events/s. Run from the python/ directory:
+#
+#     python -m benchmarks.bench_metrics --events 50000 --batch-size 500
+
+import argparse
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+from analyzer import core, metrics, writer
+
+from .bench_analysis_engine import generate_events
+
+
+class _NullMetric:
+    """Accepts every metric call and does nothing."""
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL = _NullMetric()
+NULL_METRICS = SimpleNamespace(
+    observe_batch=lambda records: None,
+    **{name: _NULL for name in dir(metrics) if name.isupper() and not name.endswith("BUCKETS")},
+)
+
+
+class _Sink:
+    """In-memory stand-in for both the Kafka consumer and the results collection."""
+
+    def insert_many(self, documents, ordered=True):
+        pass
+
+    def commit(self, offsets):
+        pass
+
+
+def _records(events, batch_size):
+    now_ms = int(time.time() * 1000)
+    records = [
+        SimpleNamespace(topic="events", partition=i % 4, offset=i, timestamp=now_ms,
+                        value=json.dumps(event).encode("utf-8"), headers=[])
+        for i, event in enumerate(events)
+    ]
+    return [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+
+
+def _analyzer():
+    analyzer = core.AnalyzerCore.__new__(core.AnalyzerCore)
+    analyzer.consumer = _Sink()
+    analyzer.writer = writer.ResultWriter(_Sink())
+    analyzer.wire_format = "json"
+    return analyzer
+
+
+def _best_of(repeats, func):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _instrumentation_only(batches):
+    """The metric calls _process_batch makes per batch, without the work they measure."""
+    for records in batches:
+        metrics.observe_batch(records)
+        with metrics.DECODE_SECONDS.time():
+            pass
+        with metrics.ANALYZE_SECONDS.time():
+            pass
+        metrics.EVENTS_ANALYZED.inc(len(records))
+        with metrics.PERSIST_SECONDS.time():
+            pass
+        metrics.WRITES.inc(len(records))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline metrics overhead.")
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rate", type=int, default=50_000, help="target events/s for the budget check")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    batches = _records(generate_events(args.events), args.batch_size)
+    analyzer = _analyzer()
+
+    def process():
+        for records in batches:
+            analyzer._process_batch(records)
+
+    instrumented = _best_of(args.repeats, process)
+    core.metrics = writer.metrics = NULL_METRICS
+    try:
+        plain = _best_of(args.repeats, process)
+    finally:
+        core.metrics = writer.metrics = metrics
+    calls = _best_of(args.repeats, lambda: _instrumentation_only(batches))
+
+    budget = 1.0 / args.rate
+    per_event = calls / args.events
+    print(f"events: {args.events}   batch size: {args.batch_size}")
+    print(f"without metrics      {plain / args.events * 1e6:8.2f} us/event")
+    print(f"with metrics         {instrumented / args.events * 1e6:8.2f} us/event"
+          f"  ({instrumented / plain - 1:+.2%}, run-to-run noise included)")
+    print(f"metric calls only    {per_event * 1e9:8.1f} ns/event"
+          f"  = {per_event / budget:.3%} of the {budget * 1e6:.0f} us/event budget at {args.rate} events/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# File: python/benchmarks/bench_rules.py
+#
+# Measures rule evaluation cost as the rule count grows. Synthetic rule sets
+# spread N rules over a fixed number of event types, so the per-type dispatch
+# table keeps evaluation cost proportional to the rules of one type rather
+# than to N. A linear scan over every rule is timed for comparison. Run from
+# the python/ directory:
+#
+#     python -m benchmarks.bench_rules --rules 10 100 1000 5000
+
+import argparse
+import random
+import time
+
+import yaml
+from wizard.core.rules import RULES_DIR, RuleSet, load_rules
+
+from .bench_analysis_engine import generate_events
+
+
+def build_spec(rule_count, type_count, seed=42):
+    """A risk.yaml-shaped rule set with `rule_count` threshold rules over `type_count` types."""
+    rng = random.Random(seed)
+    spec = load_rules_spec()
+    types = ["LOGIN", "PURCHASE", "CLICK", "TELEMETRY"] + [f"TYPE_{i}" for i in range(type_count - 4)]
+    for i in range(rule_count):
+        spec["rules"].append({
+            "name": f"synthetic-{i}",
+            "type": rng.choice(types),
+            "when": {"field": rng.choice(["value", "latency_ms", "country"]), "op": "eq",
+                     "value": rng.randint(0, 10_000), "default": -1},
+            "add": 0.01,
+            "label": f"synthetic_{i % 48}",
+        })
+    return spec
+
+
+def load_rules_spec():
+    with open(RULES_DIR / "risk.yaml", "r", encoding="utf-8") as fh:
+        return yaml.safe_load(fh)
+
+
+def _best_of(repeats, func):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _linear_scan(rules, event_type, data):
+    """Evaluates every rule with a type check, i.e. without the dispatch table."""
+    score = rules.base_score(event_type)
+    labels = []
+    for rule in rules.rules:
+        if (event_type in rule.types or "*" in rule.types) and rule.matches(data):
+            score += rule.score
+            labels.extend(rule.labels)
+    return score, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rule evaluation cost vs. rule count.")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--rules", type=int, nargs="+", default=[0, 10, 100, 1000, 5000])
+    parser.add_argument("--types", type=int, default=50, help="Distinct event types in the rule set.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    events = [(event["type"], event["data"]) for event in generate_events(args.events)]
+    shipped = load_rules(RULES_DIR / "risk.yaml")
+    baseline = _best_of(args.repeats, lambda: [shipped.score(t, d) for t, d in events])
+    print(f"events: {args.events}   shipped risk.yaml, full scoring: {args.events / baseline:,.0f} events/s")
+    print(f"{'rules':>6}  {'compile':>10}  {'dispatch':>16}  {'linear scan':>16}")
+
+    for rule_count in args.rules:
+        spec = build_spec(rule_count, args.types)
+        start = time.perf_counter()
+        rules = RuleSet(spec)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        dispatch = _best_of(args.repeats, lambda: [rules.evaluate(t, d) for t, d in events])
+        linear = _best_of(args.repeats, lambda: [_linear_scan(rules, t, d) for t, d in events])
+        print(f"{len(rules):>6}  {compile_ms:8.1f}ms  {args.events / dispatch:10,.0f} ev/s  "
+              f"{args.events / linear:10,.0f} ev/s")
+
+
+if __name__ == "__main__":
+    main()
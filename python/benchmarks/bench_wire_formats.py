@@ -0,0 +1,50 @@
+# File: python/benchmarks/bench_wire_formats.py
+#
+# Compares JSON and protobuf (shared/proto/transport.proto) on payload size and
+# decode + analyze_event throughput. Run from the python/ directory:
+#
+#     python -m benchmarks.bench_wire_formats --messages 50000
+
+import argparse
+import json
+import logging
+import time
+
+from benchmarks.bench_codecs import generate_payloads
+from wizard.core.analysis_engine import analyze_event
+from wizard.transport import PROTOBUF, decode_message, encode_event
+
+
+def _best_of(repeats, func):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs. protobuf event decoding.")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    json_payloads = generate_payloads(args.messages)
+    proto_payloads = [encode_event(json.loads(payload)) for payload in json_payloads]
+
+    print(f"messages: {args.messages}")
+    for name, payloads, fmt in (("json", json_payloads, "json"), ("protobuf", proto_payloads, PROTOBUF)):
+        size = sum(map(len, payloads)) / len(payloads)
+        decode = _best_of(args.repeats, lambda: [decode_message(p, default_format=fmt) for p in payloads])
+        analyze = _best_of(
+            args.repeats, lambda: [analyze_event(decode_message(p, default_format=fmt)) for p in payloads]
+        )
+        print(f"{name:<10} {size:7.1f} bytes/msg  decode {args.messages / decode:12,.0f} msg/s"
+              f"  decode+analyze {args.messages / analyze:12,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
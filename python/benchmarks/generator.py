@@ -0,0 +1,131 @@
+# File: python/benchmarks/generator.py
+#
+# Reproducible synthetic events for the benchmark suite, shaped after the
+# events in data/sample_event.json (a single event, a JSON array or NDJSON).
+
+import json
+import math
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from wizard.models.events import EVENT_CLICK, EVENT_LOGIN, EVENT_PURCHASE, EVENT_TELEMETRY
+
+SAMPLE_EVENT = Path(__file__).resolve().parents[2] / "data" / "sample_event.json"
+
+# Used for types the samples do not cover (or all of them, for a single sample)
+DEFAULT_TYPE_MIX = {EVENT_CLICK: 0.45, EVENT_TELEMETRY: 0.25, EVENT_LOGIN: 0.2, EVENT_PURCHASE: 0.1}
+# Fewer samples than this per type cannot tell the mix apart from noise
+MIN_SAMPLES_FOR_MIX = 20
+# Spread (lognormal sigma) of payload sizes around the sample median
+PAYLOAD_SIZE_SIGMA = 0.35
+
+# Payload fields of types without samples
+_TYPE_FIELDS = {
+    EVENT_LOGIN: lambda rng: {"country": rng.choice(["US", "US", "US", "DE", "BR", "FR"]), "device": "desktop"},
+    EVENT_CLICK: lambda rng: {"element_id": f"btn-{rng.randint(1, 40)}", "latency_ms": rng.randint(1, 300)},
+    EVENT_TELEMETRY: lambda rng: {"latency_ms": rng.randint(1, 1500), "cpu": round(rng.random(), 3)},
+    EVENT_PURCHASE: lambda rng: {"value": round(rng.lognormvariate(4.5, 1.2), 2), "currency": "USD"},
+}
+
+
+def load_samples(path=SAMPLE_EVENT):
+    """Reads sample events from a JSON object, a JSON array or NDJSON."""
+    text = Path(path).read_text()
+    try:
+        samples = json.loads(text)
+    except json.JSONDecodeError:
+        samples = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return samples if isinstance(samples, list) else [samples]
+
+
+def _payload(event):
+    return event.get("payload") or event.get("data") or {}
+
+
+def _encoded_size(value):
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+class EventGenerator:
+    """
+    Generates events with the samples' field layout, type mix and payload sizes.
+
+    The type mix comes from the samples when every type has at least
+    MIN_SAMPLES_FOR_MIX of them, otherwise from DEFAULT_TYPE_MIX. Payloads of
+    sampled types start from one of that type's sample payloads (numeric
+    values are jittered); other types get their own typical fields. Payloads
+    are padded to sizes following a lognormal distribution around the median
+    sample payload size. The same seed yields the same events.
+    """
+
+    def __init__(self, samples=None, seed=42):
+        self.samples = samples if samples is not None else load_samples()
+        self.seed = seed
+        self._by_type = {}
+        for sample in self.samples:
+            self._by_type.setdefault(sample.get("type"), []).append(_payload(sample))
+
+        counts = Counter(sample.get("type") for sample in self.samples)
+        if counts and min(counts.values()) >= MIN_SAMPLES_FOR_MIX:
+            self.type_mix = {event_type: count / len(self.samples) for event_type, count in counts.items()}
+        else:
+            self.type_mix = dict(DEFAULT_TYPE_MIX)
+
+        sizes = sorted(_encoded_size(_payload(sample)) for sample in self.samples) or [128]
+        self.median_payload_bytes = sizes[len(sizes) // 2]
+
+        first = self.samples[0] if self.samples else {}
+        self._data_key = "payload" if "payload" in first else "data"
+        self._extra_keys = {key: first[key] for key in ("session_id", "source_service") if key in first}
+        self._start = datetime.fromisoformat(first.get("timestamp", "2025-01-01T00:00:00Z"))
+
+    def describe(self):
+        """Generator settings, for recording alongside benchmark results."""
+        return {
+            "seed": self.seed,
+            "samples": len(self.samples),
+            "type_mix": self.type_mix,
+            "median_payload_bytes": self.median_payload_bytes,
+        }
+
+    def _data(self, rng, event_type):
+        templates = self._by_type.get(event_type)
+        if templates:
+            data = dict(rng.choice(templates))
+            for key, value in data.items():
+                if isinstance(value, float):
+                    data[key] = round(value * rng.uniform(0.05, 2.0), 2)
+        else:
+            data = _TYPE_FIELDS[event_type](rng) if event_type in _TYPE_FIELDS else {}
+
+        target = int(self.median_payload_bytes * math.exp(rng.gauss(0.0, PAYLOAD_SIZE_SIGMA)))
+        padding = target - _encoded_size(data) - len('"metadata":"",')
+        if padding > 0:
+            data["metadata"] = "x" * padding
+        return data
+
+    def events(self, count):
+        """Returns count event dicts in the samples' spelling."""
+        rng = random.Random(self.seed)
+        types = list(self.type_mix)
+        weights = [self.type_mix[t] for t in types]
+        events = []
+        for i in range(count):
+            event_type = rng.choices(types, weights)[0]
+            timestamp = self._start + timedelta(milliseconds=i * 20)
+            event = {
+                "id": f"evt-{i}",
+                "timestamp": timestamp.isoformat().replace("+00:00", "Z"),
+                "type": event_type,
+                "user_id": f"u-{rng.randrange(5000)}",
+                **self._extra_keys,
+                self._data_key: self._data(rng, event_type),
+            }
+            events.append(event)
+        return events
+
+    def messages(self, count):
+        """Returns count events encoded as JSON Kafka message values."""
+        return [json.dumps(event).encode("utf-8") for event in self.events(count)]
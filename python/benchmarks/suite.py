@@ -0,0 +1,276 @@
+# File: python/benchmarks/suite.py
+#
+# Reproducible benchmark suite for the analysis and persistence paths.
+# Events come from benchmarks.generator (seeded from data/sample_event.json);
+# Kafka and MongoDB are replaced by in-memory stand-ins, so the suite runs
+# offline. Every case reports throughput and p50/p99 latency per operation
+# and the results are written as JSON for comparison between runs. Run from
+# the python/ directory:
+#
+#     python -m benchmarks.suite --events 20000 --output before.json
+#     python -m benchmarks.suite --events 20000 --compare before.json
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import bson
+
+from analyzer.core import AnalyzerCore
+from analyzer.writer import ResultWriter
+from wizard.core.analysis_engine import analyze_event
+from wizard.models import normalize_event
+from wizard.transport import decode_message
+
+from .generator import EventGenerator, SAMPLE_EVENT, load_samples
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SCHEMA_VERSION = 1
+
+
+class InMemoryCollection:
+    """MongoDB collection stand-in that BSON-encodes documents like the driver does before sending."""
+
+    def __init__(self):
+        self.documents = []
+
+    def insert_one(self, document):
+        self.documents.append(bson.encode(document))
+
+    def insert_many(self, documents, ordered=True):
+        self.documents.extend(bson.encode(document) for document in documents)
+
+    def clear(self):
+        self.documents.clear()
+
+
+class InMemoryConsumer:
+    """KafkaConsumer stand-in serving pre-built records; commits are recorded."""
+
+    def __init__(self, records):
+        self.records = records
+        self.committed = {}
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def commit(self, offsets):
+        self.committed.update(offsets)
+
+    def seek(self, partition, offset):
+        pass
+
+
+def _records(messages, partitions=4):
+    now_ms = int(time.time() * 1000)
+    return [
+        SimpleNamespace(topic="events", partition=i % partitions, offset=i // partitions,
+                        timestamp=now_ms, value=value, headers=[])
+        for i, value in enumerate(messages)
+    ]
+
+
+def _analyzer_core(records, collection):
+    core = AnalyzerCore.__new__(AnalyzerCore)  # skips the Kafka/Mongo connections
+    core.consumer = InMemoryConsumer(records)
+    core.writer = ResultWriter(collection)
+    core.wire_format = "json"
+    core.dedup = None  # every generated event is new
+    return core
+
+
+def _analyzer_service():
+    """The standalone Analyzer (analyzer/app) without its Kafka/Mongo setup, or None if it cannot be imported."""
+    service_root = str(REPO_ROOT / "analyzer")
+    if service_root not in sys.path:
+        sys.path.append(service_root)
+    try:
+        from app import analyzer as service
+    except ImportError as e:
+        logging.getLogger(__name__).warning(f"Skipping Analyzer service cases: {e}")
+        return None, None
+    instance = service.Analyzer.__new__(service.Analyzer)
+    instance.mongo_collection = InMemoryCollection()
+    instance.writer = ResultWriter(instance.mongo_collection)
+    instance.dedup = None
+    return service, instance
+
+
+def _batches(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _run_case(func, inputs, repeats, per_op_items=1, setup=None):
+    """
+    Calls func(item) for every input, `repeats` times after one discarded
+    warm-up pass.
+
+    Returns throughput (items/s of the fastest repeat) and per-call latency
+    percentiles over all repeats. Each call is timed individually, which adds
+    one perf_counter_ns pair (tens of ns) to every latency.
+    """
+    clock = time.perf_counter_ns
+    latencies = []
+    best = float("inf")
+    for repeat in range(repeats + 1):
+        if setup is not None:
+            setup()
+        # Start every pass without garbage left over from the previous one
+        gc.collect()
+        run = []
+        started = clock()
+        for item in inputs:
+            start = clock()
+            func(item)
+            run.append(clock() - start)
+        if repeat:
+            best = min(best, (clock() - started) / 1e9)
+            latencies.extend(run)
+    latencies.sort()
+    ops = len(inputs)
+    return {
+        "ops": ops,
+        "items_per_op": per_op_items,
+        "throughput_per_s": round(ops * per_op_items / best, 1),
+        "mean_us": round(statistics.fmean(latencies) / 1e3, 3),
+        "p50_us": round(latencies[len(latencies) // 2] / 1e3, 3),
+        "p99_us": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / 1e3, 3),
+    }
+
+
+def run_suite(events_count, batch_size, repeats, seed, samples_path=SAMPLE_EVENT, only=None):
+    """Runs every case and returns {case name: metrics}."""
+    generator = EventGenerator(load_samples(samples_path), seed=seed)
+    events = generator.events(events_count)
+    messages = [json.dumps(event).encode("utf-8") for event in events]
+    normalized = [normalize_event(event) for event in events]
+    records = _records(messages)
+    collection = InMemoryCollection()
+    core = _analyzer_core(records, collection)
+    core_results = [core._run_analysis(event) for event in events]
+    service, service_instance = _analyzer_service()
+
+    cases = {
+        "json_decode": lambda: _run_case(lambda m: decode_message(m, [], "json"), messages, repeats),
+        "analyze_event": lambda: _run_case(analyze_event, events, repeats),
+        "analyzer_core.run_analysis": lambda: _run_case(core._run_analysis, events, repeats),
+        "analyzer_core.persist_batch": lambda: _run_case(
+            core._persist_batch, _batches(core_results, batch_size), repeats, batch_size, setup=collection.clear),
+        "analyzer_core.process_batch": lambda: _run_case(
+            core._process_batch, _batches(records, batch_size), repeats, batch_size, setup=collection.clear),
+    }
+    if service is not None:
+        service_results = [service_instance._run_analysis(event) for event in normalized]
+        cases.update({
+            "analyzer_service.run_analysis": lambda: _run_case(service_instance._run_analysis, normalized, repeats),
+            "analyzer_service.persist_batch": lambda: _run_case(
+                service_instance._persist_batch, _batches(service_results, batch_size), repeats, batch_size,
+                setup=service_instance.mongo_collection.clear),
+        })
+
+    results = {}
+    for name, case in cases.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results[name] = case()
+    return generator, results
+
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Prints per-case changes against a baseline result file.
+
+    Returns the names of cases whose throughput dropped or whose p50 grew by
+    more than `threshold` (a fraction). p99 is shown but not gated: with a
+    few hundred samples per case it mostly reflects scheduler noise.
+    """
+    regressions = []
+    print(f"\n{'case':<32}{'throughput':>12}{'p50':>10}{'p99':>10}")
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<32}{'new':>12}")
+            continue
+        throughput = now["throughput_per_s"] / before["throughput_per_s"] - 1
+        p50 = now["p50_us"] / before["p50_us"] - 1 if before["p50_us"] else 0.0
+        p99 = now["p99_us"] / before["p99_us"] - 1 if before["p99_us"] else 0.0
+        regressed = throughput < -threshold or p50 > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<32}{throughput:>+12.1%}{p50:>+10.1%}{p99:>+10.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis and persistence paths.")
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--samples", default=str(SAMPLE_EVENT), help="sample events (JSON, JSON array or NDJSON)")
+    parser.add_argument("--only", action="append", help="run only cases whose name contains this (repeatable)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<UTC time>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative throughput drop or p50 increase counted as a regression")
+    args = parser.parse_args()
+    # Per-event INFO logs would dominate the measurements
+    logging.disable(logging.INFO)
+
+    generator, results = run_suite(args.events, args.batch_size, args.repeats, args.seed,
+                                   args.samples, args.only)
+
+    print(f"events: {args.events}   batch size: {args.batch_size}   repeats: {args.repeats}   seed: {args.seed}")
+    print(f"{'case':<32}{'items/s':>12}{'p50 us':>10}{'p99 us':>10}")
+    for name, result in results.items():
+        print(f"{name:<32}{result['throughput_per_s']:>12,.0f}{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}")
+
+    report = {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": _environment(),
+        "parameters": {"events": args.events, "batch_size": args.batch_size, "repeats": args.repeats,
+                       "generator": generator.describe()},
+        "results": results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get("parameters", {}).get("generator") != report["parameters"]["generator"]:
+            print("warning: baseline was generated with different generator settings")
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+from wizard.core.baselines import BaselineStore, DDSketch
+from wizard.core.rules import RULES_DIR, load_rules
+
+
+def test_sketch_quantiles_are_relatively_accurate_and_merge():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20_000)]
+    left, right = DDSketch(0.01, max_bins=1024), DDSketch(0.01, max_bins=1024)
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert left.quantile(q) == pytest.approx(exact, rel=0.03)
+    assert left.count == len(values)
+
+    with pytest.raises(ValueError):
+        left.merge(DDSketch(0.02))
+
+
+def test_sketch_memory_is_bounded_by_collapsing_low_bins():
+    sketch = DDSketch(0.01, max_bins=64)
+    for i in range(1, 100_000, 7):
+        sketch.add(i / 10)
+
+    assert len(sketch.bins) <= 64
+    assert sketch.quantile(0.99) == pytest.approx(9900, rel=0.02)
+
+
+def test_values_are_scored_against_their_own_key():
+    rng = random.Random(1)
+    store = BaselineStore(min_samples=30)
+    for i in range(500):
+        assert (store.observe("fast", rng.gauss(20, 2), now=i) is None) == (i < 30)
+        store.observe("slow", rng.gauss(400, 40), now=i)
+
+    # 150ms is an outlier for "fast" and an unusually quick answer for "slow"
+    fast = store.observe("fast", 150, now=500)
+    slow = store.observe("slow", 150, now=500)
+    assert fast.z > 10 and fast.ratio > 3
+    assert slow.z < 0 and slow.ratio < 1
+    assert fast.mean == pytest.approx(20, abs=2)
+
+    bounded = BaselineStore(max_keys=2, ttl_seconds=100)
+    for i, key in enumerate("abc"):
+        bounded.observe(key, 1.0, now=i)
+    assert len(bounded) == 2 and bounded.get("a") is None
+    bounded.observe("c", 1.0, now=102)
+    assert bounded.get("b") is None
+
+
+def test_snapshots_restore_and_merge_across_workers(tmp_path):
+    workers = [BaselineStore(min_samples=10), BaselineStore(min_samples=10)]
+    for i in range(200):
+        workers[i % 2].observe("svc", 100 + i % 5, now=i)
+
+    path = tmp_path / "baselines.json"
+    workers[0].snapshot(str(path))
+    merged = BaselineStore(min_samples=10)
+    merged.restore(str(path))
+    merged.merge(workers[1])
+
+    baseline = merged.get("svc")
+    assert baseline.count == 200 and baseline.sketch.count == 200
+    assert baseline.mean == pytest.approx(102, abs=1)
+    assert merged.observe("svc", 500, now=200).z > 3
+
+
+def test_analyzer_rules_use_the_baseline_once_available():
+    rules = load_rules(RULES_DIR / "analyzer.yaml")
+
+    # No baseline yet: the fixed threshold applies
+    assert rules.score("TELEMETRY", {"latency_ms": 150})[1] == ["telemetry", "high_latency"]
+    assert rules.score("TELEMETRY", {"latency_ms": 50})[1] == ["normal"]
+    # With a baseline only deviations from it count
+    assert rules.score("TELEMETRY", {"latency_ms": 450, "latency_z": 0.4, "latency_ratio": 0.8})[1] == ["normal"]
+    assert rules.score("TELEMETRY", {"latency_ms": 45, "latency_z": 6.0, "latency_ratio": 1.5})[:2] == (
+        0.5, ["telemetry", "high_latency", "latency_anomaly"])
@@ -0,0 +1,113 @@
+import random
+
+import pytest
+from wizard.core.analysis_engine import analyze_event, analyze_events, risk_rules
+from wizard.core.rules import RuleSet
+
+
+def _random_events(count, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        event_type = rng.choice(["LOGIN", "PURCHASE", "CLICK", "TELEMETRY", "UNKNOWN_PING"])
+        data = {}
+        if event_type == "PURCHASE" and rng.random() < 0.9:
+            data["value"] = rng.choice([0, 999.99, 1000, 1000.01, rng.uniform(0, 5000)])
+        if event_type == "LOGIN" and rng.random() < 0.9:
+            data["country"] = rng.choice(["US", "DE", "BR"])
+        event = {"id": f"evt-{i}", "type": event_type, "user_id": f"u-{i % 13}"}
+        if rng.random() < 0.95:
+            event["data"] = data
+        events.append(event)
+    # Events missing optional keys entirely
+    events.append({})
+    events.append({"id": "no-type"})
+    return events
+
+
+def _strip_timestamp(result):
+    return {key: value for key, value in result.items() if key != "processed_at"}
+
+
+def test_batch_matches_per_event_results():
+    """analyze_events must give exactly the same scores and labels as analyze_event."""
+    events = _random_events(2000)
+
+    batch = analyze_events(events)
+    expected = [_strip_timestamp(analyze_event(event)) for event in events]
+
+    assert len(batch) == len(events)
+    assert [_strip_timestamp(result) for result in batch.to_dicts()] == expected
+
+
+def test_batch_columnar_form():
+    """The columnar view exposes raw arrays and per-row label expansion."""
+    events = [
+        {"id": "a", "type": "PURCHASE", "data": {"value": 1500.0}},
+        {"id": "b", "type": "LOGIN", "data": {"country": "DE"}},
+        {"id": "c", "type": "CLICK", "data": {}},
+    ]
+
+    batch = analyze_events(events)
+
+    assert batch.event_ids == ["a", "b", "c"]
+    assert batch.scores.tolist() == [pytest.approx(1.0), pytest.approx(0.6), pytest.approx(0.1)]
+    assert batch.labels(0) == ["high_value_transaction", "high_risk"]
+    assert batch.labels(1) == ["international_access", "medium_risk"]
+    assert batch.labels(2) == []
+
+
+def test_empty_batch():
+    """An empty batch produces an empty result."""
+    batch = analyze_events([])
+
+    assert len(batch) == 0
+    assert batch.to_dicts() == []
+
+
+def test_batch_matches_per_event_results_for_every_operator():
+    """Column-wise conditions agree with the per-event predicates, mixed payload types included."""
+    spec = {
+        "name": "operators",
+        "defaults": {"detail": "Checked {type}."},
+        "rules": [
+            {"name": "gt", "when": {"field": "n", "op": "gt", "value": 10, "default": 0}, "add": 0.01, "label": "gt"},
+            {"name": "le", "when": {"field": "n", "op": "le", "value": 2.5, "default": 0}, "add": 0.02, "label": "le"},
+            {"name": "eq", "when": {"field": "flag", "op": "eq", "value": True, "default": False}, "add": 0.04,
+             "label": "eq"},
+            {"name": "ne", "when": {"field": "s", "op": "ne", "value": "a", "default": "a"}, "add": 0.08, "label": "ne"},
+            {"name": "in", "when": {"field": "s", "op": "in", "value": ["b", 3], "default": None}, "add": 0.16,
+             "label": "in"},
+            {"name": "not_in", "type": "X", "when": [{"field": "s", "op": "not_in", "value": ["a"], "default": "a"},
+                                                     {"field": "n", "op": "ge", "value": 1, "default": 0}],
+             "set": 0.5, "label": "not_in"},
+        ],
+    }
+    rng = random.Random(3)
+    events = []
+    for i in range(500):
+        data = {}
+        for field, choices in (("n", [0, 1, 2.5, 11, True, 10**20]), ("flag", [True, False, 1, 0, "yes"]),
+                               ("s", ["a", "b", 3, None, "c"])):
+            if rng.random() < 0.8:
+                data[field] = rng.choice(choices)
+        events.append({"id": f"e{i}", "type": rng.choice(["X", "Y"]), "data": data})
+
+    previous, risk_rules.current = risk_rules.current, RuleSet(spec)
+    try:
+        batch = analyze_events(events)
+        expected = [_strip_timestamp(analyze_event(event)) for event in events]
+    finally:
+        risk_rules.current = previous
+
+    assert [_strip_timestamp(result) for result in batch.to_dicts()] == expected
+
+
+def test_expanded_rows_do_not_share_label_lists():
+    """Every dict of to_dicts owns its labels."""
+    rows = analyze_events([{"id": "a", "type": "PURCHASE", "data": {"value": 1500.0}},
+                           {"id": "b", "type": "PURCHASE", "data": {"value": 1500.0}}]).to_dicts()
+
+    rows[0]["labels"].append("edited")
+
+    assert rows[1]["labels"] == ["high_value_transaction", "high_risk"]
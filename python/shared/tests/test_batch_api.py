@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from wizard.api import analysis
+from wizard.api.analysis import BodyError, iter_json_array, iter_ndjson
+from wizard.api.results import ResultStore
+from wizard.core.analysis_engine import analyze_event
+from wizard.main import app
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+
+class FakeResults:
+    """In-memory stand-in for the motor results collection."""
+
+    def __init__(self, documents):
+        self.documents = {document["event_id"]: document for document in documents}
+        self.queries = []
+
+    async def find_one(self, query, projection=None):
+        self.queries.append(query)
+        document = self.documents.get(query["event_id"])
+        return dict(document) if document is not None else None
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor([self.documents[i] for i in query["event_id"]["$in"] if i in self.documents])
+
+
+def _events(count):
+    types = ["LOGIN", "PURCHASE", "CLICK", "TELEMETRY"]
+    return [{"id": f"e{i}", "type": types[i % 4], "user_id": "u",
+             "data": {"value": i * 10, "country": "DE" if i % 3 else "US"}} for i in range(count)]
+
+
+def _without_timestamp(result):
+    return {key: value for key, value in result.items() if key != "processed_at"}
+
+
+def _collect(generator):
+    async def run():
+        return [item async for item in generator]
+    return asyncio.run(run())
+
+
+async def _chunked(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(analysis, "BATCH_CHUNK_SIZE", 7)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("as_array", [False, True])
+def test_batch_results_match_analyze_event(client, as_array):
+    events = _events(30)
+    if as_array:
+        body = json.dumps(events)
+    else:
+        body = "\n".join(json.dumps(event) for event in events) + "\n"
+
+    response = client.post("/api/v1/analyze:batch", content=body)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [_without_timestamp(r) for r in results] == [_without_timestamp(analyze_event(e)) for e in events]
+
+
+def test_single_event_matches_analyze_event(client):
+    event = _events(2)[1]
+
+    response = client.post("/api/v1/analyze", content=json.dumps(event))
+
+    assert response.status_code == 200
+    assert _without_timestamp(response.json()) == _without_timestamp(analyze_event(event))
+    assert client.post("/api/v1/analyze", content=b"[1]").status_code == 400
+    assert client.post("/api/v1/analyze", content=b"{").status_code == 400
+
+
+def test_batch_reports_bad_lines_in_place(client):
+    body = b'{"id": "a", "type": "CLICK"}\nnot json\n\n[1, 2]\n{"id": "b", "type": "LOGIN"}'
+
+    lines = [json.loads(line) for line in client.post("/api/v1/analyze:batch", content=body).text.splitlines()]
+
+    assert [line.get("event_id") for line in lines] == ["a", None, None, "b"]
+    assert lines[1]["index"] == 2 and "error" in lines[1]
+    assert lines[2] == {"index": 4, "error": "event must be a JSON object"}
+
+
+def test_batch_reports_malformed_array(client):
+    lines = client.post("/api/v1/analyze:batch", content=b'[{"id": "a"}, {"id": ').text.splitlines()
+
+    assert json.loads(lines[0])["event_id"] == "a"
+    assert "error" in json.loads(lines[-1])
+
+
+def test_array_parser_handles_arbitrary_chunking():
+    events = [{"id": "ü-1", "n": 12345}, None, 7, {"nested": [1, {"a": "]"}]}]
+    data = json.dumps(events, ensure_ascii=False).encode("utf-8")
+
+    for size in (1, 2, 3, 64):
+        assert _collect(iter_json_array(_chunked(data, size))) == list(enumerate(events))
+
+    with pytest.raises(BodyError):
+        _collect(iter_json_array(_chunked(b'{"not": "an array"}', 4)))
+
+
+def test_ndjson_parser_handles_arbitrary_chunking():
+    data = b'{"a": 1}\n\n{"b": 2}'
+
+    for size in (1, 5, 64):
+        assert _collect(iter_ndjson(_chunked(data, size))) == [(1, {"a": 1}), (3, {"b": 2})]
+
+
+def test_bulk_lookup_reads_uncached_ids_once(client):
+    collection = FakeResults([{"event_id": "a", "score": 0.1}, {"event_id": "b", "score": 0.5}])
+    app.state.results = ResultStore(collection)
+    client.get("/api/v1/analysis/a")
+
+    response = client.get("/api/v1/analysis", params={"ids": ["a,b", "c", "b"]})
+
+    assert response.json() == {
+        "results": {"a": {"event_id": "a", "score": 0.1}, "b": {"event_id": "b", "score": 0.5}},
+        "missing": ["c"],
+    }
+    assert collection.queries[-1] == {"event_id": {"$in": ["b", "c"]}}
+    assert len(collection.queries) == 2
+
+
+def test_bulk_lookup_limits_id_count(client):
+    app.state.results = ResultStore(FakeResults([]))
+    ids = ",".join(str(i) for i in range(analysis.MAX_LOOKUP_IDS + 1))
+
+    assert client.get("/api/v1/analysis", params={"ids": ids}).status_code == 400
@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+import pytest
+from wizard.utils.clients import (
+    Backoff,
+    ClientRegistry,
+    Unavailable,
+    async_retry,
+    kafka_consumer_options,
+    retry,
+)
+
+UNREACHABLE = "mongodb://127.0.0.1:1/"
+
+
+def test_backoff_grows_exponentially_up_to_the_maximum():
+    backoff = Backoff(initial=0.1, maximum=0.5)
+
+    delays = [backoff.next() for _ in range(6)]
+
+    for delay, cap in zip(delays, [0.1, 0.2, 0.4, 0.5, 0.5, 0.5]):
+        assert cap / 2 <= delay <= cap
+    backoff.reset()
+    assert backoff.next() <= 0.1
+
+
+def test_retry_sleeps_between_failures_until_success():
+    sleeps = []
+    attempts = iter([ConnectionError("down"), ConnectionError("down"), "client"])
+
+    def connect():
+        outcome = next(attempts)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert retry(connect, "test", retry_on=(ConnectionError,), sleep=sleeps.append) == "client"
+    assert len(sleeps) == 2 and sleeps[0] <= 0.1 < sleeps[1] * 2
+
+
+def test_retry_gives_up_after_timeout_and_ignores_other_errors():
+    now = [0.0]
+
+    def sleep(delay):
+        now[0] += delay
+
+    def connect():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        retry(connect, "test", retry_on=(ConnectionError,), timeout=1.0, sleep=sleep, clock=lambda: now[0])
+    assert 0.3 <= now[0] <= 1.0
+
+    with pytest.raises(KeyError):
+        retry(lambda: {}["missing"], "test", retry_on=(ConnectionError,), sleep=sleep)
+
+
+def test_async_retry():
+    attempts = []
+
+    async def connect():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ConnectionError("down")
+        return "consumer"
+
+    result = asyncio.run(async_retry(connect, "test", retry_on=(ConnectionError,),
+                                     backoff=Backoff(initial=0.001)))
+    assert result == "consumer" and len(attempts) == 2
+
+
+def test_registry_shares_clients_per_uri_and_options():
+    registry = ClientRegistry()
+    try:
+        client = registry.mongo("mongodb://db-a:27017/")
+
+        assert registry.mongo("mongodb://db-a:27017/") is client
+        assert registry.mongo("mongodb://db-b:27017/") is not client
+        assert registry.mongo("mongodb://db-a:27017/", maxPoolSize=5) is not client
+        assert client.options.pool_options.max_pool_size == 50
+        # Lazy: nothing is connected until the first operation
+        assert client.nodes == frozenset()
+    finally:
+        registry.close()
+
+
+def test_registry_forgets_clients_in_forked_child():
+    registry = ClientRegistry()
+    client = registry.mongo("mongodb://db-a:27017/")
+
+    registry._forget()
+
+    assert registry.mongo("mongodb://db-a:27017/") is not client
+    client.close()
+    registry.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_module_registry_is_empty_after_fork():
+    from wizard.utils.clients import registry
+
+    registry.mongo("mongodb://db-a:27017/")
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write, str(len(registry._clients)).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 16) == b"0"
+    registry.close()
+
+
+def test_unreachable_mongo_fails_health_check():
+    registry = ClientRegistry()
+    try:
+        assert registry.ping_mongo(UNREACHABLE, timeout=0.2) is False
+        with pytest.raises(Unavailable):
+            registry.wait_for_mongo(UNREACHABLE, timeout=0.3, sleep=lambda _: None)
+    finally:
+        registry.close()
+
+
+def test_kafka_consumer_options_are_tuned_and_overridable():
+    options = kafka_consumer_options(group_id="g", reconnect_backoff_max_ms=500)
+
+    assert options["group_id"] == "g"
+    assert options["reconnect_backoff_max_ms"] == 500
+    assert options["reconnect_backoff_ms"] == 50
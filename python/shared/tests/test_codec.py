@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from wizard.models import normalize_event
+from wizard.utils import codec
+
+
+@pytest.fixture(params=codec.available_codecs())
+def json_codec(request):
+    return codec.get_codec(request.param)
+
+
+def test_loads_decodes_bytes_directly(json_codec):
+    """Every codec decodes raw Kafka bytes without a prior .decode('utf-8')."""
+    payload = json.dumps({"id": "e-1", "data": {"value": 12.5, "note": "café"}}).encode("utf-8")
+
+    assert json_codec.loads(payload) == {"id": "e-1", "data": {"value": 12.5, "note": "café"}}
+
+
+def test_dumps_round_trip_and_non_serializable(json_codec):
+    """dumps returns a str and stringifies values JSON cannot represent."""
+    encoded = json_codec.dumps({"level": "INFO", "obj": object})
+
+    assert isinstance(encoded, str)
+    assert json.loads(encoded)["obj"] == str(object)
+
+
+def test_decode_event_supports_dict_style_access(json_codec):
+    """Typed or not, decoded events answer .get like the plain dicts they replace."""
+    payload = b'{"id": "e-2", "type": "LOGIN", "user_id": "u-1", "data": {"country": "DE"}, "extra": 1}'
+
+    event = json_codec.decode_event(payload)
+
+    assert event.get("type") == "LOGIN"
+    assert event.get("data", {}).get("country") == "DE"
+    assert event.get("source_service", "n/a") == "n/a"
+
+
+@pytest.mark.parametrize("payload", [
+    b'{"id": 42, "timestamp": 1735689600, "type": "LOGIN", "user_id": 7, "data": {"country": "DE"}}',
+    b'{"EventID": "e-3", "Timestamp": "2025-10-02T10:00:00+00:00", "Action": "checkout", "UserID": "u-2",'
+    b' "session_id": "s-1", "Payload": {"value": 1250.99}}',
+    b'{"timestamp": "2025-10-02T10:00:00Z", "type": "PURCHASE", "payload": {"value": 1250.99}}',
+])
+def test_typed_events_normalize_like_plain_dicts(json_codec, payload):
+    """Numeric ids and timestamps and the legacy spellings survive typed decoding."""
+    assert normalize_event(json_codec.decode_event(payload)) == normalize_event(json.loads(payload))
+
+
+def test_malformed_input_raises_decode_error(json_codec):
+    with pytest.raises(codec.DECODE_ERRORS):
+        json_codec.loads(b"{not json")
+
+
+def test_unknown_codec_falls_back_to_stdlib():
+    assert codec.get_codec("does-not-exist").name == "json"
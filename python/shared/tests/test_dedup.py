@@ -0,0 +1,37 @@
+from wizard.utils.dedup import BloomFilter, RecentIds, recent_ids
+
+
+def test_recent_ids_forget_oldest_beyond_capacity():
+    ids = RecentIds(3)
+    for event_id in ["a", "b", "c", "a", "d"]:
+        ids.add(event_id)
+
+    assert "a" not in ids
+    assert all(event_id in ids for event_id in "bcd")
+    assert len(ids) == 3
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(10_000, error_rate=0.01)
+    for i in range(10_000):
+        bloom.add(f"event-{i}")
+
+    assert all(f"event-{i}" in bloom for i in range(10_000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(20_000))
+    assert false_positives / 20_000 < 0.02
+
+
+def test_bloom_filter_window_rotates():
+    bloom = BloomFilter(100, error_rate=0.001)
+    for i in range(300):
+        bloom.add(i)
+
+    # The last capacity..2*capacity ids are kept, older generations dropped
+    assert all(i in bloom for i in range(200, 300))
+    assert sum(i in bloom for i in range(100)) <= 2
+    assert bloom.nbytes < 1000
+
+
+def test_recent_ids_factory():
+    assert isinstance(recent_ids(10), RecentIds)
+    assert isinstance(recent_ids(10, 0.01), BloomFilter)
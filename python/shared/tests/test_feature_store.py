@@ -0,0 +1,162 @@
+import pytest
+from wizard.core.analysis_engine import analyze_event, analyze_events, set_feature_store
+from wizard.core.features import FeatureStore
+from wizard.models import CollectorEvent
+
+
+def _event(user_id, event_type, ts, **data):
+    return CollectorEvent(id=f"{user_id}-{ts}", timestamp=ts, type=event_type, user_id=user_id, data=data)
+
+
+def test_rolling_window_counts_and_sums():
+    store = FeatureStore(window_seconds=600, bucket_seconds=10)
+    for ts, value in ((1000, 10), (1100, 20), (1500, 30)):
+        store.record(_event("u", "PURCHASE", ts, value=value))
+
+    assert store.count("u", "PURCHASE") == 3
+    assert store.total("u", "PURCHASE") == 60
+    # The first purchase falls out of the 10 minute window
+    assert store.count("u", "PURCHASE", now=1650) == 2
+    assert store.total("u", "PURCHASE", now=1650) == 50
+    assert store.count("u", "LOGIN") == 0
+    assert store.count("nobody", "PURCHASE") == 0
+
+
+def test_last_and_new_country():
+    store = FeatureStore()
+    assert not store.is_new_country("u", "FR")  # no history yet
+
+    store.record(_event("u", "LOGIN", 1000, country="US"))
+    store.record(_event("u", "LOGIN", 1001, country="DE"))
+
+    assert store.last_country("u", "LOGIN") == "DE"
+    assert store.last_country("u", "PURCHASE") is None
+    assert not store.is_new_country("u", "US")
+    assert store.is_new_country("u", "FR")
+
+
+def test_lru_and_ttl_eviction():
+    store = FeatureStore(max_users=2, ttl_seconds=100)
+    store.record(_event("a", "CLICK", 1000))
+    store.record(_event("b", "CLICK", 1001))
+    store.record(_event("a", "CLICK", 1002))
+    store.record(_event("c", "CLICK", 1003))
+
+    # "b" was the least recently seen user
+    assert store.count("b", "CLICK") == 0
+    assert len(store) == 2
+
+    store.record(_event("d", "CLICK", 1200))
+    assert len(store) == 1
+    assert store.count("d", "CLICK") == 1
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = FeatureStore()
+    store.record(_event("u", "PURCHASE", 1000, value=5, country="US"))
+    store.record(_event("u", "PURCHASE", 1020, value=7))
+    path = str(tmp_path / "features.json")
+    store.snapshot(path)
+
+    restored = FeatureStore()
+    restored.restore(path)
+
+    assert restored.count("u", "PURCHASE") == 2
+    assert restored.total("u", "PURCHASE") == 12
+    assert restored.last_country("u", "PURCHASE") == "US"
+
+
+def test_restore_rejects_unknown_version(tmp_path):
+    path = tmp_path / "features.json"
+    path.write_text('{"version": 99, "users": {}}')
+
+    with pytest.raises(ValueError):
+        FeatureStore().restore(str(path))
+
+
+def test_velocity_rules_in_analysis():
+    store = FeatureStore()
+    events = [{"id": f"e{i}", "type": "PURCHASE", "user_id": "u", "timestamp": 1000 + i,
+               "data": {"value": 10}} for i in range(3)]
+
+    results = [analyze_event(event, store) for event in events]
+
+    assert "purchase_velocity" not in results[1]["labels"]
+    assert results[2]["labels"] == ["purchase_velocity", "high_risk"]
+    assert results[2]["score"] == 1.0
+
+    result = analyze_event({"id": "l1", "type": "LOGIN", "user_id": "u", "timestamp": 1010,
+                            "data": {"country": "US"}}, store)
+    assert result["labels"] == ["medium_risk"]
+    result = analyze_event({"id": "l2", "type": "LOGIN", "user_id": "u", "timestamp": 1011,
+                            "data": {"country": "FR"}}, store)
+    assert result["labels"] == ["international_access", "new_country", "high_risk"]
+
+
+def test_scores_unchanged_without_store():
+    result = analyze_event({"id": "e", "type": "PURCHASE", "user_id": "u", "data": {"value": 10}})
+    assert result["labels"] == ["high_risk"]
+    assert result["score"] == 0.8
+
+
+def test_batch_path_matches_single_events_with_a_store():
+    events = [{"id": f"e{i}", "type": ("PURCHASE", "LOGIN")[i % 2], "user_id": f"u{i % 3}",
+               "timestamp": 1000 + i, "data": {"value": 10 * i, "country": ("US", "DE", "FR")[i % 5 % 3]}}
+              for i in range(40)]
+
+    store = FeatureStore()
+    single = [analyze_event(event, store) for event in events]
+    batch = analyze_events(events, FeatureStore()).to_dicts()
+
+    strip = lambda result: {key: value for key, value in result.items() if key != "processed_at"}  # noqa: E731
+    assert [strip(result) for result in batch] == [strip(result) for result in single]
+    assert any("purchase_velocity" in result["labels"] for result in batch)
+    assert any("new_country" in result["labels"] for result in batch)
+
+
+def test_installed_store_is_used_and_snapshotted(tmp_path):
+    path = str(tmp_path / "features.json")
+    store = FeatureStore()
+    previous = set_feature_store(store)
+    try:
+        for i in range(3):
+            result = analyze_event({"id": f"p{i}", "type": "PURCHASE", "user_id": "u", "timestamp": 1000 + i,
+                                    "data": {"value": 10}})
+    finally:
+        set_feature_store(previous)
+    assert "purchase_velocity" in result["labels"]
+
+    store.persist(path, interval=3600)
+    store.stop_persisting(path)
+    restored = FeatureStore()
+    restored.restore(path)
+    assert restored.count("u", "PURCHASE") == 3
+
+
+def test_peek_matches_observe_without_recording():
+    store, copy = FeatureStore(), FeatureStore()
+    for i in range(5):
+        event = _event("u", "PURCHASE", 1000 + 200 * i, value=1, country=("US", "DE")[i % 2])
+        assert store.peek(event) == copy.observe(event)
+        store.observe(event)
+    assert store.peek(_event("other", "PURCHASE", 2000, country="FR")) == (1, False)
+
+
+def test_read_only_store_scores_an_event_the_same_every_time():
+    """The API installs the store read-only: requests never change each other's scores."""
+    store = FeatureStore()
+    for i in range(2):
+        store.observe(_event("u", "PURCHASE", 1000 + i, value=10))
+    event = {"id": "p", "type": "PURCHASE", "user_id": "u", "timestamp": 1002, "data": {"value": 10}}
+
+    previous = set_feature_store(store, record=False)
+    try:
+        results = [analyze_event(event) for _ in range(3)]
+        batch = analyze_events([event, event]).to_dicts()
+    finally:
+        set_feature_store(previous)
+
+    strip = lambda result: {key: value for key, value in result.items() if key != "processed_at"}  # noqa: E731
+    assert "purchase_velocity" in results[0]["labels"]
+    assert [strip(result) for result in results + batch] == [strip(results[0])] * 5
+    assert store.count("u", "PURCHASE") == 2
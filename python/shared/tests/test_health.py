@@ -0,0 +1,26 @@
+import urllib.error
+import urllib.request
+
+from wizard.utils.health import HealthServer
+
+
+def _status(server, path):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}{path}", timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_ready_follows_set_ready_and_health_is_always_up():
+    server = HealthServer(0, host="127.0.0.1").start()
+    try:
+        assert _status(server, "/health") == 200
+        assert _status(server, "/ready") == 503
+        server.set_ready()
+        assert _status(server, "/ready?probe=kubelet") == 200
+        server.set_ready(False)
+        assert _status(server, "/ready") == 503
+        assert _status(server, "/metrics") == 404
+    finally:
+        server.close()
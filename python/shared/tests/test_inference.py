@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pytest
+from wizard.core import analysis_engine
+from wizard.core.analysis_engine import analyze_event, analyze_events, set_inference
+from wizard.core.inference import FeatureVectorizer, InferenceStage, MicroBatcher, NumpyModel, load_model
+from wizard.models import normalize_event
+
+FEATURES = ["value", "country=DE", "type:PURCHASE"]
+
+
+def _model():
+    w0 = np.array([[0.002, -0.001], [1.0, 0.5], [0.5, 2.0]])
+    w1 = np.array([[1.5], [-0.75]])
+    return NumpyModel(FEATURES, [(w0, np.array([0.1, -0.2])), (w1, np.array([-1.0]))],
+                      mean=np.zeros(3), scale=np.array([1.0, 1.0, 2.0]))
+
+
+def _events(count):
+    types = ["LOGIN", "PURCHASE", "CLICK"]
+    return [{"id": f"e{i}", "type": types[i % 3], "user_id": "u",
+             "data": {"value": i * 37, "country": "DE" if i % 2 else "US"}} for i in range(count)]
+
+
+def test_vectorizer_and_model_round_trip(tmp_path):
+    events = [normalize_event(event) for event in _events(4)]
+    x = FeatureVectorizer(FEATURES).matrix(events)
+    assert x.tolist() == [[0, 0, 0], [37, 1, 1], [74, 0, 0], [111, 1, 0]]
+
+    model = _model()
+    path = tmp_path / "model.npz"
+    model.save(path)
+    loaded = load_model(path)
+    assert loaded.features == tuple(FEATURES)
+    scores = loaded.predict(x)
+    assert scores.shape == (4,) and ((scores > 0) & (scores < 1)).all()
+    assert scores.tolist() == [model.predict(x[i:i + 1])[0] for i in range(4)]
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    sizes = []
+
+    def process(items):
+        sizes.append(len(items))
+        if "boom" in items:
+            raise ValueError("boom")
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch=8, max_wait_ms=50)
+    start = threading.Barrier(20)
+    results = [None] * 20
+
+    def client(i):
+        start.wait()
+        results[i] = batcher.submit(i).result(timeout=5)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [i * 2 for i in range(20)]
+    assert max(sizes) == 8 and len(sizes) < 20
+    with pytest.raises(ValueError):
+        batcher.submit("boom").result(timeout=5)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
+
+
+def test_model_score_is_blended_identically_per_event_and_per_batch():
+    events = _events(30)
+    rules_only = [analyze_event(event)["score"] for event in events]
+    stage = InferenceStage(_model(), weight=0.5, max_wait_ms=0)
+    set_inference(stage)
+    try:
+        batch = analyze_events(events).to_dicts()
+        single = [analyze_event(event) for event in events]
+    finally:
+        set_inference(None)
+        stage.close()
+
+    assert [r["score"] for r in batch] == [r["score"] for r in single]
+    assert [r["labels"] for r in batch] == [r["labels"] for r in single]
+    assert [r["score"] for r in single] != rules_only
+    assert analysis_engine.inference is None
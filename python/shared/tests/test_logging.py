@@ -0,0 +1,95 @@
+import json
+import logging
+import queue
+import threading
+
+import pytest
+from wizard.utils import logging as wizard_logging
+from wizard.utils.logging import DeferredQueueHandler, JsonFormatter, RateLimitFilter
+
+
+def _record(name="wizard.core.analysis_engine", level=logging.INFO, msg="event %s", args=("e-1",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_json_formatter_keeps_only_extra_fields():
+    output = json.loads(JsonFormatter().format(_record(user_id="u-1")))
+
+    assert output["message"] == "event e-1"
+    assert output["user_id"] == "u-1"
+    assert not {"msg", "args", "processName", "thread", "created"} & output.keys()
+
+
+def test_sampling_applies_to_logger_and_children(monkeypatch):
+    rate_filter = RateLimitFilter(sample_rates={"wizard.core": 0.0, "wizard.core.kept": 1.0})
+
+    assert not rate_filter.filter(_record("wizard.core.analysis_engine"))
+    assert rate_filter.filter(_record("wizard.core.kept.child"))
+    assert rate_filter.filter(_record("wizard.api"))
+    # Warnings and errors are never dropped
+    assert rate_filter.filter(_record("wizard.core.analysis_engine", level=logging.WARNING))
+    assert rate_filter.dropped == 1
+
+
+def test_rate_limit_is_a_token_bucket(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wizard_logging.time, "monotonic", clock)
+    rate_filter = RateLimitFilter(rate_limits={"wizard": 2})
+
+    assert [rate_filter.filter(_record("wizard.a")) for _ in range(3)] == [True, True, False]
+    # The bucket is shared by every logger under the configured name
+    assert not rate_filter.filter(_record("wizard.b"))
+    clock.now += 0.5
+    assert [rate_filter.filter(_record("wizard.b")) for _ in range(2)] == [True, False]
+
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    handler = DeferredQueueHandler(queue.Queue(1))
+    formatted_on = []
+
+    class RecordingFormatter(logging.Formatter):
+        def format(self, record):
+            formatted_on.append(threading.current_thread())
+            return super().format(record)
+
+    handler.setFormatter(RecordingFormatter())
+    handler.handle(_record())
+    handler.handle(_record())
+
+    queued = handler.queue.get_nowait()
+    assert (queued.msg, queued.args) == ("event e-1", None)
+    assert formatted_on == []
+    assert handler.dropped == 1
+
+
+@pytest.fixture
+def clean_root():
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    yield root
+    wizard_logging.stop_logging()
+    root.handlers[:], root.level = saved
+
+
+def test_setup_logging_writes_on_background_thread(clean_root, capsys):
+    # setup_logging only configures a root logger without handlers (pytest adds its own)
+    clean_root.handlers.clear()
+    wizard_logging.setup_logging("INFO", queued=True, sample_rates={"wizard.sampled": 0.0})
+
+    logging.getLogger("wizard.test").info("hello", extra={"user_id": "u-1"})
+    logging.getLogger("wizard.sampled").info("dropped")
+    wizard_logging.stop_logging()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line["message"] for line in lines] == ["Logging configured.", "hello"]
+    assert lines[1]["user_id"] == "u-1"
@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from wizard.utils.metrics import CONTENT_TYPE, Registry
+
+
+def _samples(registry, name):
+    return {tuple(values): totals for values, totals in registry.collect()[name]["samples"]}
+
+
+def test_counter_is_exact_across_threads():
+    registry = Registry()
+    events = registry.counter("events_total", "Events.")
+
+    def work():
+        for _ in range(10_000):
+            events.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert _samples(registry, "events_total") == {(): [40_000]}
+
+
+def test_histogram_buckets_render_cumulatively():
+    registry = Registry()
+    latency = registry.histogram("stage_seconds", "Stage time.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels("decode").observe(value)
+
+    text = registry.render()
+
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="decode",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{stage="decode",le="1.0"} 3' in text
+    assert 'stage_seconds_bucket{stage="decode",le="+Inf"} 4' in text
+    assert 'stage_seconds_sum{stage="decode"} 3.65' in text
+    assert 'stage_seconds_count{stage="decode"} 4' in text
+
+
+def test_registration_is_idempotent_but_typed():
+    registry = Registry()
+    gauge = registry.gauge("in_flight", "In flight.")
+
+    assert registry.gauge("in_flight", "In flight.") is gauge
+    with pytest.raises(ValueError):
+        registry.counter("in_flight", "In flight.")
+    with pytest.raises(ValueError):
+        registry.counter("by_outcome_total", "By outcome.", ["outcome"]).labels("a", "b")
+
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_multiprocess_merges_other_processes(tmp_path):
+    registry = Registry()
+    registry.directory = str(tmp_path)  # multiprocess reads without the flush thread
+    registry.counter("events_total", "Events.").inc(2)
+    registry.gauge("in_flight", "In flight.").set(1)
+    other = Registry()
+    other.counter("events_total", "Events.").inc(3)
+    other.gauge("in_flight", "In flight.").set(5)
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other.snapshot()))
+    (tmp_path / f"{_exited_pid()}.json").write_text(json.dumps(other.snapshot()))
+
+    # Counters of exited processes still count; their gauges do not
+    assert _samples(registry, "events_total") == {(): [8]}
+    assert _samples(registry, "in_flight") == {(): [6]}
+
+
+def test_flush_writes_snapshot_atomically(tmp_path):
+    registry = Registry()
+    registry.directory = str(tmp_path)
+    registry.counter("events_total", "Events.").inc()
+
+    registry.flush()
+
+    assert os.listdir(tmp_path) == [f"{os.getpid()}.json"]
+    assert json.loads((tmp_path / f"{os.getpid()}.json").read_text())["events_total"]["samples"] == [[[], [1]]]
+
+
+def test_metrics_endpoint_reports_request_latency_by_route():
+    from wizard.main import app
+
+    client = TestClient(app)
+    client.get("/health")
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import pytest
+from wizard.models import AnalysisResult, CollectorEvent, event_columns, normalize_event
+from wizard.transport import PROTOBUF, decode_message, encode_event
+
+
+def test_normalizes_go_spelling():
+    event = normalize_event({
+        "id": "e-1", "timestamp": "2025-10-02T10:00:00Z", "type": "PURCHASE",
+        "user_id": "u-1", "source_service": "collector", "data": {"value": 10},
+    })
+
+    assert event == CollectorEvent(
+        id="e-1", timestamp=datetime(2025, 10, 2, 10, tzinfo=timezone.utc).timestamp(),
+        type="PURCHASE", user_id="u-1", source_service="collector", data={"value": 10},
+    )
+
+
+def test_normalizes_legacy_spelling():
+    event = normalize_event({
+        "EventID": "e-2", "UserID": "user-A", "Action": "checkout",
+        "Timestamp": 1735689600, "Payload": {"total_amount": 450.0},
+    })
+
+    assert (event.id, event.user_id, event.type, event.timestamp) == ("e-2", "user-A", "checkout", 1735689600.0)
+    assert event.data == {"total_amount": 450.0}
+
+
+@pytest.mark.parametrize("timestamp", ["2025-10-02T10:00:00Z", "2025-10-02T10:00:00.000Z", "2025-10-02T12:00:00+02:00"])
+def test_rfc3339_timestamps(timestamp):
+    """Go marshals UTC times with a "Z" suffix, which Python 3.10's fromisoformat rejects."""
+    expected = datetime(2025, 10, 2, 10, tzinfo=timezone.utc).timestamp()
+
+    assert normalize_event({"timestamp": timestamp}).timestamp == expected
+
+
+def test_numeric_ids_become_strings():
+    """Results are stored and looked up by string id, whatever the producer sent."""
+    events = [{"id": 42, "type": "LOGIN", "data": {}}, {"EventID": 7, "Action": "checkout"}]
+
+    assert [normalize_event(raw).id for raw in events] == ["42", "7"]
+    assert event_columns(events)[0] == ["42", "7"]
+
+
+def test_normalizes_protobuf_message():
+    raw = decode_message(encode_event({"EventID": "e-3", "UserID": "u", "Action": "login", "Timestamp": 5}),
+                         default_format=PROTOBUF)
+
+    event = normalize_event(raw)
+
+    assert (event.id, event.user_id, event.type, event.timestamp) == ("e-3", "u", "login", 5.0)
+    assert event.data == {}
+
+
+def test_missing_and_null_fields():
+    event = normalize_event({"type": None, "data": None})
+
+    assert event.type is None
+    assert event.data == {}
+    assert normalize_event(event) is event
+
+
+def test_models_are_slotted():
+    event = normalize_event({"id": "e-4"})
+
+    assert not hasattr(event, "__dict__")
+    with pytest.raises(AttributeError):
+        event.unexpected = 1
+
+
+def test_analysis_result_serialization():
+    processed_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    result = AnalysisResult("e-5", 0.5, ["medium_risk"], "done", processed_at)
+
+    assert result.to_dict() == {
+        "event_id": "e-5", "score": 0.5, "labels": ["medium_risk"],
+        "detail_message": "done", "processed_at": "2025-01-01T00:00:00+00:00",
+    }
+    assert AnalysisResult("e-5", 0.5, [], "done", processed_at, user_id="u").to_dict()["user_id"] == "u"
@@ -0,0 +1,220 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import AutoReconnect, OperationFailure
+from wizard.api.results import CHANGE_STREAMS_UNSUPPORTED, ResultStore
+from wizard.utils.cache import AsyncReadThroughCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResults:
+    """In-memory stand-in for the motor results collection."""
+
+    def __init__(self, documents=(), delay=0.0):
+        self.documents = {document["event_id"]: document for document in documents}
+        self.delay = delay
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        await asyncio.sleep(self.delay)
+        document = self.documents.get(query["event_id"])
+        return dict(document) if document is not None else None
+
+
+class FakeChangeStream:
+    """Delivers preset changes (the resume token after each is "t<n>"), then raises `error`."""
+
+    def __init__(self, changes, error):
+        self.changes = list(changes)
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            raise self.error
+        change = self.changes.pop(0)
+        self.resume_token = change["_id"]
+        return change
+
+
+class WatchedResults(FakeResults):
+    def __init__(self, streams):
+        super().__init__([{"event_id": event_id} for event_id in ("e1", "e2", "e3")])
+        self.streams = list(streams)
+        self.resumed_after = []
+
+    def watch(self, pipeline, full_document=None, resume_after=None):
+        self.resumed_after.append(resume_after)
+        return self.streams.pop(0)
+
+
+def _change(token, event_id):
+    return {"_id": token, "operationType": "replace", "fullDocument": {"event_id": event_id}}
+
+
+def test_invalidation_stream_resumes_after_errors():
+    collection = WatchedResults([
+        FakeChangeStream([_change("t1", "e1")], AutoReconnect("connection reset")),
+        FakeChangeStream([], AutoReconnect("still down")),
+        FakeChangeStream([_change("t2", "e2")], OperationFailure("history lost", code=286)),
+        FakeChangeStream([], OperationFailure("standalone", code=CHANGE_STREAMS_UNSUPPORTED)),
+    ])
+    store = ResultStore(collection)
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    async def scenario():
+        for event_id in ("e1", "e2", "e3"):
+            await store.get(event_id)
+        await store.watch_invalidations(sleep=sleep)
+
+    asyncio.run(scenario())
+
+    # Resumed from the last change seen; an unresumable stream starts over
+    assert collection.resumed_after == [None, "t1", "t1", None]
+    assert len(delays) == 3
+    assert store.stats()["invalidations"] == 2
+    assert len(store.cache) == 0
+
+
+def test_concurrent_misses_share_one_load():
+    collection = FakeResults([{"event_id": "e1", "score": 0.8}], delay=0.01)
+    store = ResultStore(collection)
+
+    async def scenario():
+        return await asyncio.gather(*(store.get("e1") for _ in range(20)))
+
+    results = asyncio.run(scenario())
+
+    assert all(result == {"event_id": "e1", "score": 0.8} for result in results)
+    assert collection.reads == 1
+    assert store.stats()["misses"] == 1
+    assert store.stats()["coalesced"] == 19
+
+
+def test_hits_ttl_and_lru_eviction():
+    clock = FakeClock()
+    loads = []
+
+    async def loader(key):
+        loads.append(key)
+        return key.upper()
+
+    cache = AsyncReadThroughCache(loader, max_entries=2, ttl_seconds=10, clock=clock)
+
+    async def scenario():
+        await cache.get("a")
+        await cache.get("b")
+        await cache.get("a")        # hit, "a" becomes most recent
+        await cache.get("c")        # evicts "b"
+        await cache.get("b")        # miss again, evicts "a"
+        clock.now = 11
+        await cache.get("c")        # expired
+
+    asyncio.run(scenario())
+
+    assert loads == ["a", "b", "c", "b", "c"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (1, 5, 2, 1)
+
+
+def test_not_found_and_errors_are_not_cached():
+    collection = FakeResults()
+    store = ResultStore(collection)
+
+    async def failing(key):
+        raise ConnectionError("mongo unavailable")
+
+    failing_cache = AsyncReadThroughCache(failing)
+
+    async def scenario():
+        assert await store.get("missing") is None
+        assert await store.get("missing") is None
+        with pytest.raises(ConnectionError):
+            await failing_cache.get("x")
+
+    asyncio.run(scenario())
+
+    assert collection.reads == 2
+    assert len(failing_cache) == 0
+
+
+def test_invalidation_drops_entries_and_in_flight_loads():
+    collection = FakeResults([{"event_id": "e1", "score": 0.1}], delay=0.01)
+    store = ResultStore(collection)
+
+    async def scenario():
+        await store.get("e1")
+        collection.documents["e1"] = {"event_id": "e1", "score": 0.9}
+        store.invalidate_documents([{"event_id": "e1"}])
+        assert (await store.get("e1"))["score"] == 0.9
+
+        # A result persisted while a read is in flight must not be masked by it
+        store.invalidate("e1")
+        pending = asyncio.create_task(store.get("e1"))
+        await asyncio.sleep(0)
+        store.invalidate("e1")
+        await pending
+        assert len(store.cache) == 0
+
+    asyncio.run(scenario())
+
+    assert store.stats()["invalidations"] == 2
+
+
+def test_cancelling_the_first_caller_does_not_fail_the_others():
+    collection = FakeResults([{"event_id": "e1", "score": 0.8}], delay=0.01)
+    store = ResultStore(collection)
+
+    async def scenario():
+        first = asyncio.create_task(store.get("e1"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(store.get("e1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, await store.get("e1")
+
+    assert asyncio.run(scenario()) == ({"event_id": "e1", "score": 0.8},) * 2
+    assert collection.reads == 1
+    assert store.stats()["coalesced"] == 1 and store.stats()["hits"] == 1
+
+
+def test_api_serves_cached_results():
+    from wizard.main import app
+
+    collection = FakeResults([{"event_id": "evt-1", "score": 0.8, "labels": ["high_risk"]}])
+    app.state.results = ResultStore(collection)
+    client = TestClient(app)
+
+    for _ in range(3):
+        response = client.get("/api/v1/analysis/evt-1")
+        assert response.status_code == 200
+        assert response.json() == {"item_id": "evt-1", "result": {"event_id": "evt-1", "score": 0.8,
+                                                                  "labels": ["high_risk"]}}
+    assert client.get("/api/v1/analysis/evt-2").status_code == 404
+
+    stats = client.get("/api/v1/cache/stats").json()["results"]
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert collection.reads == 2
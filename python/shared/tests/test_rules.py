@@ -0,0 +1,101 @@
+import os
+
+import pytest
+from wizard.core.rules import RULES_DIR, RuleEngine, RuleError, RuleSet, load_rules
+
+
+def _write(path, text, mtime=None):
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+RULES_V1 = """
+defaults: {score: 0.0, labels: [], detail: "Scored {type}."}
+base_scores: {LOGIN: 0.5}
+rules:
+  - {name: foreign, type: LOGIN, when: {field: country, op: ne, value: US, default: US}, add: 0.1, label: foreign}
+tiers:
+  - {min: 0.6, label: high, detail: "High."}
+"""
+
+
+def test_risk_rules_reproduce_builtin_scores():
+    rules = load_rules(RULES_DIR / "risk.yaml")
+
+    assert rules.score("PURCHASE", {"value": 1000.01}) == (
+        1.0, ["high_value_transaction", "high_risk"], "Critical alert: High risk anomaly detected.")
+    assert rules.score("PURCHASE", {"value": 1000}) == (
+        0.8, ["high_risk"], "Critical alert: High risk anomaly detected.")
+    assert rules.score("LOGIN", {"country": "DE"}) == (
+        0.6, ["international_access", "medium_risk"], "Analysis complete. Calculated risk based on LOGIN event type.")
+    assert rules.score("LOGIN", {}) == (
+        0.5, ["medium_risk"], "Analysis complete. Calculated risk based on LOGIN event type.")
+    assert rules.score("CLICK", {}) == (0.1, [], "Analysis complete. Calculated risk based on CLICK event type.")
+    assert rules.score("UNKNOWN", {}) == (0.0, [], "Analysis complete. Calculated risk based on UNKNOWN event type.")
+
+
+def test_analyzer_rules_replace_default_labels():
+    rules = load_rules(RULES_DIR / "analyzer.yaml")
+
+    assert rules.score("PURCHASE", {}) == (0.9, ["transaction", "high_value"], "Basic processing for PURCHASE event.")
+    assert rules.score("TELEMETRY", {"latency_ms": 101}) == (
+        0.5, ["telemetry", "high_latency"], "Basic processing for TELEMETRY event.")
+    assert rules.score("TELEMETRY", {"latency_ms": 100}) == (0.0, ["normal"], "Basic processing for TELEMETRY event.")
+    assert rules.score(None, {}) == (0.0, ["normal"], "Basic processing for None event.")
+
+
+def test_dispatch_only_evaluates_rules_for_the_event_type():
+    rules = RuleSet({
+        "rules": [
+            {"name": "a", "type": "A", "add": 1},
+            {"name": "any", "type": "*", "add": 10},
+            {"name": "ab", "type": ["A", "B"], "when": {"field": "x", "op": "in", "value": [1, 2]}, "add": 100},
+        ],
+    })
+
+    assert [rule.name for rule in rules.rules_for("A")] == ["a", "any", "ab"]
+    assert [rule.name for rule in rules.rules_for("B")] == ["any", "ab"]
+    assert [rule.name for rule in rules.rules_for("C")] == ["any"]
+    assert rules.evaluate("B", {"x": 2}) == (110.0, [])
+
+
+@pytest.mark.parametrize("spec", [
+    {"rules": [{"name": "both", "add": 1, "set": 1}]},
+    {"rules": [{"name": "neither"}]},
+    {"rules": [{"name": "bad-op", "add": 1, "when": {"field": "x", "op": "like", "value": 1}}]},
+    ["not", "a", "mapping"],
+])
+def test_invalid_rules_are_rejected(spec):
+    with pytest.raises(RuleError):
+        RuleSet(spec)
+
+
+def test_reload_swaps_rules_atomically(tmp_path):
+    path = tmp_path / "rules.yaml"
+    _write(path, RULES_V1, mtime=1_000_000_000)
+    engine = RuleEngine(path)
+    before = engine.current
+
+    assert engine.reload_if_changed() is False
+    assert before.score("LOGIN", {"country": "FR"}) == (0.6, ["foreign", "high"], "High.")
+
+    _write(path, RULES_V1.replace("LOGIN: 0.5", "LOGIN: 0.2"), mtime=2_000_000_000)
+    assert engine.reload_if_changed() is True
+
+    assert engine.current is not before
+    assert engine.current.score("LOGIN", {}) == (0.2, [], "Scored LOGIN.")
+    # Holders of the previous rule set are unaffected
+    assert before.score("LOGIN", {}) == (0.5, [], "Scored LOGIN.")
+
+
+def test_failed_reload_keeps_current_rules(tmp_path):
+    path = tmp_path / "rules.yaml"
+    _write(path, RULES_V1, mtime=1_000_000_000)
+    engine = RuleEngine(path)
+    before = engine.current
+
+    _write(path, "rules: [{name: broken}]", mtime=2_000_000_000)
+
+    assert engine.reload_if_changed() is False
+    assert engine.current is before
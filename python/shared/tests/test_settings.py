@@ -0,0 +1,111 @@
+import os
+
+import pytest
+from wizard.settings import CONFIG_DIR, SettingsError, SettingsStore, build_settings
+
+
+def _write(path, text, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+BASE = """
+service: {name: base, log_level: INFO}
+kafka: {broker: "localhost:9092", topic_events: events}
+pipeline: {mode: stream, batch_size: 100}
+writer: {flush_size: 50}
+collector: {port: 8080}
+"""
+
+
+def test_repository_layers_load():
+    settings = build_settings({}, CONFIG_DIR)
+    assert settings.kafka.topic_events == "events"
+    assert settings.pipeline.batch_size == 500
+
+    assert build_settings({"WIZARD_ENV": "development"}, CONFIG_DIR).database.name_analysis == "wizard_analysis_dev"
+    assert build_settings({"WIZARD_ENV": "test"}, CONFIG_DIR).kafka.topic_events == "events_test"
+    prod = build_settings({"WIZARD_ENV": "production"}, CONFIG_DIR)
+    assert prod.kafka.brokers == ["kafka-prod-01:9092", "kafka-prod-02:9092"]
+    assert prod.service.environment == "production"
+
+
+def test_environment_overlay_then_variables_win(tmp_path):
+    _write(tmp_path / "config.yaml", BASE)
+    _write(tmp_path / "prod" / "config.yaml", "pipeline: {batch_size: 1000, mode: Partitioned}\n")
+
+    settings = build_settings({"WIZARD_ENV": "prod"}, tmp_path)
+    assert settings.pipeline.batch_size == 1000
+    assert settings.pipeline.mode == "partitioned"
+    assert settings.writer.flush_size == 50
+    assert settings.writer.flush_ms == 1000  # built-in default
+
+    settings = build_settings({"WIZARD_ENV": "prod", "ANALYZER_BATCH_SIZE": "7", "MONGO_URI": "mongodb://m/",
+                               "ANALYZER_WRITE_UPSERT": "yes", "KAFKA_BROKER": ""}, tmp_path)
+    assert settings.pipeline.batch_size == 7
+    assert settings.database.mongodb_uri == "mongodb://m/"
+    assert settings.writer.upsert is True
+    # Empty variables count as unset
+    assert settings.kafka.broker == "localhost:9092"
+
+
+def test_invalid_value_names_the_setting(tmp_path):
+    _write(tmp_path / "config.yaml", BASE)
+    with pytest.raises(SettingsError, match="ANALYZER_BATCH_SIZE"):
+        build_settings({"ANALYZER_BATCH_SIZE": "many"}, tmp_path)
+
+
+def test_get_is_memoized_until_a_variable_changes(tmp_path):
+    _write(tmp_path / "config.yaml", BASE)
+    environ = {}
+    store = SettingsStore(tmp_path, environ, load_dotenv=False)
+
+    first = store.get()
+    assert store.get() is first
+    environ["ANALYZER_BATCH_SIZE"] = "5"
+    assert store.get().pipeline.batch_size == 5
+
+
+def test_reload_applies_hot_values_and_keeps_structural_ones(tmp_path):
+    config = tmp_path / "config.yaml"
+    _write(config, BASE, mtime=1_000_000_000)
+    store = SettingsStore(tmp_path, {}, load_dotenv=False)
+    applied = []
+
+    class Pipeline:
+        def apply(self, settings):
+            applied.append(settings)
+
+    pipeline = Pipeline()
+    store.on_reload(pipeline.apply)
+    store.get()
+    assert not store.reload_if_changed()
+
+    _write(config, BASE.replace("batch_size: 100", "batch_size: 200").replace("mode: stream", "mode: batch")
+           .replace('"localhost:9092"', '"other:9092"'), mtime=2_000_000_000)
+    assert store.reload_if_changed()
+
+    settings = store.get()
+    assert settings.pipeline.batch_size == 200
+    assert settings.pipeline.mode == "stream"
+    assert settings.kafka.broker == "localhost:9092"
+    assert applied == [settings]
+
+    # Bound methods are held weakly
+    del pipeline
+    _write(config, BASE.replace("batch_size: 100", "batch_size: 300"), mtime=3_000_000_000)
+    assert store.reload_if_changed()
+    assert len(applied) == 1
+
+
+def test_broken_file_keeps_current_settings(tmp_path):
+    config = tmp_path / "config.yaml"
+    _write(config, BASE, mtime=1_000_000_000)
+    store = SettingsStore(tmp_path, {}, load_dotenv=False)
+    current = store.get()
+
+    _write(config, "pipeline: {batch_size: [", mtime=2_000_000_000)
+    assert not store.reload_if_changed()
+    assert store.get() is current
@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from wizard.api.results import ResultStore
+from wizard.core.analysis_engine import score_event
+from wizard.models import AnalysisResult, normalize_event
+from wizard.models.stored import SCHEMA_VERSION, LabelCodes, expand_document, label_codes
+
+
+class FakeResults:
+    """In-memory stand-in for the motor results collection, holding stored documents."""
+
+    def __init__(self, documents):
+        self.documents = {document["event_id"]: document for document in documents}
+
+    async def find_one(self, query, projection=None):
+        return self.documents.get(query["event_id"])
+
+
+def test_scored_results_are_stored_compactly_and_expand_to_the_api_shape():
+    event = normalize_event({"id": "e1", "type": "PURCHASE", "user_id": "u1", "data": {"value": 5000}})
+    result = score_event(event)
+    document = result.to_document()
+
+    assert document["v"] == SCHEMA_VERSION
+    assert document["labels"] == [label_codes().codes["high_value_transaction"], label_codes().codes["high_risk"]]
+    assert document["processed_at"] == result.processed_at
+    assert "detail_message" not in document
+    assert expand_document(document) == result.to_dict()
+
+    # As read back from MongoDB: naive UTC datetimes
+    stored = {**document, "processed_at": result.processed_at.replace(tzinfo=None)}
+    assert expand_document(stored)["processed_at"] == result.processed_at.isoformat()
+
+
+def test_details_are_derived_from_the_rules_that_scored_the_event():
+    processed_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    result = AnalysisResult("e2", 0.0, ["normal", "brand_new_label"], "", processed_at,
+                            event_type="LOGIN", rules="analyzer")
+    document = result.to_document()
+
+    assert document["labels"] == [label_codes().codes["normal"], "brand_new_label"]
+    expanded = expand_document(document)
+    assert expanded["labels"] == ["normal", "brand_new_label"]
+    assert expanded["detail_message"] == "Basic processing for LOGIN event."
+    assert expand_document({**document, "rules": "missing"})["detail_message"] == ""
+
+
+def test_label_codes_are_unique_and_unknown_codes_survive():
+    codes = LabelCodes({"a": 1, "b": 2})
+    assert codes.decode(codes.encode(["b", "c", "a"])) == ["b", "c", "a"]
+    assert codes.decode([3]) == ["3"]
+    with pytest.raises(ValueError):
+        LabelCodes({"a": 1, "b": 1})
+
+
+def test_result_store_expands_compact_and_keeps_legacy_documents():
+    processed_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    compact = AnalysisResult("e3", 0.6, ["international_access", "medium_risk"], "", processed_at,
+                             user_id="u3", event_type="LOGIN", rules="risk").to_document()
+    legacy = {"event_id": "e4", "score": 0.1, "labels": [], "detail_message": "Old text.",
+              "processed_at": "2024-01-01T00:00:00"}
+    store = ResultStore(FakeResults([compact, legacy]))
+
+    async def scenario():
+        return await store.get("e3"), await store.get("e4")
+
+    new, old = asyncio.run(scenario())
+    assert new == {
+        "event_id": "e3", "user_id": "u3", "score": 0.6, "labels": ["international_access", "medium_risk"],
+        "detail_message": "Analysis complete. Calculated risk based on LOGIN event type.",
+        "processed_at": "2025-01-01T00:00:00+00:00",
+    }
+    assert old == legacy
@@ -0,0 +1,71 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+from wizard.core.analysis_engine import analyze_event
+from wizard.transport import (
+    Event, PROTOBUF, ProtoEvent, decode_message, encode_event, message_format,
+)
+
+PROTO_FILE = Path(__file__).resolve().parents[3] / "shared" / "proto" / "transport.proto"
+
+EVENTS = [
+    {"id": "p-1", "type": "PURCHASE", "user_id": "u-1", "timestamp": "2025-10-02T10:00:00Z",
+     "data": {"value": 1500.0, "currency": "USD"}},
+    {"id": "p-2", "type": "PURCHASE", "user_id": "u-2", "data": {"value": 20}},
+    {"id": "l-1", "type": "LOGIN", "user_id": "u-3", "data": {"country": "DE"}},
+    {"id": "l-2", "type": "LOGIN", "user_id": "u-4", "data": {}},
+    {"id": "c-1", "type": "CLICK", "user_id": "u-5"},
+]
+
+
+def _without_timestamp(result):
+    return {key: value for key, value in result.items() if key != "processed_at"}
+
+
+def test_event_descriptor_matches_proto_file():
+    """The runtime Event class must mirror shared/proto/transport.proto."""
+    declared = dict(
+        (name, int(number))
+        for name, number in re.findall(r"^\s*(?:map<[^>]+>|\w+)\s+(\w+)\s*=\s*(\d+);", PROTO_FILE.read_text(), re.M)
+    )
+
+    assert {field.name: field.number for field in Event.DESCRIPTOR.fields} == declared
+
+
+@pytest.mark.parametrize("event", EVENTS, ids=[e["id"] for e in EVENTS])
+def test_protobuf_round_trip_matches_json_analysis(event):
+    """analyze_event scores a protobuf message exactly like the JSON encoding of it."""
+    as_json = decode_message(json.dumps(event).encode("utf-8"))
+    as_proto = decode_message(encode_event(event), [("content-type", b"application/x-protobuf")])
+
+    assert isinstance(as_proto, ProtoEvent)
+    assert _without_timestamp(analyze_event(as_proto)) == _without_timestamp(analyze_event(as_json))
+
+
+def test_legacy_field_spellings():
+    """The adapter answers the legacy collector keys used by AnalyzerCore."""
+    event = decode_message(
+        encode_event({"EventID": "e-1", "UserID": "user-A", "Action": "checkout",
+                      "Timestamp": 1735689600, "Payload": {"total_amount": 450.0}}),
+        default_format=PROTOBUF,
+    )
+
+    assert event.get("UserID") == "user-A"
+    assert event.get("Action") == "checkout"
+    assert event.get("Timestamp") == 1735689600
+    assert event.get("Payload", {}) == {"total_amount": 450.0}
+    assert event.get("Unknown", "fallback") == "fallback"
+
+
+def test_header_selects_format():
+    assert message_format([("Content-Type", b"application/x-protobuf")]) == PROTOBUF
+    assert message_format([("content-type", b"application/json")], PROTOBUF) == "json"
+    assert message_format(None, PROTOBUF) == PROTOBUF
+
+
+def test_protobuf_payload_is_smaller_than_json():
+    event = EVENTS[0]
+
+    assert len(encode_event(event)) < len(json.dumps(event).encode("utf-8"))
@@ -0,0 +1,139 @@
+# Wizard/python/tests/test_async_pipeline.py
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from aiokafka.structs import TopicPartition
+
+from python.analyzer.async_core import AsyncAnalyzerCore
+
+
+def _record(partition, offset, user, event_id=None):
+    event = {"UserID": user, "Action": "login", "Timestamp": 1735689600}
+    if event_id is not None:
+        event["EventID"] = event_id
+    value = json.dumps(event).encode('utf-8')
+    return SimpleNamespace(topic="events", partition=partition, offset=offset, value=value, headers=())
+
+
+class FakeBroker:
+    """In-memory stand-in for AIOKafkaConsumer."""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.commits = []
+        self.seeks = []
+
+    async def getmany(self, timeout_ms=0, max_records=None):
+        await asyncio.sleep(0)
+        if not self.batches:
+            return {}
+        polled = {}
+        for record in self.batches.pop(0):
+            polled.setdefault(TopicPartition(record.topic, record.partition), []).append(record)
+        return polled
+
+    async def commit(self, offsets):
+        self.commits.append(dict(offsets))
+
+    def seek(self, tp, offset):
+        self.seeks.append((tp, offset))
+
+
+class FakeCollection:
+    """In-memory stand-in for a motor collection."""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.documents = []
+        self.indexes = []
+        self.fail = fail
+        self.delay = delay
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    async def create_index(self, keys, **options):
+        self.indexes.append(options["name"])
+
+    async def bulk_write(self, requests, ordered=True):
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ValueError("document rejected")
+            self.documents.extend(request._doc for request in requests)
+        finally:
+            self.concurrent -= 1
+
+
+async def _run_until_drained(core, broker):
+    await core.start()
+    while broker.batches:
+        await asyncio.sleep(0.01)
+    await core.stop()
+
+
+def test_async_pipeline_writes_and_commits_in_order():
+    """Every batch is written, and offsets are committed in fetch order."""
+    broker = FakeBroker([[_record(i % 2, i // 2, f"u{i}")] for i in range(6)])
+    collection = FakeCollection(delay=0.01)
+    core = AsyncAnalyzerCore(consumer=broker, collection=collection, max_in_flight=2)
+
+    asyncio.run(_run_until_drained(core, broker))
+
+    assert sorted(doc['user_id'] for doc in collection.documents) == [f"u{i}" for i in range(6)]
+    commits = [(tp.partition, offset) for c in broker.commits for tp, offset in c.items()]
+    assert commits == [(0, 1), (1, 1), (0, 2), (1, 2), (0, 3), (1, 3)]
+    assert collection.max_concurrent <= 2
+    assert "event_id_unique" in collection.indexes
+
+
+def test_async_pipeline_serializes_batches_of_a_partition():
+    """Batches of one partition are written one at a time, in offset order."""
+    broker = FakeBroker([[_record(0, i, f"u{i}")] for i in range(4)])
+    collection = FakeCollection(delay=0.01)
+    core = AsyncAnalyzerCore(consumer=broker, collection=collection, max_in_flight=4)
+
+    asyncio.run(_run_until_drained(core, broker))
+
+    assert [doc['user_id'] for doc in collection.documents] == ["u0", "u1", "u2", "u3"]
+    assert collection.max_concurrent == 1
+
+
+def test_async_pipeline_rewinds_on_failed_write():
+    """A failed write is never committed and is rewound for redelivery."""
+    broker = FakeBroker([[_record(0, 7, "a"), _record(1, 3, "b")]])
+    core = AsyncAnalyzerCore(consumer=broker, collection=FakeCollection(fail=True))
+
+    asyncio.run(_run_until_drained(core, broker))
+
+    assert broker.commits == []
+    assert sorted(broker.seeks) == [(TopicPartition("events", 0), 7), (TopicPartition("events", 1), 3)]
+
+
+def test_async_pipeline_reports_persisted_documents():
+    """on_persist sees every durably written batch (used to invalidate cached results)."""
+    broker = FakeBroker([[_record(0, i, f"u{i}")] for i in range(3)])
+    persisted = []
+    core = AsyncAnalyzerCore(consumer=broker, collection=FakeCollection(), on_persist=persisted.extend)
+
+    asyncio.run(_run_until_drained(core, broker))
+
+    assert sorted(doc['user_id'] for doc in persisted) == ["u0", "u1", "u2"]
+
+
+def test_async_pipeline_skips_redelivered_events():
+    """An event id stored by an earlier batch is not analyzed or written again."""
+    broker = FakeBroker([
+        [_record(0, 0, "a", "e1"), _record(0, 1, "b", "e2")],
+        [_record(0, 2, "a", "e1"), _record(0, 3, "c", "e3")],
+    ])
+    collection = FakeCollection()
+    core = AsyncAnalyzerCore(consumer=broker, collection=collection, max_in_flight=1)
+
+    asyncio.run(_run_until_drained(core, broker))
+
+    assert sorted(doc['event_id'] for doc in collection.documents) == ["e1", "e2", "e3"]
+    assert core.dedup.duplicates == 1
+    assert [c[TopicPartition("events", 0)] for c in broker.commits] == [2, 4]
@@ -0,0 +1,144 @@
+# Wizard/python/tests/test_batch_pipeline.py
+
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import pytest
+from kafka import TopicPartition
+from pymongo.errors import BulkWriteError
+
+from python.analyzer.core import AnalyzerCore
+from wizard.transport import encode_event
+
+
+@pytest.fixture(scope="module", autouse=True)
+def mock_env():
+    """Configures the AnalyzerCore for the batched pipeline."""
+    with patch.dict(os.environ, {
+        "KAFKA_TOPIC": "mock_topic",
+        "ANALYZER_PIPELINE_MODE": "batch",
+        "ANALYZER_BATCH_SIZE": "3",
+        "ANALYZER_BATCH_LINGER_MS": "50",
+    }):
+        yield
+
+
+@pytest.fixture
+def batch_analyzer():
+    """Creates a batch-mode AnalyzerCore with mocked Kafka and MongoDB clients."""
+    with patch('python.analyzer.core.KafkaConsumer') as MockKafka, \
+         patch('python.analyzer.core.registry'):
+        MockKafka.return_value = MagicMock()
+        analyzer = AnalyzerCore()
+        analyzer.results_collection = MagicMock()
+        yield analyzer
+
+
+def _record(partition, offset, value):
+    raw = value if isinstance(value, bytes) else json.dumps(value).encode('utf-8')
+    return SimpleNamespace(topic="mock_topic", partition=partition, offset=offset, value=raw, headers=[])
+
+
+def _event(user):
+    return {"UserID": user, "Action": "checkout", "Timestamp": 1735689600, "Payload": {}}
+
+
+def test_batch_mode_disables_auto_commit():
+    """Batch mode commits offsets manually and decodes raw bytes itself."""
+    with patch('python.analyzer.core.KafkaConsumer') as MockKafka, \
+         patch('python.analyzer.core.registry'):
+        analyzer = AnalyzerCore()
+
+    assert analyzer.batch_size == 3
+    assert analyzer.batch_linger_ms == 50
+    kwargs = MockKafka.call_args.kwargs
+    assert kwargs['enable_auto_commit'] is False
+    assert kwargs.get('value_deserializer') is None
+
+
+def test_poll_batch_stops_at_batch_size(batch_analyzer):
+    """Polling accumulates records across polls until the batch is full."""
+    batch_analyzer.consumer.poll.side_effect = [
+        {TopicPartition("mock_topic", 0): [_record(0, 1, _event("a"))]},
+        {TopicPartition("mock_topic", 1): [_record(1, 7, _event("b")), _record(1, 8, _event("c"))]},
+    ]
+
+    records = batch_analyzer._poll_batch()
+
+    assert [r.offset for r in records] == [1, 7, 8]
+    assert batch_analyzer.consumer.poll.call_args_list[1].kwargs['max_records'] == 2
+
+
+def test_process_batch_persists_then_commits(batch_analyzer):
+    """A batch is written with one insert_many and offsets are committed per partition."""
+    records = [_record(0, 4, _event("a")), _record(0, 5, b"{not json"), _record(1, 9, _event("b"))]
+
+    assert batch_analyzer._process_batch(records) is True
+
+    insert = batch_analyzer.results_collection.insert_many
+    insert.assert_called_once()
+    assert [doc['user_id'] for doc in insert.call_args[0][0]] == ["a", "b"]
+    assert insert.call_args.kwargs['ordered'] is False
+
+    committed = batch_analyzer.consumer.commit.call_args[0][0]
+    assert committed[TopicPartition("mock_topic", 0)].offset == 6
+    assert committed[TopicPartition("mock_topic", 1)].offset == 10
+
+
+def test_failed_write_rewinds_without_commit(batch_analyzer):
+    """A failed write must not commit offsets and must rewind to the batch start."""
+    batch_analyzer.results_collection.insert_many.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 0, "code": 91, "errmsg": "shutdown in progress"}]}
+    )
+    records = [_record(0, 4, _event("a")), _record(0, 5, _event("b"))]
+
+    assert batch_analyzer._process_batch(records) is False
+
+    batch_analyzer.consumer.commit.assert_not_called()
+    batch_analyzer.consumer.seek.assert_called_once_with(TopicPartition("mock_topic", 0), 4)
+
+
+def test_duplicate_key_errors_count_as_persisted(batch_analyzer):
+    """Redelivered documents that already exist do not block the commit."""
+    batch_analyzer.results_collection.insert_many.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}]}
+    )
+
+    assert batch_analyzer._process_batch([_record(0, 4, _event("a"))]) is True
+    batch_analyzer.consumer.commit.assert_called_once()
+
+
+def test_protobuf_records_selected_by_header(batch_analyzer):
+    """Records flagged with a protobuf content-type header are decoded as Event messages."""
+    record = _record(0, 4, b"")
+    record.value = encode_event(_event("proto-user"))
+    record.headers = [("content-type", b"application/x-protobuf")]
+
+    assert batch_analyzer._process_batch([record]) is True
+
+    stored = batch_analyzer.results_collection.insert_many.call_args[0][0]
+    assert stored[0]['user_id'] == "proto-user"
+    assert stored[0]['analysis_type'] == "HighValue"
+
+
+def test_process_batch_records_metrics(batch_analyzer):
+    """Batch size, outcomes and per-stage timings are recorded once per batch."""
+    from python.analyzer import metrics
+
+    def counts():
+        snapshot = metrics.metrics.REGISTRY.collect()
+        outcomes = {values[0]: totals[0] for values, totals in snapshot["analyzer_events_total"]["samples"]}
+        stages = {values[0]: totals[-1] for values, totals in snapshot["analyzer_stage_seconds"]["samples"]}
+        return outcomes, stages, snapshot["analyzer_batch_size"]["samples"][0][1][-1]
+
+    before = counts()
+    batch_analyzer._process_batch([_record(0, 4, _event("a")), _record(0, 5, b"{not json")])
+    after = counts()
+
+    assert after[0]["analyzed"] - before[0].get("analyzed", 0) == 1
+    assert after[0]["decode_error"] - before[0].get("decode_error", 0) == 1
+    assert {stage: after[1][stage] - before[1].get(stage, 0) for stage in after[1]} == {
+        "decode": 1, "analyze": 1, "persist": 1}
+    assert after[2] - before[2] == 1
@@ -0,0 +1,63 @@
+# Wizard/python/tests/test_cold_start.py
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PYTHON_DIR = Path(__file__).resolve().parents[1]
+SERVICE_DIR = PYTHON_DIR.parent / "analyzer"
+
+
+def _import(module, cwd=PYTHON_DIR):
+    """Imports module in a fresh interpreter; returns (loaded module names, stdout + stderr)."""
+    code = f"import sys, {module}; print(' '.join(sorted(sys.modules)))"
+    env = dict(os.environ, PYTHONPATH=str(PYTHON_DIR))
+    completed = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env,
+                               capture_output=True, text=True, check=True, timeout=60)
+    lines = completed.stdout.splitlines()
+    return set(lines[-1].split()), "\n".join(lines[:-1]) + completed.stderr
+
+
+def test_analyzer_utils_defers_dotenv():
+    modules, _ = _import("analyzer.utils")
+    assert "dotenv" not in modules
+
+
+def test_analyzer_core_import_has_no_side_effects():
+    modules, _ = _import("analyzer.core")
+    assert "analyzer.workers" not in modules
+    assert "analyzer.lanes" not in modules
+    code = "import logging, analyzer.core; print(logging.getLogger().handlers)"
+    completed = subprocess.run([sys.executable, "-c", code], cwd=PYTHON_DIR, capture_output=True,
+                               text=True, check=True, timeout=60)
+    assert completed.stdout.strip() == "[]"
+
+
+def test_api_defers_server_and_async_pipeline():
+    modules, _ = _import("analyzer.main")
+    assert not {"uvicorn", "aiokafka", "analyzer.async_core"} & modules
+
+
+def test_service_import_is_quiet_and_loads_no_pipeline():
+    modules, output = _import("app.analyzer", cwd=SERVICE_DIR)
+    assert output == ""
+    assert not {"analyzer.workers", "analyzer.lanes", "concurrent.futures.process"} & modules
+
+
+def test_service_without_a_model_does_not_load_numpy():
+    """Analyzer() only imports the inference stage (and NumPy) when a model is configured."""
+    code = (
+        "import sys; sys.modules['numpy'] = None\n"
+        "from unittest.mock import MagicMock, patch\n"
+        "import app.analyzer as service\n"
+        "with patch.object(service, 'registry'), patch.object(service, 'KafkaConsumer'), \\\n"
+        "        patch.object(service.ANALYZER_RULES, 'watch'):\n"
+        "    analyzer = service.Analyzer()\n"
+        "print(service.MODEL_INFERENCE, 'wizard.core.inference' in sys.modules)"
+    )
+    env = dict(os.environ, PYTHONPATH=str(PYTHON_DIR), WIZARD_MODEL_PATH="")
+    completed = subprocess.run([sys.executable, "-c", code], cwd=SERVICE_DIR, env=env,
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.split()[-2:] == ["None", "False"]
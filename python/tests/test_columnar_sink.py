@@ -0,0 +1,75 @@
+# Wizard/python/tests/test_columnar_sink.py
+
+from datetime import datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds  # noqa: E402
+
+from python.analyzer.columnar import ParquetSink  # noqa: E402
+from python.analyzer.writer import ResultWriter  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def insert_many(self, documents, ordered=True):
+        if self.fail:
+            raise ValueError("write failed")
+
+
+def _results(count, day=17):
+    return [
+        {"event_id": f"e{day}-{i}", "user_id": f"u{i % 3}", "original_action": "checkout",
+         "analysis_type": "HighValue" if i % 2 else "LowValue",
+         "event_time": datetime(2024, 5, day, 12, 0, i % 60).isoformat(),
+         "processed_at": datetime(2024, 5, day, 12, 0, 1, tzinfo=timezone.utc), "event_details": {"value": i}}
+        for i in range(count)
+    ]
+
+
+def test_results_are_written_as_dictionary_encoded_batches_partitioned_by_date(tmp_path):
+    sink = ParquetSink(str(tmp_path), batch_rows=4)
+    sink.add(_results(10) + _results(3, day=18))
+    sink.add([{"event_id": "s", "score": 0.9, "labels": ["high_risk"],
+               "processed_at": "2024-05-17T13:00:00+00:00"}])
+    # Whole row groups only; no file is visible before it is closed
+    assert len(sink) == 6
+    assert not list(tmp_path.rglob("*.parquet"))
+    sink.close()
+
+    assert sorted(p.parent.name for p in tmp_path.rglob("*.parquet")) == ["date=2024-05-17", "date=2024-05-18"]
+    table = ds.dataset(str(tmp_path), format="parquet", partitioning="hive").to_table()
+    assert table.num_rows == 14
+    assert pa.types.is_dictionary(table.schema.field("analysis_type").type)
+    assert pa.types.is_dictionary(table.schema.field("labels").type.value_type)
+    assert table.schema.field("processed_at").type == pa.timestamp("us", tz="UTC")
+
+    rows = {row["event_id"]: row for row in table.to_pylist()}
+    assert rows["e17-1"]["analysis_type"] == "HighValue"
+    assert rows["e17-1"]["event_time"] == datetime(2024, 5, 17, 12, 0, 1, tzinfo=timezone.utc)
+    assert rows["e17-1"]["event_details"] == '{"value":1}'
+    assert rows["s"]["labels"] == ["high_risk"] and rows["s"]["analysis_type"] is None
+
+
+def test_files_roll_by_size_and_age(tmp_path):
+    sink = ParquetSink(str(tmp_path), batch_rows=5, roll_bytes=1)
+    sink.add(_results(10))
+    assert len(list(tmp_path.rglob("*.parquet"))) == 2
+
+    sink = ParquetSink(str(tmp_path / "aged"), batch_rows=100, roll_seconds=0, flush_seconds=0)
+    sink.add(_results(3))
+    assert sink.files_written == 1 and len(sink) == 0
+
+
+def test_writer_mirrors_only_stored_results(tmp_path):
+    sink = ParquetSink(str(tmp_path), batch_rows=100)
+    assert ResultWriter(FakeCollection(), sink=sink).write(_results(3))
+    assert not ResultWriter(FakeCollection(fail=True), max_retries=0, sink=sink).write(_results(2))
+    assert len(sink) == 3
+
+    writer = ResultWriter(FakeCollection(), sink=sink)
+    writer.close()
+    assert ds.dataset(str(tmp_path), format="parquet").count_rows() == 3
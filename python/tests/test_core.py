@@ -3,7 +3,7 @@
 import pytest
 import os
 from unittest.mock import patch, MagicMock
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Assuming the AnalyzerCore class is in this module path
 # NOTE: The actual path might be 'wizard.python.analyzer.core', 
@@ -29,10 +29,10 @@ def mock_analyzer():
     Creates an AnalyzerCore instance with mocked Kafka and MongoDB clients.
     """
     with patch('python.analyzer.core.KafkaConsumer') as MockKafka, \
-         patch('python.analyzer.core.MongoClient') as MockMongo:
+         patch('python.analyzer.core.registry') as MockRegistry:
         
         # Configure the MongoDB mock collection to return a mock object
-        mock_mongo_client = MockMongo.return_value
+        mock_mongo_client = MockRegistry.mongo.return_value
         mock_db = mock_mongo_client.__getitem__.return_value # Mock client['db']
         mock_collection = mock_db.__getitem__.return_value   # Mock db['collection']
         
@@ -90,8 +90,8 @@ def test_run_analysis_high_value_event(mock_analyzer):
     assert result['analysis_type'] == "HighValue"
     assert result['event_details']['total_amount'] == 450.0
 
-def test_persist_result_calls_insert_one(mock_analyzer):
-    """Test if the _persist_result method correctly calls MongoDB's insert_one."""
+def test_persist_result_buffers_until_flush(mock_analyzer):
+    """_persist_result queues the result; the writer stores it with one bulk insert on flush."""
     mock_result = {
         "user_id": "test-user", 
         "original_action": "test", 
@@ -99,10 +99,29 @@ def test_persist_result_calls_insert_one(mock_analyzer):
     }
     
     mock_analyzer._persist_result(mock_result)
+    mock_analyzer.results_collection.insert_many.assert_not_called()
+    mock_analyzer.writer.flush()
     
-    # Assert that the insert_one method on the mock collection was called once
-    mock_analyzer.results_collection.insert_one.assert_called_once()
-    
-    # Assert that the first argument passed to insert_one matches the result
-    called_with = mock_analyzer.results_collection.insert_one.call_args[0][0]
-    assert called_with['user_id'] == "test-user"
+    # Assert that the buffered result was written with a single insert_many
+    mock_analyzer.results_collection.insert_many.assert_called_once()
+    called_with = mock_analyzer.results_collection.insert_many.call_args[0][0]
+    assert called_with[0]['user_id'] == "test-user"
+
+def test_run_analysis_stores_native_timestamps(mock_analyzer):
+    """Results are version 1 documents with UTC datetimes, expanded to ISO strings on read."""
+    from python.analyzer.core import SCHEMA_VERSION
+    from wizard.models.stored import expand_document
+    event = {
+        "EventID": "uuid-9",
+        "UserID": "user-C",
+        "Timestamp": 1735689600.0,
+        "Action": "login",
+        "Payload": {},
+    }
+
+    result = mock_analyzer._run_analysis(event)
+
+    assert result['v'] == SCHEMA_VERSION
+    assert result['event_time'] == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert result['processed_at'].tzinfo is timezone.utc
+    assert expand_document(result)['event_time'] == "2025-01-01T00:00:00+00:00"
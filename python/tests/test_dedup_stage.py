@@ -0,0 +1,105 @@
+# Wizard/python/tests/test_dedup_stage.py
+
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import pytest
+from kafka import TopicPartition
+
+from python.analyzer.core import AnalyzerCore
+from python.analyzer.dedup import Deduplicator, Watermarks
+
+
+class FakeWatermarkCollection:
+    """Stores the documents written by Watermarks.save() ($max upserts)."""
+
+    def __init__(self):
+        self.documents = {}
+        self.saves = 0
+
+    def find(self, query):
+        return [doc for doc in self.documents.values() if doc["group"] == query["group"]]
+
+    def bulk_write(self, requests, ordered=True):
+        self.saves += 1
+        for request in requests:
+            spec = request._doc
+            doc = self.documents.setdefault(request._filter["_id"], {"offset": -1})
+            doc.update(spec["$set"])
+            doc["offset"] = max(doc["offset"], spec["$max"]["offset"])
+
+
+@pytest.fixture(scope="module", autouse=True)
+def mock_env():
+    with patch.dict(os.environ, {"KAFKA_TOPIC": "mock_topic", "ANALYZER_PIPELINE_MODE": "batch"}):
+        yield
+
+
+def _record(partition, offset, event_id):
+    value = json.dumps({"id": event_id, "type": "checkout", "user_id": "u", "timestamp": 1735689600})
+    return SimpleNamespace(topic="mock_topic", partition=partition, offset=offset,
+                           value=value.encode('utf-8'), headers=[])
+
+
+def _analyzer(collection):
+    with patch('python.analyzer.core.KafkaConsumer') as MockKafka, \
+         patch('python.analyzer.core.registry'):
+        MockKafka.return_value = MagicMock()
+        analyzer = AnalyzerCore()
+    analyzer.results_collection = MagicMock()
+    analyzer.dedup.watermarks = Watermarks(collection, "analyzer-group").load()
+    return analyzer
+
+
+def _stored_ids(analyzer):
+    return [doc["event_id"] for call in analyzer.results_collection.insert_many.call_args_list
+            for doc in call[0][0]]
+
+
+def test_redelivered_batch_after_restart_is_skipped():
+    collection = FakeWatermarkCollection()
+    records = [_record(0, 0, "e1"), _record(0, 1, "e2"), _record(1, 0, "e3")]
+    first = _analyzer(collection)
+    assert first._process_batch(records) is True
+    assert collection.documents["analyzer-group:mock_topic:0"]["offset"] == 2
+
+    # A new process gets the same records again (the commit was lost)
+    second = _analyzer(collection)
+    assert second._process_batch(records + [_record(0, 2, "e4")]) is True
+
+    assert _stored_ids(second) == ["e4"]
+    assert second.dedup.duplicates == 3
+    second.consumer.commit.assert_called_once()
+
+
+def test_recent_event_ids_are_skipped_at_new_offsets():
+    analyzer = _analyzer(FakeWatermarkCollection())
+    analyzer._process_batch([_record(0, 0, "e1"), _record(0, 1, "e1")])
+    analyzer._process_batch([_record(0, 2, "e1"), _record(0, 3, "e2")])
+
+    assert _stored_ids(analyzer) == ["e1", "e2"]
+    assert analyzer.dedup.hit_rate == 0.5
+
+
+def test_failed_write_is_not_remembered():
+    analyzer = _analyzer(FakeWatermarkCollection())
+    analyzer.writer.max_retries = 0
+    analyzer.results_collection.insert_many.side_effect = [Exception("down"), None]
+    records = [_record(0, 0, "e1")]
+
+    assert analyzer._process_batch(records) is False
+    assert analyzer._process_batch(records) is True
+    assert analyzer.results_collection.insert_many.call_count == 2
+
+
+def test_checkpoint_waits_for_flush():
+    collection = FakeWatermarkCollection()
+    dedup = Deduplicator(window=10, watermarks=Watermarks(collection, "g"), save_interval=0)
+    dedup.stored(["e1"], {TopicPartition("t", 0): 5})
+
+    assert dedup.checkpoint(flush=lambda: False) is False
+    assert collection.saves == 0
+    assert dedup.checkpoint(flush=lambda: True) is True
+    assert collection.documents["g:t:0"]["offset"] == 5
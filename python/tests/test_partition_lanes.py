@@ -0,0 +1,196 @@
+# Wizard/python/tests/test_partition_lanes.py
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from kafka import TopicPartition
+
+from python.analyzer.lanes import PartitionLanes
+
+TOPIC = "events"
+
+
+def _record(partition, offset):
+    value = json.dumps({"partition": partition, "offset": offset}).encode('utf-8')
+    return SimpleNamespace(topic=TOPIC, partition=partition, offset=offset, timestamp=-1,
+                           value=value, headers=[])
+
+
+def _decode(value, headers):
+    return json.loads(value)
+
+
+def _analyze(event):
+    return (event["partition"], event["offset"])
+
+
+class FakeConsumer:
+    """
+    Multi-partition consumer: every poll returns up to `per_poll` records from
+    each assigned, unpaused partition, honouring seek/pause/resume, and runs
+    the rebalance listener when reassign() was requested.
+    """
+
+    def __init__(self, partitions, per_poll=2):
+        self.logs = {TopicPartition(TOPIC, p): [_record(p, o) for o in range(count)]
+                     for p, count in partitions.items()}
+        self.positions = {tp: 0 for tp in self.logs}
+        self.assigned = set(self.logs)
+        self.paused = set()
+        self.per_poll = per_poll
+        self.commits = []
+        self.seeks = []
+        self.listener = None
+        self._reassign = None
+        self._lock = threading.Lock()
+
+    def subscription(self):
+        return {TOPIC}
+
+    def subscribe(self, topics, listener=None):
+        self.listener = listener
+
+    def reassign(self, partitions):
+        self._reassign = {TopicPartition(TOPIC, p) for p in partitions}
+
+    def poll(self, timeout_ms=0, max_records=None):
+        if self._reassign is not None:
+            new, self._reassign = self._reassign, None
+            self.listener.on_partitions_revoked(self.assigned)
+            self.committed_at_revoke = self.committed()
+            self.assigned, self.paused = new, set()
+            self.listener.on_partitions_assigned(new)
+        polled = {}
+        for tp in sorted(self.assigned - self.paused):
+            start = self.positions[tp]
+            records = self.logs[tp][start:start + self.per_poll]
+            if records:
+                polled[tp] = records
+                self.positions[tp] = start + len(records)
+        if not polled:
+            time.sleep(timeout_ms / 1000.0)
+        return polled
+
+    def seek(self, tp, offset):
+        self.seeks.append((tp.partition, offset))
+        self.positions[tp] = offset
+
+    def pause(self, *tps):
+        self.paused.update(tps)
+
+    def resume(self, *tps):
+        self.paused.difference_update(tps)
+
+    def commit(self, offsets):
+        with self._lock:
+            self.commits.append({tp.partition: meta.offset for tp, meta in offsets.items()})
+
+    def committed(self):
+        latest = {}
+        with self._lock:
+            for commit in self.commits:
+                latest.update(commit)
+        return latest
+
+
+def _run(pipeline):
+    thread = threading.Thread(target=pipeline.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_lanes_keep_partition_order_and_commit_per_partition():
+    consumer = FakeConsumer({0: 7, 1: 5, 2: 3})
+    written = []
+    lock = threading.Lock()
+
+    def persist(results):
+        with lock:
+            written.extend(results)
+        return True
+
+    pipeline = PartitionLanes(consumer, _analyze, persist, batch_size=4, poll_ms=5,
+                              commit_interval_ms=0, decode=_decode)
+    thread = _run(pipeline)
+    _wait_for(lambda: consumer.committed() == {0: 7, 1: 5, 2: 3})
+    pipeline.stop()
+    thread.join(5)
+
+    for partition, count in ((0, 7), (1, 5), (2, 3)):
+        assert [o for p, o in written if p == partition] == list(range(count))
+
+
+def test_slow_partition_is_paused_without_blocking_others():
+    consumer = FakeConsumer({0: 20, 1: 6})
+    release = threading.Event()
+
+    def persist(results):
+        if results[0][0] == 0:
+            release.wait(5)
+        return True
+
+    pipeline = PartitionLanes(consumer, _analyze, persist, batch_size=2, poll_ms=5,
+                              max_pending=4, commit_interval_ms=0, decode=_decode)
+    thread = _run(pipeline)
+    _wait_for(lambda: consumer.committed().get(1) == 6)
+
+    assert TopicPartition(TOPIC, 0) in consumer.paused
+    assert 0 not in consumer.committed()
+    release.set()
+    _wait_for(lambda: consumer.committed().get(0) == 20)
+    pipeline.stop()
+    thread.join(5)
+    assert not consumer.paused
+
+
+def test_failed_write_rewinds_only_its_partition():
+    consumer = FakeConsumer({0: 4, 1: 4})
+    failures = [True]
+    written = []
+
+    def persist(results):
+        if results[0][0] == 0 and results[0][1] >= 2 and failures:
+            failures.pop()
+            return False
+        written.extend(results)
+        return True
+
+    pipeline = PartitionLanes(consumer, _analyze, persist, batch_size=2, poll_ms=5,
+                              commit_interval_ms=0, decode=_decode)
+    thread = _run(pipeline)
+    _wait_for(lambda: consumer.committed() == {0: 4, 1: 4})
+    pipeline.stop()
+    thread.join(5)
+
+    assert consumer.seeks == [(0, 2)]
+    assert [o for p, o in written if p == 0] == [0, 1, 2, 3]
+    assert [o for p, o in written if p == 1] == [0, 1, 2, 3]
+
+
+def test_rebalance_drains_revoked_lanes_and_builds_new_ones():
+    consumer = FakeConsumer({0: 4, 1: 4, 2: 4})
+    consumer.assigned = {TopicPartition(TOPIC, 0), TopicPartition(TOPIC, 1)}
+    pipeline = PartitionLanes(consumer, _analyze, lambda results: True, batch_size=2, poll_ms=5,
+                              commit_interval_ms=60_000, decode=_decode)
+
+    thread = _run(pipeline)
+    _wait_for(lambda: consumer.positions[TopicPartition(TOPIC, 1)] == 4)
+    consumer.reassign([0, 2])
+    _wait_for(lambda: consumer.positions[TopicPartition(TOPIC, 2)] == 4)
+    lanes = set(pipeline._lanes)
+    pipeline.stop()
+    thread.join(5)
+
+    # Revoked lanes were drained and committed before the rebalance completed
+    assert consumer.committed_at_revoke == {0: 4, 1: 4}
+    assert lanes == {TopicPartition(TOPIC, 0), TopicPartition(TOPIC, 2)}
+    assert consumer.committed() == {0: 4, 1: 4, 2: 4}
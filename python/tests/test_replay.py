@@ -0,0 +1,94 @@
+# Wizard/python/tests/test_replay.py
+
+import json
+import mmap
+
+import pytest
+
+from python.analyzer.core import run_analysis
+from python.analyzer.replay import iter_records, plan_chunks, replay_range, write_archive
+from wizard.transport import JSON, PROTOBUF
+
+
+class FakeCollection:
+    """Results collection keyed by event_id: find($in), insert_many and upserting bulk_write."""
+
+    def __init__(self, documents=()):
+        self.documents = {doc["event_id"]: dict(doc) for doc in documents}
+        self.writes = 0
+
+    def find(self, query):
+        return [self.documents[i] for i in query["event_id"]["$in"] if i in self.documents]
+
+    def bulk_write(self, requests, ordered=True):
+        self.writes += 1
+        for request in requests:
+            self.documents[request._filter["event_id"]] = request._doc
+
+
+def _events(count):
+    return [{"id": f"e{i}", "type": "checkout" if i % 3 == 0 else "click", "user_id": f"u{i}",
+             "timestamp": 1735689600 + i, "data": {"n": str(i)}} for i in range(count)]
+
+
+def _chunks(path, fmt, chunk_bytes):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        return [list(iter_records(buf, fmt, start, end)) for start, end in plan_chunks(buf, fmt, chunk_bytes)]
+
+
+@pytest.mark.parametrize("fmt", [JSON, PROTOBUF])
+def test_chunks_hold_every_record_once(tmp_path, fmt):
+    path = tmp_path / "events.archive"
+    write_archive(path, _events(100), fmt)
+
+    chunks = _chunks(path, fmt, chunk_bytes=300)
+    whole = _chunks(path, fmt, chunk_bytes=1 << 30)
+
+    assert len(chunks) > 5
+    assert [record for chunk in chunks for record in chunk] == whole[0]
+    assert len(whole[0]) == 100
+
+
+def test_truncated_protobuf_record_is_reported(tmp_path):
+    path = tmp_path / "events.pb"
+    write_archive(path, _events(10), PROTOBUF)
+    path.write_bytes(path.read_bytes()[:-3])
+
+    counts, _ = replay_range(str(path), PROTOBUF, 0, path.stat().st_size, run_analysis, None, write=False)
+
+    assert counts["records"] == 9
+    assert counts["truncated"] == 1
+
+
+def test_replay_upserts_and_diffs_against_stored_results(tmp_path):
+    path = tmp_path / "events.ndjson"
+    write_archive(path, _events(6), JSON)
+    stored = [dict(run_analysis(event)) for event in _events(4)]
+    stored[1]["analysis_type"] = "Outdated"
+    collection = FakeCollection(stored)
+
+    counts, changes = replay_range(str(path), JSON, 0, path.stat().st_size, run_analysis, collection,
+                                   batch_size=4, diff=True)
+
+    assert counts["analyzed"] == 6
+    assert counts["written"] == 6
+    assert (counts["unchanged"], counts["changed"], counts["missing"]) == (3, 1, 2)
+    assert changes == [{"event_id": "e1", "stored": {"analysis_type": "Outdated"},
+                        "new": {"analysis_type": "LowValue"}}]
+    assert collection.documents["e1"]["analysis_type"] == "LowValue"
+    assert collection.writes == 2
+
+
+def test_events_without_a_timestamp_diff_as_unchanged(tmp_path):
+    """Their event_time is the processing time, so it is not compared."""
+    events = [{key: value for key, value in event.items() if key != "timestamp"} for event in _events(3)]
+    path = tmp_path / "events.ndjson"
+    path.write_bytes(b"{broken\n" + b"".join(json.dumps(event).encode() + b"\n" for event in events))
+    collection = FakeCollection([dict(run_analysis(event)) for event in events])
+
+    counts, changes = replay_range(str(path), JSON, 0, path.stat().st_size, run_analysis, collection,
+                                   write=False, diff=True)
+
+    assert (counts["records"], counts["undecodable"], counts["analyzed"]) == (4, 1, 3)
+    assert counts["unchanged"] == 3
+    assert changes == []
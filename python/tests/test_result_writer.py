@@ -0,0 +1,126 @@
+# Wizard/python/tests/test_result_writer.py
+
+import time
+
+from pymongo import InsertOne, ReplaceOne
+from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+from python.analyzer.writer import RESULT_INDEXES, ResultWriter
+
+
+class FakeCollection:
+    """Records writes; fails the next `failures` calls with `error`."""
+
+    def __init__(self, failures=0, error=None):
+        self.batches = []
+        self.requests = []
+        self.indexes = []
+        self.failures = failures
+        self.error = error
+
+    def _maybe_fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+
+    def insert_many(self, documents, ordered=True):
+        self._maybe_fail()
+        self.batches.append([document["event_id"] for document in documents])
+
+    def bulk_write(self, requests, ordered=True):
+        self._maybe_fail()
+        self.requests.append(requests)
+
+    def create_index(self, keys, **options):
+        self.indexes.append((keys, options))
+
+
+def _docs(*ids):
+    return [{"event_id": event_id, "user_id": "u"} for event_id in ids]
+
+
+def test_add_flushes_when_flush_size_is_reached():
+    collection = FakeCollection()
+    writer = ResultWriter(collection, flush_size=2)
+
+    for document in _docs("a", "b", "c"):
+        writer.add(document)
+
+    assert collection.batches == [["a", "b"]]
+    assert len(writer) == 1
+    writer.close()
+    assert collection.batches == [["a", "b"], ["c"]]
+
+
+def test_background_flush_after_interval_and_indexes_on_start():
+    collection = FakeCollection()
+    writer = ResultWriter(collection, flush_size=100, flush_interval=0.01)
+
+    writer.start()
+    writer.add(_docs("a")[0])
+    deadline = time.monotonic() + 2
+    while not collection.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+
+    assert collection.batches == [["a"]]
+    assert [options["name"] for _, options in collection.indexes] == [o["name"] for _, o in RESULT_INDEXES]
+
+
+def test_transient_errors_are_retried_with_backoff():
+    sleeps = []
+    collection = FakeCollection(failures=2, error=AutoReconnect("primary stepped down"))
+    writer = ResultWriter(collection, max_retries=3, backoff_base=0.1, sleep=sleeps.append)
+
+    assert writer.write(_docs("a")) is True
+
+    assert collection.batches == [["a"]]
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.1 and 0 <= sleeps[1] <= 0.2
+
+
+def test_permanent_errors_are_not_retried_and_dropped_from_buffer():
+    sleeps = []
+    error = BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "validation failed"}]})
+    writer = ResultWriter(FakeCollection(failures=1, error=error), sleep=sleeps.append)
+
+    writer.add(_docs("a")[0])
+
+    assert writer.flush() is False
+    assert sleeps == []
+    assert len(writer) == 0
+
+
+def test_documents_are_kept_after_transient_failure():
+    collection = FakeCollection(failures=2, error=AutoReconnect("no primary"))
+    writer = ResultWriter(collection, max_retries=1, sleep=lambda _: None)
+    writer.add(_docs("a")[0])
+
+    assert writer.flush() is False
+    assert len(writer) == 1
+    assert writer.flush() is True
+    assert collection.batches == [["a"]]
+
+
+def test_upsert_replaces_by_event_id():
+    collection = FakeCollection()
+    writer = ResultWriter(collection, upsert=True)
+
+    assert writer.write(_docs("a") + [{"event_id": None, "user_id": "u"}]) is True
+
+    replace, insert = collection.requests[0]
+    assert replace == ReplaceOne({"event_id": "a"}, _docs("a")[0], upsert=True)
+    assert isinstance(insert, InsertOne)
+
+
+def test_index_failures_do_not_prevent_startup():
+    class DuplicateIds(FakeCollection):
+        def create_index(self, keys, **options):
+            if options.get("unique"):
+                raise OperationFailure("E11000 duplicate key error", code=11000)
+            super().create_index(keys, **options)
+
+    collection = DuplicateIds()
+    ResultWriter(collection).ensure_indexes()
+
+    assert len(collection.indexes) == len(RESULT_INDEXES) - 1
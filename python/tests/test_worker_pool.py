@@ -0,0 +1,134 @@
+# Wizard/python/tests/test_worker_pool.py
+
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from kafka import TopicPartition
+
+from python.analyzer.core import run_analysis
+from python.analyzer.workers import ParallelPipeline, _pool_context, analyze_chunk
+from wizard.transport import decode_message
+
+
+# Set in each worker process by _init_worker
+_WORKER_STATE = {}
+
+
+def _init_worker(tag):
+    _WORKER_STATE["tag"] = tag
+
+
+def _tagged_analysis(event):
+    return {"user_id": event.get("UserID"), "tag": _WORKER_STATE.get("tag")}
+
+
+def _record(partition, offset, user):
+    value = json.dumps({"UserID": user, "Action": "checkout", "Timestamp": 1735689600})
+    return SimpleNamespace(topic="events", partition=partition, offset=offset,
+                           value=value.encode('utf-8'), headers=[])
+
+
+class FakeConsumer:
+    """Serves preset poll results, then empty polls."""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.commit = MagicMock()
+        self.seek = MagicMock()
+
+    def poll(self, timeout_ms=0, max_records=None):
+        if not self.batches:
+            return {}
+        records = self.batches.pop(0)
+        polled = {}
+        for record in records:
+            polled.setdefault(TopicPartition(record.topic, record.partition), []).append(record)
+        return polled
+
+
+def test_analyze_chunk_skips_bad_records():
+    """Workers decode raw bytes and skip malformed messages."""
+    results = analyze_chunk(decode_message, run_analysis, [(b"{broken", []), (_record(0, 0, "a").value, [])])
+
+    assert [result['user_id'] for result in results] == ["a"]
+
+
+def test_analyze_chunk_scores_the_chunk_with_one_model_call():
+    """With model_scores, every event is analyzed with its score from one batch call."""
+    calls = []
+
+    def model_scores(events):
+        calls.append(len(events))
+        return [0.1 * i for i in range(len(events))]
+
+    messages = [(_record(0, i, f"u{i}").value, []) for i in range(3)]
+    results = analyze_chunk(decode_message, lambda event, score=None: score, messages, model_scores=model_scores)
+
+    assert calls == [3]
+    assert results == [0.0, 0.1, 0.2]
+
+    def broken(events):
+        raise RuntimeError("model unavailable")
+
+    assert analyze_chunk(decode_message, lambda event, score=None: score, messages, model_scores=broken) == [None] * 3
+
+
+def test_pipeline_keeps_partition_order_and_commits():
+    """Results reach the single writer in offset order for every partition."""
+    batches = [
+        [_record(0, i, f"p0-{i}") for i in range(5)] + [_record(1, i, f"p1-{i}") for i in range(4)],
+        [_record(0, 5, "p0-5"), _record(1, 4, "p1-4")],
+    ]
+    consumer = FakeConsumer(batches)
+    written = []
+
+    def persist(results):
+        written.extend(result['user_id'] for result in results)
+        if len(written) == 11:
+            pipeline.stop()
+        return True
+
+    pipeline = ParallelPipeline(consumer, run_analysis, persist, workers=2, batch_size=20, linger_ms=10)
+    pipeline.run()
+
+    for partition, count in ((0, 6), (1, 5)):
+        ordered = [user for user in written if user.startswith(f"p{partition}-")]
+        assert ordered == [f"p{partition}-{i}" for i in range(count)]
+    last_commit = consumer.commit.call_args[0][0]
+    assert last_commit[TopicPartition("events", 0)].offset == 6
+    assert last_commit[TopicPartition("events", 1)].offset == 5
+
+
+def test_failed_write_rewinds_to_oldest_uncommitted_record():
+    """A failed write drops in-flight batches and rewinds instead of committing."""
+    consumer = FakeConsumer([[_record(0, 10, "a"), _record(0, 11, "b")]])
+
+    def persist(results):
+        pipeline.stop()
+        return False
+
+    pipeline = ParallelPipeline(consumer, run_analysis, persist, workers=2, batch_size=5, linger_ms=10)
+    pipeline.run()
+
+    consumer.commit.assert_not_called()
+    consumer.seek.assert_called_once_with(TopicPartition("events", 0), 10)
+
+
+def test_workers_are_not_forked_and_run_the_initializer():
+    """Workers start fresh (no fork of the threaded consumer process) and rebuild their state in the initializer."""
+    consumer = FakeConsumer([[_record(0, 0, "a"), _record(0, 1, "b")]])
+    written = []
+
+    def persist(results):
+        written.extend(results)
+        pipeline.stop()
+        return True
+
+    pipeline = ParallelPipeline(consumer, _tagged_analysis, persist, workers=2, batch_size=5, linger_ms=10,
+                                initializer=_init_worker, initargs=("ready",))
+    pipeline.run()
+
+    assert _pool_context().get_start_method() != "fork"
+    assert written == [{"user_id": "a", "tag": "ready"}, {"user_id": "b", "tag": "ready"}]
+    assert _WORKER_STATE == {}
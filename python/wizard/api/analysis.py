@@ -0,0 +1,237 @@
+# File: python/wizard/api/analysis.py
+
+import codecs
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from wizard.core.analysis_engine import analyze_event, analyze_events
+from wizard.utils import codec
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+NDJSON = "application/x-ndjson"
+# Events scored per analyze_events call (and per response write)
+BATCH_CHUNK_SIZE = 500
+# Largest single event accepted; bounds the parse buffer of a streamed body
+MAX_EVENT_BYTES = 1 << 20
+# Most ids accepted by one bulk lookup
+MAX_LOOKUP_IDS = 1000
+
+_WHITESPACE = " \t\r\n"
+
+
+class BodyError(ValueError):
+    """The request body is not NDJSON or a JSON array of events."""
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (line number, decoded value or exception) for each non-empty line of
+    an NDJSON stream. Only one line is buffered at a time.
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_EVENT_BYTES:
+            raise BodyError(f"Line {line_no + len(lines) + 1} exceeds {MAX_EVENT_BYTES} bytes.")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, _decode(line)
+    if buffer.strip():
+        yield line_no + 1, _decode(buffer)
+
+
+def _decode(line: bytes) -> Any:
+    try:
+        return codec.loads(line)
+    except codec.DECODE_ERRORS as e:
+        return e
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (index, element) for each element of a streamed top-level JSON array,
+    buffering at most one element (plus one network chunk) at a time.
+    """
+    decoder = json.JSONDecoder()
+    # Incremental: a chunk boundary may split a multi-byte character
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    pos = 0
+    index = 0
+    started = False
+    done = False
+    chunks = chunks.__aiter__()
+    exhausted = False
+
+    while not done:
+        # Skip separators; a new element starts at the first other character.
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(text):
+            char = text[pos]
+            if not started:
+                if char != "[":
+                    raise BodyError("Expected a JSON array.")
+                started = True
+                pos += 1
+                continue
+            if char == "]":
+                done = True
+                break
+            if char == "," and index > 0:
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value ending at the buffer edge may be a truncated number.
+            if end is not None and (end < len(text) or exhausted):
+                yield index, value
+                index += 1
+                pos = end
+                continue
+        if exhausted:
+            raise BodyError(f"Malformed or truncated JSON array at element {index}.")
+        if len(text) - pos > MAX_EVENT_BYTES:
+            raise BodyError(f"Element {index} exceeds {MAX_EVENT_BYTES} bytes.")
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            exhausted = True
+            text = text[pos:] + utf8.decode(b"", final=True)
+            pos = 0
+            continue
+        text = text[pos:] + utf8.decode(chunk)
+        pos = 0
+
+
+async def _peek(chunks: AsyncIterator[bytes]) -> Tuple[bytes, AsyncIterator[bytes]]:
+    """Reads ahead to the first non-whitespace byte and returns it with the full stream."""
+    chunks = chunks.__aiter__()
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+
+    async def replay():
+        if head:
+            yield head
+        async for chunk in chunks:
+            yield chunk
+
+    return head.lstrip()[:1], replay()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator reads the request body while the
+    response is being sent.
+
+    StreamingResponse listens for client disconnects by consuming receive()
+    messages, which would swallow the request body; here the iterator is the
+    only reader, and a disconnect surfaces as ClientDisconnect from
+    request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _score_chunk(chunk: List[Tuple[int, Any]]) -> bytes:
+    """Scores one chunk of (position, event) pairs and encodes the results as NDJSON, in input order."""
+    events = [event for _, event in chunk if isinstance(event, dict)]
+    results = iter(analyze_events(events).to_dicts() if events else ())
+    lines = []
+    for position, event in chunk:
+        if isinstance(event, dict):
+            lines.append(codec.dumps(next(results)))
+        else:
+            reason = str(event) if isinstance(event, Exception) else "event must be a JSON object"
+            lines.append(codec.dumps({"index": position, "error": reason}))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def _stream_results(request: Request) -> AsyncIterator[bytes]:
+    first, body = await _peek(request.stream())
+    items = iter_json_array(body) if first == b"[" else iter_ndjson(body)
+    chunk = []
+    error = None
+    try:
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                yield await run_in_threadpool(_score_chunk, chunk)
+                chunk = []
+    except (BodyError, UnicodeDecodeError) as e:
+        logger.warning(f"Rejected batch analysis body: {e}")
+        error = e
+    except ClientDisconnect:
+        logger.info("Client disconnected during batch analysis.")
+        return
+    if chunk:
+        yield await run_in_threadpool(_score_chunk, chunk)
+    if error is not None:
+        # Headers are already sent; report the error in-band as the last line.
+        yield (codec.dumps({"error": str(error)}) + "\n").encode("utf-8")
+
+
+@router.post("/api/v1/analyze", tags=["Core API"])
+async def analyze_one(request: Request) -> Dict[str, Any]:
+    """
+    Scores a single event. Requests are scored on the thread pool, so the
+    model score of concurrent requests is computed in shared forward passes
+    (see InferenceStage); clients with many events should use analyze:batch.
+    """
+    try:
+        event = codec.loads(await request.body())
+    except codec.DECODE_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="The event must be a JSON object.")
+    return await run_in_threadpool(analyze_event, event)
+
+
+@router.post("/api/v1/analyze:batch", tags=["Core API"])
+async def analyze_batch(request: Request):
+    """
+    Scores a batch of events sent as NDJSON (one event per line) or as a JSON
+    array. Events are parsed incrementally and scored in chunks; results are
+    streamed back as NDJSON in input order, so memory stays constant however
+    many events a client sends. Unparseable items produce an
+    {"index": ..., "error": ...} line instead of a result (index is the line
+    number for NDJSON and the array index for JSON).
+    """
+    return DuplexStreamingResponse(_stream_results(request), media_type=NDJSON)
+
+
+@router.get("/api/v1/analysis", tags=["Core API"])
+async def get_analysis_results(request: Request, ids: List[str] = Query(...)) -> Dict[str, Any]:
+    """
+    Bulk lookup of persisted analysis results. Accepts repeated or
+    comma-separated ids (?ids=a&ids=b or ?ids=a,b); uncached ids are read with
+    one query.
+    """
+    event_ids = list(dict.fromkeys(i for value in ids for i in value.split(",") if i))
+    if len(event_ids) > MAX_LOOKUP_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_IDS} ids per request.")
+    found = await request.app.state.results.get_many(event_ids)
+    return {
+        "results": {event_id: result for event_id, result in found.items() if result is not None},
+        "missing": [event_id for event_id, result in found.items() if result is None],
+    }
@@ -0,0 +1,58 @@
+# File: python/wizard/api/metrics.py
+
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from wizard.utils import metrics
+
+router = APIRouter()
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds",
+    "API request latency until the response body is sent, by route template.",
+    ["method", "route", "status"],
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request into REQUEST_SECONDS.
+
+    Requests are labelled with the matched route template (e.g.
+    /api/v1/analysis/{item_id}) rather than the raw path, so label
+    cardinality stays bounded. Written as plain ASGI, unlike
+    BaseHTTPMiddleware, so streamed request and response bodies pass
+    through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path, str(status)).observe(time.perf_counter() - start)
+
+
+@router.get("/metrics", tags=["Monitoring"])
+async def export_metrics():
+    """Prometheus text exposition of the service's counters, gauges and histograms."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
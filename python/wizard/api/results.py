@@ -0,0 +1,153 @@
+# File: python/wizard/api/results.py
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from wizard.models.stored import expand_document
+from wizard.settings import get_settings
+from wizard.utils.cache import AsyncReadThroughCache
+from wizard.utils.clients import Backoff, registry
+
+logger = logging.getLogger(__name__)
+
+RESULTS_COLLECTION = "results"
+
+# Server error codes of change streams: not supported (standalone server), and
+# no longer resumable from the given token (fatal error, oplog history lost)
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_NOT_RESUMABLE = (280, 286)
+
+
+class ResultStore:
+    """
+    Read path for persisted analysis results.
+
+    Documents are read from the Mongo `results` collection by event_id through
+    an AsyncReadThroughCache, expanded to the API shape (see
+    wizard.models.stored.expand_document). Writers in this process call invalidate() after
+    persisting; writes from other processes are picked up by
+    watch_invalidations() where change streams are available, and otherwise
+    become visible once the cached entry expires.
+    """
+
+    def __init__(self, collection, max_entries: int = 10_000, ttl_seconds: float = 30.0, client=None):
+        """
+        Args:
+            collection: The results collection (motor API).
+            max_entries: Maximum number of cached results.
+            ttl_seconds: Maximum age of a cached result.
+            client: Optional client owned by the store, closed by close().
+        """
+        self.collection = collection
+        self.client = client
+        self.cache = AsyncReadThroughCache(self._load, max_entries=max_entries, ttl_seconds=ttl_seconds,
+                                           bulk_loader=self._load_many)
+        self._watch_task: Optional[asyncio.Task] = None
+
+    async def _load(self, event_id: str) -> Optional[Dict[str, Any]]:
+        return expand_document(await self.collection.find_one({"event_id": event_id}, {"_id": 0}))
+
+    async def _load_many(self, event_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        cursor = self.collection.find({"event_id": {"$in": event_ids}}, {"_id": 0})
+        return {document["event_id"]: expand_document(document) async for document in cursor}
+
+    async def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored result for event_id, or None if there is none."""
+        return await self.cache.get(event_id)
+
+    async def get_many(self, event_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Returns {event_id: result or None}, reading all uncached ids with one query."""
+        return await self.cache.get_many(event_ids)
+
+    def invalidate(self, event_id: str):
+        self.cache.invalidate(event_id)
+
+    def invalidate_documents(self, documents: Iterable[Dict[str, Any]]):
+        """Invalidates the cached results of freshly persisted result documents."""
+        for document in documents:
+            event_id = document.get("event_id")
+            if event_id is not None:
+                self.cache.invalidate(event_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+    async def watch_invalidations(self, backoff: Optional[Backoff] = None, sleep=asyncio.sleep):
+        """
+        Invalidates cached results as other processes write them (Mongo change
+        stream). A failed stream is reopened with backoff, resuming after the
+        last change it delivered; if the server can no longer resume from
+        there, the whole cache is dropped and watching starts over. Change
+        streams need a replica set; on a standalone server this logs a warning
+        and returns, leaving the TTL to bound staleness.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "replace", "update"]}}}]
+        backoff = backoff or Backoff()
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(pipeline, full_document="updateLookup",
+                                                 resume_after=resume_token) as stream:
+                    logger.info("Watching the results collection for cache invalidation.")
+                    backoff.reset()
+                    async for change in stream:
+                        document = change.get("fullDocument") or {}
+                        if document.get("event_id") is not None:
+                            self.cache.invalidate(document["event_id"])
+                        resume_token = stream.resume_token
+                # The stream was invalidated (e.g. the collection was dropped)
+                logger.warning("Result cache invalidation stream ended; clearing the cache and watching again.")
+                resume_token = None
+                self.cache.clear()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("Result cache invalidation stream unavailable, relying on TTL: %s", e)
+                    return
+                if e.code not in CHANGE_STREAM_NOT_RESUMABLE:
+                    logger.warning("Result cache invalidation stream failed: %s", e)
+                else:
+                    # Changes since the token are lost, so any cached result may be stale
+                    logger.warning("Result cache invalidation stream cannot resume, clearing the cache: %s", e)
+                    resume_token = None
+                    self.cache.clear()
+            except PyMongoError as e:
+                logger.warning("Result cache invalidation stream failed: %s", e)
+            await sleep(backoff.next())
+
+    def start_watching(self):
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self.watch_invalidations())
+
+    async def close(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        if self.client is not None:
+            self.client.close()
+
+
+def create_result_store(mongodb_uri: Optional[str] = None, database: Optional[str] = None,
+                        max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None) -> ResultStore:
+    """
+    Creates a ResultStore on the process-wide motor client (shared with an
+    in-process pipeline and closed by registry.close(), not by the store).
+    Unset arguments come from the settings (database.uri/host,
+    database.name_analysis, cache.results_size, cache.results_ttl; see
+    wizard.settings). The client connects lazily on the first read.
+    """
+    settings = get_settings()
+    mongodb_uri = mongodb_uri or settings.database.mongodb_uri
+    database = database or settings.database.name_analysis
+    if max_entries is None:
+        max_entries = settings.cache.results_size
+    if ttl_seconds is None:
+        ttl_seconds = settings.cache.results_ttl
+    client = registry.async_mongo(mongodb_uri)
+    return ResultStore(client[database][RESULTS_COLLECTION], max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -1,83 +1,316 @@
 # File: python/wizard/core/analysis_engine.py
 
+import gc
 import logging
-from typing import Dict, Any, List
+import operator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence, Union
 from datetime import datetime, timezone
 
-# Assume we have a shared module for data models, mirroring the Go structures
-# In Python, this model might be implemented using Pydantic for validation.
-# from wizard.models import CollectorEvent, AnalysisResult 
+import numpy as np
+
+from wizard.core.features import FeatureStore, feature_fields
+from wizard.core.inference import InferenceStage
+from wizard.core.rules import ADD, Condition, RuleSet, rule_engine
+from wizard.models import AnalysisResult, CollectorEvent, event_columns, normalize_event
 
 logger = logging.getLogger(__name__)
 
-# A simple rule set for generating an analysis score
-RISK_RULES = {
-    "LOGIN": 0.5,
-    "PURCHASE": 0.8,
-    "CLICK": 0.1,
-}
+# Risk rules, compiled from config/rules/risk.yaml. The services hot-reload
+# the file with risk_rules.watch(); read risk_rules.current once per event.
+risk_rules = rule_engine("risk")
+
+# Optional model score blended into the rule score; the services install it
+# with set_inference(InferenceStage.from_settings(settings)).
+inference: Optional[InferenceStage] = None
+
+
+def set_inference(stage: Optional[InferenceStage]) -> Optional[InferenceStage]:
+    """Installs (or with None removes) the model stage; returns the previous one."""
+    global inference
+    previous, inference = inference, stage
+    return previous
+
+# Per-user history for the velocity rules of risk.yaml; the services install
+# it with set_feature_store(FeatureStore.from_settings(settings)). A store
+# passed to score_event/analyze_events takes precedence (and records).
+feature_store: Optional[FeatureStore] = None
+record_features = True
+
 
-def analyze_event(event_data: Dict[str, Any]) -> Dict[str, Any]:
+def set_feature_store(store: Optional[FeatureStore], record: bool = True) -> Optional[FeatureStore]:
     """
-    Performs core analysis on a standardized event dictionary.
+    Installs (or with None removes) the feature store; returns the previous
+    one. With record=False events are scored against the store's history
+    without being added to it.
+    """
+    global feature_store, record_features
+    previous, feature_store, record_features = feature_store, store, record
+    return previous
+
+
+def score_event(event: CollectorEvent, features: Optional[FeatureStore] = None) -> AnalysisResult:
+    """
+    Performs core analysis on a normalized event.
     
     This function simulates business logic that might involve:
     1. Looking up historical user data.
     2. Calling a machine learning model.
     3. Applying heuristic business rules.
+
+    With a FeatureStore (given or installed), its velocity and new_country
+    fields feed the velocity rules, and the event is recorded in it unless
+    the installed store is read-only (see set_feature_store). With
+    an inference stage installed, the model score (micro-batched with
+    concurrent callers) is blended into the rule score before the tier is
+    assigned.
     """
-    logger.info(f"Starting analysis for event type: {event_data.get('type')}")
+    # Lazy %-style arguments: sampled-out records are never formatted
+    logger.info("Starting analysis for event type: %s", event.type)
     
-    event_id = event_data.get('id', 'N/A')
-    event_type = event_data.get('type', 'UNKNOWN')
+    event_id = event.id if event.id is not None else 'N/A'
+    event_type = event.type if event.type is not None else 'UNKNOWN'
     
     # --- 1. Score Calculation (Heuristic Example) ---
-    
-    base_score = RISK_RULES.get(event_type, 0.0)
-    score_labels: List[str] = []
-    
-    # Rule 1: Increase score if the event contains sensitive financial data
-    if event_type == "PURCHASE" and event_data.get('data', {}).get('value', 0) > 1000:
-        base_score += 0.2
-        score_labels.append("high_value_transaction")
-        
-    # Rule 2: Flag unusual login locations (simplified check)
-    if event_type == "LOGIN" and event_data.get('data', {}).get('country', 'US') != 'US':
-        base_score += 0.1
-        score_labels.append("international_access")
-
-    # Final score clamped between 0.0 and 1.0
-    final_score = min(1.0, base_score)
+
+    # Base score plus the declarative rules for this event type, fed with the
+    # payload plus per-user history (O(1) lookups in the feature store)
+    rules = risk_rules.current
+    if features is not None:
+        data = feature_fields(features, event)
+    else:
+        data = feature_fields(feature_store, event, record=record_features)
+    base_score, score_labels = rules.evaluate(event_type, data)
+
+    stage = inference
+    if stage is not None:
+        base_score = stage.blend(base_score, stage.score(event))
 
     # --- 2. Result Packaging ---
+
+    # Final score clamped to the rule set's maximum, plus its risk tier
+    final_score, score_labels, detail_msg = rules.finalize(event_type, base_score, score_labels)
+
+    analysis_result = AnalysisResult(
+        event_id=event_id,
+        score=final_score,
+        labels=score_labels,
+        detail_message=detail_msg,
+        processed_at=datetime.now(timezone.utc),
+        event_type=event_type,
+        rules=rules.name,
+    )
     
-    detail_msg = f"Analysis complete. Calculated risk based on {event_type} event type."
-    if final_score >= 0.7:
-        score_labels.append("high_risk")
-        detail_msg = "Critical alert: High risk anomaly detected."
-    elif final_score >= 0.5:
-        score_labels.append("medium_risk")
-        
-    # Build the AnalysisResult structure (simulated dictionary output)
-    analysis_result = {
-        "event_id": event_id,
-        "score": round(final_score, 4), # Use four decimal places for precision
-        "labels": score_labels,
-        "detail_message": detail_msg,
-        "processed_at": datetime.now(timezone.utc).isoformat(),
-    }
-    
-    logger.info(f"Analysis for {event_id} finished with score: {final_score}")
+    logger.info("Analysis for %s finished with score: %s", event_id, final_score)
     
     return analysis_result
 
-# --- Example of Integration with FastAPI (in python/wizard/api/__init__.py) ---
+def analyze_event(event_data: Union[CollectorEvent, Dict[str, Any]],
+                  features: Optional[FeatureStore] = None) -> Dict[str, Any]:
+    """
+    Analyzes one event in any supported representation (see normalize_event)
+    and returns the AnalysisResult as a dictionary.
+    """
+    return score_event(normalize_event(event_data), features).to_dict()
+
+# --- Vectorized Batch Analysis ---
+
+@contextmanager
+def _gc_paused():
+    """
+    Pauses the cyclic garbage collector. Allocating many (acyclic) containers
+    otherwise triggers collections that rescan every live object, the batch
+    included, and dominate the cost of building them.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@dataclass
+class BatchAnalysis:
+    """
+    Columnar analysis results for a batch of events.
+
+    Row i describes the i-th event of the input batch. Labels are stored as
+    bit flags of the rule set that scored the batch and expanded only when
+    requested.
+    """
+    event_ids: List[Any]
+    event_types: List[Any]
+    scores: np.ndarray       # float64, rounded exactly like analyze_event
+    label_flags: np.ndarray  # uint64 label bits (see RuleSet.labels_for)
+    processed_at: str
+    rules: RuleSet
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def labels(self, index: int) -> List[str]:
+        """Returns the label list for the event at the given row."""
+        return list(self.rules.labels_for(int(self.label_flags[index])))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        Expands the batch into the per-event dictionaries of analyze_event.
+
+        Building a dict per event costs about as much as scoring the batch,
+        so callers that can use the columns directly (scores, label_flags,
+        labels()) should.
+        """
+        processed_at = self.processed_at
+        rules = self.rules
+        # Labels and detail messages only depend on the event type and the
+        # label bits, so build each (labels, detail) pair once.
+        expanded: Dict[Any, tuple] = {}
+        results = []
+        append = results.append
+        with _gc_paused():
+            for event_id, event_type, score, flags in zip(
+                self.event_ids, self.event_types, self.scores.tolist(), self.label_flags.tolist()
+            ):
+                key = (event_type, flags)
+                entry = expanded.get(key)
+                if entry is None:
+                    entry = expanded[key] = (rules.labels_for(flags), rules.detail_for(event_type, flags))
+                append({
+                    "event_id": event_id,
+                    "score": score,
+                    "labels": list(entry[0]),
+                    "detail_message": entry[1],
+                    "processed_at": processed_at,
+                })
+        return results
+
+
+# Rule operators over whole columns (NumPy arrays broadcast the comparison)
+_COLUMN_OPERATORS = {
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+}
+_NUMBER_TYPES = {int, float, bool}
+_SCALAR_TYPES = _NUMBER_TYPES | {str, type(None)}
+
+
+def _condition_mask(condition: Condition, column: List[Any]) -> np.ndarray:
+    """
+    Evaluates a rule condition for a column of field values at once, with
+    the results of the per-event predicate: numbers are compared as a float
+    array, other scalars element-wise as Python objects.
+    """
+    n = len(column)
+    expected = condition.value
+    if condition.op in ("in", "not_in"):
+        hit = np.fromiter([value in expected for value in column], dtype=bool, count=n)
+        return hit if condition.op == "in" else ~hit
+    compare = _COLUMN_OPERATORS[condition.op]
+    if type(expected) in _NUMBER_TYPES and set(map(type, column)) <= _NUMBER_TYPES:
+        return compare(np.fromiter(column, dtype=np.float64, count=n), expected)
+    if type(expected) in _SCALAR_TYPES:
+        return compare(np.fromiter(column, dtype=object, count=n), expected).astype(bool, copy=False)
+    return np.fromiter([compare(value, expected) for value in column], dtype=bool, count=n)
+
+
+def analyze_events(batch: Sequence[Union[CollectorEvent, Dict[str, Any]]],
+                   features: Optional[FeatureStore] = None) -> BatchAnalysis:
+    """
+    Vectorized equivalent of analyze_event for a batch of events.
+
+    The batch is read column by column (ids, types, payloads) and grouped by
+    event type once; base scores are assigned per group. Every condition
+    field of the group's rules is extracted into one column and compared as
+    a whole (see _condition_mask), and each rule is applied as an index
+    mask. Scores and labels are identical to calling analyze_event on every
+    event; processed_at is stamped once per batch. A model score is computed
+    for the whole batch at once. Events are recorded in the feature store (as
+    with analyze_event) in batch order.
+    """
+    rules = risk_rules.current
+    store = features if features is not None else feature_store
+    record = features is not None or record_features
+    stage = inference
+    events = None
+    if store is None and stage is None:
+        event_ids, event_types, payloads = event_columns(batch)
+    else:
+        events = [normalize_event(event) for event in batch]
+        event_ids = [event.id for event in events]
+        event_types = [event.type for event in events]
+        payloads = [feature_fields(store, event, record=record) for event in events]
+    n = len(event_ids)
+    if None in event_ids:
+        event_ids = [event_id if event_id is not None else 'N/A' for event_id in event_ids]
+    if None in event_types:
+        event_types = [event_type if event_type is not None else 'UNKNOWN' for event_type in event_types]
+
+    type_codes = {event_type: code for code, event_type in enumerate(dict.fromkeys(event_types))}
+    codes = np.fromiter(map(type_codes.__getitem__, event_types), dtype=np.intp, count=n)
+
+    scores = np.empty(n, dtype=np.float64)
+    flags = np.empty(n, dtype=np.uint64)
+    for event_type, code in type_codes.items():
+        idx = np.flatnonzero(codes == code)
+        scores[idx] = rules.base_score(event_type)
+        flags[idx] = rules.default_bits
+        group_payloads = None
+        columns: Dict[tuple, List[Any]] = {}
+        for rule in rules.rules_for(event_type):
+            if rule.when:
+                if group_payloads is None:
+                    group_payloads = [payloads[i] for i in idx.tolist()]
+                mask = None
+                for condition in rule.when:
+                    key = (condition.field, condition.default)
+                    column = columns.get(key)
+                    if column is None:
+                        field, default = key
+                        column = columns[key] = [payload.get(field, default) for payload in group_payloads]
+                    hit = _condition_mask(condition, column)
+                    mask = hit if mask is None else mask & hit
+                hit = idx[mask]
+            else:
+                hit = idx
+            if rule.action == ADD:
+                scores[hit] += rule.score
+                flags[hit] |= np.uint64(rule.bits)
+            else:
+                scores[hit] = rule.score
+                flags[hit] = rule.bits
+
+    if stage is not None:
+        # One forward pass for the whole batch
+        scores = stage.blend(scores, stage.predict(events))
+
+    final = np.minimum(rules.max_score, scores) if rules.max_score is not None else scores
+    assigned = np.zeros(n, dtype=bool)
+    for tier in rules.tiers:
+        hit = ~assigned & (final >= tier.min_score)
+        flags[hit] |= np.uint64(tier.bits)
+        assigned |= hit
+
+    if rules.round_digits is not None:
+        # Only a handful of distinct scores exist, so round them with the builtin
+        # round() to match analyze_event bit for bit (np.round differs on ties).
+        unique, inverse = np.unique(final, return_inverse=True)
+        rounded = np.array([round(value, rules.round_digits) for value in unique.tolist()], dtype=np.float64)
+        final = rounded[inverse.reshape(-1)]
+
+    logger.info("Analyzed batch of %s events.", n)
 
-# from fastapi import APIRouter
-# from .core.analysis_engine import analyze_event
-# 
-# router = APIRouter()
-# @router.post("/analyze")
-# def run_analysis(event: dict): # event would be validated by a Pydantic model here
-#     result = analyze_event(event)
-#     return result
\ No newline at end of file
+    return BatchAnalysis(
+        event_ids=event_ids,
+        event_types=event_types,
+        scores=final,
+        label_flags=flags,
+        processed_at=datetime.now(timezone.utc).isoformat(),
+        rules=rules,
+    )
@@ -0,0 +1,385 @@
+# File: python/wizard/core/baselines.py
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# A baseline's standard deviation is taken as at least this fraction of its
+# mean, so a perfectly flat series does not turn every bit of jitter into an
+# infinite z-score.
+MIN_RELATIVE_STD = 0.05
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative accuracy (DDSketch).
+
+    Positive values are counted in logarithmic bins of width `gamma`, so every
+    quantile is returned within `relative_accuracy` of the true value
+    regardless of the distribution; zero and negative values share one bin.
+    Adding is O(1). At most `max_bins` bins are kept: beyond that the lowest
+    ones are collapsed, trading accuracy of the low quantiles (which anomaly
+    scoring does not use) for bounded memory. Two sketches with the same
+    accuracy merge by adding their bin counts.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "_log_gamma", "bins", "zero_count", "count", "_floor")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 256):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1, got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max(1, max_bins)
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self._floor: Optional[int] = None  # lowest bin left after a collapse
+
+    def _index(self, value: float) -> int:
+        index = math.ceil(math.log(value) / self._log_gamma)
+        if self._floor is not None and index < self._floor:
+            return self._floor
+        return index
+
+    def _value(self, index: int) -> float:
+        # Midpoint of the bin's [gamma^(i-1), gamma^i] range, relative to both ends
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** index / (gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = self._index(value)
+        bins = self.bins
+        if index in bins:
+            bins[index] += count
+        else:
+            bins[index] = count
+            if len(bins) > self.max_bins:
+                self._collapse()
+
+    def _collapse(self):
+        """Folds the lowest bins into one until at most max_bins remain."""
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins + 1
+        floor = indexes[excess]
+        self.bins[floor] += sum(self.bins.pop(index) for index in indexes[:excess])
+        self._floor = floor
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile (0 <= q <= 1); 0.0 for an empty sketch."""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.bins))
+
+    def merge(self, other: "DDSketch"):
+        """Adds another sketch's counts (both must have the same relative accuracy)."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy "
+                             f"({self.relative_accuracy} and {other.relative_accuracy}).")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            if self._floor is not None and index < self._floor:
+                index = self._floor
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"zero": self.zero_count, "bins": [[index, count] for index, count in self.bins.items()]}
+
+    def load(self, state: Dict[str, Any]) -> "DDSketch":
+        """Adds the counts of a to_dict() state of a sketch with the same accuracy."""
+        other = DDSketch(self.relative_accuracy, max(self.max_bins, len(state["bins"])))
+        other.zero_count = state["zero"]
+        other.bins = {int(index): count for index, count in state["bins"]}
+        other.count = other.zero_count + sum(other.bins.values())
+        self.merge(other)
+        return self
+
+
+class Deviation(NamedTuple):
+    """How far a value lies from its key's baseline, measured before the value was added."""
+    z: float  # (value - mean) / std of the EWMA
+    ratio: float  # value / the baseline's tail quantile
+    mean: float
+    std: float
+    quantile: float  # the tail quantile (e.g. p99) the ratio refers to
+    count: int  # values in the baseline
+
+
+class Baseline:
+    """
+    EWMA mean and variance plus a quantile sketch of one key's values.
+
+    Until 1 / alpha values have been seen the mean and variance are plain
+    cumulative ones, so early values are not over-weighted.
+    """
+
+    __slots__ = ("mean", "var", "count", "last_seen", "sketch", "_tail", "_tail_age")
+
+    def __init__(self, sketch: DDSketch):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.last_seen = 0.0
+        self.sketch = sketch
+        self._tail: Optional[float] = None
+        self._tail_age = 0
+
+    def update(self, value: float, alpha: float):
+        self.count += 1
+        weight = max(alpha, 1.0 / self.count)
+        diff = value - self.mean
+        increment = weight * diff
+        self.mean += increment
+        self.var = (1 - weight) * (self.var + diff * increment)
+        self.sketch.add(value)
+        self._tail_age += 1
+
+    def tail(self, q: float, refresh: int) -> float:
+        """The sketch's q-quantile, recomputed at most every `refresh` updates."""
+        if self._tail is None or self._tail_age >= refresh:
+            self._tail = self.sketch.quantile(q)
+            self._tail_age = 0
+        return self._tail
+
+    def deviation(self, value: float, q: float, refresh: int) -> Deviation:
+        std = max(math.sqrt(self.var), MIN_RELATIVE_STD * abs(self.mean))
+        if std > 0:
+            z = (value - self.mean) / std
+        else:
+            z = 0.0 if value == self.mean else math.copysign(math.inf, value - self.mean)
+        tail = self.tail(q, refresh)
+        if tail > 0:
+            ratio = value / tail
+        else:
+            ratio = math.inf if value > 0 else 0.0
+        return Deviation(z, ratio, self.mean, std, tail, self.count)
+
+    def merge(self, other: "Baseline", alpha: float):
+        """
+        Combines two baselines of the same key (e.g. from different worker
+        processes). Each EWMA is weighted by its effective sample size, at
+        most 2 / alpha - 1 values.
+        """
+        horizon = 2.0 / alpha - 1
+        w1, w2 = min(self.count, horizon), min(other.count, horizon)
+        total = w1 + w2
+        if total > 0:
+            delta = other.mean - self.mean
+            self.mean += delta * w2 / total
+            self.var = (w1 * self.var + w2 * other.var) / total + w1 * w2 * delta * delta / (total * total)
+        self.count += other.count
+        self.last_seen = max(self.last_seen, other.last_seen)
+        self.sketch.merge(other.sketch)
+        self._tail = None
+
+
+class BaselineStore:
+    """
+    Per-key streaming baselines for scoring values by their deviation from
+    the key's own history (e.g. a service's latency), instead of a fixed
+    threshold.
+
+    observe() scores a value against its key's Baseline and then adds it;
+    both are O(1) (the tail quantile is recomputed every `refresh` values).
+    Memory is bounded: at most `max_keys` keys are kept (least recently seen
+    evicted first), keys idle for longer than `ttl_seconds` are dropped, and
+    each key holds a few floats plus a sketch of at most `max_bins` bins.
+    No raw values are kept.
+
+    Stores are mergeable: state() of one (e.g. from another worker process)
+    can be merged into another, and snapshot()/restore() carry baselines
+    across restarts.
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, alpha: float = 0.02, quantile: float = 0.99, min_samples: int = 30,
+                 max_keys: int = 10_000, ttl_seconds: float = 86_400.0,
+                 relative_accuracy: float = 0.02, max_bins: int = 256, refresh: int = 32):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.refresh = refresh
+        self._baselines: "OrderedDict[str, Baseline]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._persister: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def tune(self, alpha: Optional[float] = None, quantile: Optional[float] = None,
+             min_samples: Optional[int] = None, max_keys: Optional[int] = None,
+             ttl_seconds: Optional[float] = None):
+        """Changes scoring parameters at runtime; existing baselines are kept."""
+        if alpha is not None:
+            if not 0 < alpha <= 1:
+                raise ValueError(f"alpha must be in (0, 1], got {alpha}")
+            self.alpha = alpha
+        if quantile is not None:
+            self.quantile = quantile
+        if min_samples is not None:
+            self.min_samples = min_samples
+        if max_keys is not None:
+            self.max_keys = max_keys
+        if ttl_seconds is not None:
+            self.ttl_seconds = ttl_seconds
+
+    def __len__(self) -> int:
+        return len(self._baselines)
+
+    def _new(self) -> Baseline:
+        return Baseline(DDSketch(self.relative_accuracy, self.max_bins))
+
+    def _baseline(self, key: str, now: float) -> Baseline:
+        baseline = self._baselines.get(key)
+        if baseline is None or now - baseline.last_seen > self.ttl_seconds:
+            baseline = self._baselines[key] = self._new()
+        self._baselines.move_to_end(key)
+        baseline.last_seen = max(baseline.last_seen, now)
+        return baseline
+
+    def _evict(self, now: float):
+        baselines = self._baselines
+        while len(baselines) > self.max_keys:
+            baselines.popitem(last=False)
+        # The head is the least recently seen key; drop it while it is stale.
+        while baselines:
+            baseline = next(iter(baselines.values()))
+            if now - baseline.last_seen <= self.ttl_seconds:
+                break
+            baselines.popitem(last=False)
+
+    def observe(self, key: str, value: float, now: Optional[float] = None) -> Optional[Deviation]:
+        """
+        Scores `value` against the key's baseline, then adds it. Returns None
+        while the baseline holds fewer than `min_samples` values.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            baseline = self._baseline(key, now)
+            deviation = None
+            if baseline.count >= self.min_samples:
+                deviation = baseline.deviation(value, self.quantile, self.refresh)
+            baseline.update(value, self.alpha)
+            self._evict(now)
+        return deviation
+
+    def get(self, key: str) -> Optional[Baseline]:
+        return self._baselines.get(key)
+
+    # --- Merging and persistence ---
+
+    def state(self) -> Dict[str, Any]:
+        """JSON-serializable contents, least recently seen key first."""
+        with self._lock:
+            return {
+                "version": self.SNAPSHOT_VERSION,
+                "relative_accuracy": self.relative_accuracy,
+                "keys": {
+                    key: {
+                        "mean": baseline.mean,
+                        "var": baseline.var,
+                        "count": baseline.count,
+                        "last_seen": baseline.last_seen,
+                        "sketch": baseline.sketch.to_dict(),
+                    }
+                    for key, baseline in self._baselines.items()
+                },
+            }
+
+    def merge(self, other: Union["BaselineStore", Dict[str, Any]]) -> None:
+        """Merges another store, or its state(), into this one key by key."""
+        state = other.state() if isinstance(other, BaselineStore) else other
+        if state.get("version") != self.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported baseline snapshot version: {state.get('version')}")
+        if state["relative_accuracy"] != self.relative_accuracy:
+            raise ValueError(f"Cannot merge baselines with relative accuracy {state['relative_accuracy']} "
+                             f"into a store with {self.relative_accuracy}.")
+        with self._lock:
+            for key, data in state["keys"].items():
+                incoming = self._new()
+                incoming.mean = data["mean"]
+                incoming.var = data["var"]
+                incoming.count = data["count"]
+                incoming.last_seen = data["last_seen"]
+                incoming.sketch.load(data["sketch"])
+                baseline = self._baselines.get(key)
+                if baseline is None:
+                    self._baselines[key] = incoming
+                else:
+                    baseline.merge(incoming, self.alpha)
+            # Least recently seen first again, for eviction
+            ordered = sorted(self._baselines.items(), key=lambda item: item[1].last_seen)
+            self._baselines = OrderedDict(ordered)
+            if ordered:
+                self._evict(ordered[-1][1].last_seen)
+
+    def snapshot(self, path: str) -> None:
+        """Writes the store to `path` atomically (write to a temp file, then rename)."""
+        state = self.state()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, path)
+
+    def restore(self, path: str) -> None:
+        """Replaces the store contents with a snapshot written by snapshot()."""
+        with open(path, "r", encoding="utf-8") as fh:
+            state: Dict[str, Any] = json.load(fh)
+        with self._lock:
+            self._baselines = OrderedDict()
+        self.merge(state)
+
+    def persist(self, path: str, interval: float = 60.0):
+        """Starts a daemon thread writing a snapshot to `path` every `interval` seconds."""
+        if self._persister is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self._snapshot_logged(path)
+
+        self._persister = threading.Thread(target=run, name="baseline-snapshots", daemon=True)
+        self._persister.start()
+
+    def stop_persisting(self, path: Optional[str] = None):
+        """Stops the snapshot thread; writes a final snapshot to `path` if given."""
+        if self._persister is not None:
+            self._stop.set()
+            self._persister.join()
+            self._persister = None
+        if path:
+            self._snapshot_logged(path)
+
+    def _snapshot_logged(self, path: str):
+        try:
+            self.snapshot(path)
+        except OSError as e:
+            logger.error("Failed to write baseline snapshot to %s: %s", path, e)
@@ -0,0 +1,313 @@
+# File: python/wizard/core/features.py
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from wizard.models import CollectorEvent
+
+logger = logging.getLogger(__name__)
+
+# Payload fields feature_fields() adds for the rules (see config/rules/risk.yaml)
+VELOCITY = "velocity"  # the user's events of this type within the window, this one included
+NEW_COUNTRY = "new_country"  # the event's country was never seen for a user with history
+
+
+class RollingWindow:
+    """
+    Count and sum of values over a sliding time window.
+
+    Values are aggregated into fixed-width buckets, so memory is bounded by
+    window / bucket_width and every update or query is amortized O(1).
+    """
+
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = deque()  # [bucket_start, count, total], oldest first
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, ts: float, value: float, bucket_width: float):
+        start = ts - ts % bucket_width
+        if self.buckets and self.buckets[-1][0] >= start:
+            # Same bucket (late events are folded into the newest bucket)
+            bucket = self.buckets[-1]
+            bucket[1] += 1
+            bucket[2] += value
+        else:
+            self.buckets.append([start, 1, value])
+        self.count += 1
+        self.total += value
+
+    def expire(self, now: float, window: float):
+        horizon = now - window
+        buckets = self.buckets
+        while buckets and buckets[0][0] <= horizon:
+            _, count, total = buckets.popleft()
+            self.count -= count
+            self.total -= total
+
+
+class UserFeatures:
+    """Aggregates for one user: a rolling window and last country per event type."""
+
+    __slots__ = ("windows", "last_country", "countries", "last_seen")
+
+    def __init__(self):
+        self.windows: Dict[str, RollingWindow] = {}
+        self.last_country: Dict[str, str] = {}
+        self.countries = set()
+        self.last_seen = 0.0
+
+
+class FeatureStore:
+    """
+    In-process, per-user feature store for velocity and history rules.
+
+    Keeps, per user and event type, the count and sum of `data.value` over the
+    last `window_seconds`, plus the last country seen. Memory is bounded: at
+    most `max_users` users are kept (least recently seen evicted first) and
+    users idle for longer than `ttl_seconds` are dropped. Windows use event
+    time when the event carries a timestamp.
+
+    Every operation is O(1) amortized. State is local to the process; the
+    store can be snapshotted to disk and restored on restart.
+    """
+
+    SNAPSHOT_VERSION = 1
+    MAX_COUNTRIES = 32  # distinct countries remembered per user
+
+    def __init__(self, window_seconds: float = 600.0, bucket_seconds: float = 10.0,
+                 max_users: int = 100_000, ttl_seconds: float = 86_400.0):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._users: "OrderedDict[str, UserFeatures]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._persister: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls, settings) -> Optional["FeatureStore"]:
+        """
+        The store configured by settings.features, restored from its
+        snapshot_path if one exists; None if the store is disabled.
+        """
+        features = settings.features
+        if not features.enabled:
+            return None
+        store = cls(window_seconds=features.window_s, bucket_seconds=features.bucket_s,
+                    max_users=features.max_users, ttl_seconds=features.ttl_s)
+        if features.snapshot_path and os.path.exists(features.snapshot_path):
+            try:
+                store.restore(features.snapshot_path)
+                logger.info(f"Restored features of {len(store)} users.")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(f"Failed to restore the feature store from {features.snapshot_path}: {e}")
+        return store
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def record(self, event: CollectorEvent, now: Optional[float] = None) -> None:
+        """Adds an event to its user's aggregates."""
+        if event.user_id is None:
+            return
+        ts = event.timestamp if event.timestamp is not None else (now if now is not None else time.time())
+        event_type = event.type if event.type is not None else 'UNKNOWN'
+        value = event.data.get('value', 0)
+        country = event.data.get('country')
+
+        with self._lock:
+            features = self._users.get(event.user_id)
+            if features is None or ts - features.last_seen > self.ttl_seconds:
+                features = UserFeatures()
+                self._users[event.user_id] = features
+            self._users.move_to_end(event.user_id)
+            features.last_seen = max(features.last_seen, ts)
+
+            window = features.windows.get(event_type)
+            if window is None:
+                window = features.windows[event_type] = RollingWindow()
+            window.add(ts, value if isinstance(value, (int, float)) else 0.0, self.bucket_seconds)
+            window.expire(ts, self.window_seconds)
+
+            if country is not None:
+                features.last_country[event_type] = country
+                if len(features.countries) < self.MAX_COUNTRIES:
+                    features.countries.add(country)
+
+            self._evict(ts)
+
+    def _evict(self, now: float):
+        users = self._users
+        while len(users) > self.max_users:
+            users.popitem(last=False)
+        # The head is the least recently seen user; drop it while it is stale.
+        while users:
+            features = next(iter(users.values()))
+            if now - features.last_seen <= self.ttl_seconds:
+                break
+            users.popitem(last=False)
+
+    def _window(self, user_id: str, event_type: str, now: Optional[float]) -> Optional[RollingWindow]:
+        features = self._users.get(user_id)
+        if features is None:
+            return None
+        window = features.windows.get(event_type)
+        if window is not None:
+            window.expire(now if now is not None else features.last_seen, self.window_seconds)
+        return window
+
+    def count(self, user_id: str, event_type: str, now: Optional[float] = None) -> int:
+        """Number of `event_type` events by the user within the window ending at `now`."""
+        with self._lock:
+            window = self._window(user_id, event_type, now)
+            return window.count if window is not None else 0
+
+    def total(self, user_id: str, event_type: str, now: Optional[float] = None) -> float:
+        """Sum of `data.value` over the user's `event_type` events within the window."""
+        with self._lock:
+            window = self._window(user_id, event_type, now)
+            return window.total if window is not None else 0.0
+
+    def last_country(self, user_id: str, event_type: str) -> Optional[str]:
+        """Country of the user's most recent `event_type` event that carried one."""
+        features = self._users.get(user_id)
+        return features.last_country.get(event_type) if features is not None else None
+
+    def is_new_country(self, user_id: str, country: str) -> bool:
+        """True if the user has history but has never been seen in `country`."""
+        features = self._users.get(user_id)
+        return features is not None and bool(features.countries) and country not in features.countries
+
+    def peek(self, event: CollectorEvent) -> Tuple[int, bool]:
+        """
+        What observe() would return for the event, without recording it (or
+        expiring anything), so scoring the same event twice gives the same
+        fields.
+        """
+        country = event.data.get('country')
+        new_country = country is not None and self.is_new_country(event.user_id, country)
+        ts = event.timestamp if event.timestamp is not None else time.time()
+        event_type = event.type if event.type is not None else 'UNKNOWN'
+        with self._lock:
+            features = self._users.get(event.user_id)
+            if features is None or ts - features.last_seen > self.ttl_seconds:
+                return 1, new_country
+            window = features.windows.get(event_type)
+            if window is None:
+                return 1, new_country
+            horizon = ts - self.window_seconds
+            return 1 + sum(count for start, count, _ in window.buckets if start > horizon), new_country
+
+    def observe(self, event: CollectorEvent) -> Tuple[int, bool]:
+        """
+        Records the event and returns (velocity, new_country): the user's
+        events of this type within the window, this one included, and whether
+        its country is new for a user with history.
+        """
+        country = event.data.get('country')
+        new_country = country is not None and self.is_new_country(event.user_id, country)
+        self.record(event)
+        return self.count(event.user_id, event.type if event.type is not None else 'UNKNOWN'), new_country
+
+    # --- Persistence ---
+
+    def snapshot(self, path: str) -> None:
+        """Writes the store to `path` atomically (write to a temp file, then rename)."""
+        with self._lock:
+            state = {
+                "version": self.SNAPSHOT_VERSION,
+                "users": {
+                    user_id: {
+                        "last_seen": features.last_seen,
+                        "last_country": features.last_country,
+                        "countries": sorted(features.countries),
+                        "windows": {
+                            event_type: [list(bucket) for bucket in window.buckets]
+                            for event_type, window in features.windows.items()
+                        },
+                    }
+                    for user_id, features in self._users.items()
+                },
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, path)
+
+    def restore(self, path: str) -> None:
+        """Replaces the store contents with a snapshot written by snapshot()."""
+        with open(path, "r", encoding="utf-8") as fh:
+            state: Dict[str, Any] = json.load(fh)
+        if state.get("version") != self.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported feature store snapshot version: {state.get('version')}")
+
+        users: "OrderedDict[str, UserFeatures]" = OrderedDict()
+        # Snapshots list users least recently seen first, preserving LRU order.
+        for user_id, data in state["users"].items():
+            features = UserFeatures()
+            features.last_seen = data["last_seen"]
+            features.last_country = dict(data["last_country"])
+            features.countries = set(data["countries"])
+            for event_type, buckets in data["windows"].items():
+                window = RollingWindow()
+                for start, count, total in buckets:
+                    window.buckets.append([start, count, total])
+                    window.count += count
+                    window.total += total
+                features.windows[event_type] = window
+            users[user_id] = features
+        with self._lock:
+            self._users = users
+
+    def persist(self, path: str, interval: float = 60.0):
+        """Starts a daemon thread writing a snapshot to `path` every `interval` seconds."""
+        if self._persister is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self._snapshot_logged(path)
+
+        self._persister = threading.Thread(target=run, name="feature-snapshots", daemon=True)
+        self._persister.start()
+
+    def stop_persisting(self, path: Optional[str] = None):
+        """Stops the snapshot thread; writes a final snapshot to `path` if given."""
+        if self._persister is not None:
+            self._stop.set()
+            self._persister.join()
+            self._persister = None
+        if path:
+            self._snapshot_logged(path)
+
+    def _snapshot_logged(self, path: str):
+        try:
+            self.snapshot(path)
+        except OSError as e:
+            logger.error(f"Failed to write feature store snapshot to {path}: {e}")
+
+
+def feature_fields(store: Optional[FeatureStore], event: CollectorEvent,
+                   data: Optional[Mapping[str, Any]] = None, record: bool = True) -> Mapping[str, Any]:
+    """
+    The payload of an event (or `data`, a payload with fields added already)
+    plus its VELOCITY and NEW_COUNTRY fields for the rules, recording the
+    event in the store unless `record` is False (see FeatureStore.peek).
+    The payload is returned as is without a store or a user_id.
+    """
+    if data is None:
+        data = event.data
+    if store is None or event.user_id is None:
+        return data
+    velocity, new_country = store.observe(event) if record else store.peek(event)
+    return {**data, VELOCITY: velocity, NEW_COUNTRY: new_country}
@@ -0,0 +1,300 @@
+# File: python/wizard/core/inference.py
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from wizard.models import CollectorEvent
+
+logger = logging.getLogger(__name__)
+
+# Feature name prefix selecting the event type (one-hot) rather than a data field
+TYPE_PREFIX = "type:"
+
+
+class FeatureVectorizer:
+    """
+    Turns events into rows of a float matrix, one column per feature name:
+
+    - "value": the numeric `data.value` (0 when missing or not a number)
+    - "country=US": 1.0 if `data.country` equals "US", else 0.0
+    - "type:PURCHASE": 1.0 for PURCHASE events, else 0.0
+
+    The names come with the model (see load_model), so a model and its
+    vectorizer always agree on the column order.
+    """
+
+    def __init__(self, features: Sequence[str]):
+        self.features = tuple(features)
+        self._columns: List[Callable[[CollectorEvent], float]] = [self._column(name) for name in self.features]
+
+    @staticmethod
+    def _column(name: str) -> Callable[[CollectorEvent], float]:
+        if name.startswith(TYPE_PREFIX):
+            event_type = name[len(TYPE_PREFIX):]
+            return lambda event: 1.0 if event.type == event_type else 0.0
+        if "=" in name:
+            field, expected = name.split("=", 1)
+            return lambda event: 1.0 if str(event.data.get(field)) == expected else 0.0
+
+        def numeric(event: CollectorEvent) -> float:
+            value = event.data.get(name)
+            return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+        return numeric
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def row(self, event: CollectorEvent) -> np.ndarray:
+        return np.array([column(event) for column in self._columns], dtype=np.float64)
+
+    def matrix(self, events: Sequence[CollectorEvent]) -> np.ndarray:
+        columns = self._columns
+        out = np.empty((len(events), len(columns)), dtype=np.float64)
+        for i, event in enumerate(events):
+            out[i] = [column(event) for column in columns]
+        return out
+
+
+class NumpyModel:
+    """
+    A dense network evaluated with NumPy on the CPU: ReLU hidden layers and a
+    sigmoid output, after optional per-feature standardization.
+
+    Stored as an .npz file with `features` (the feature names), `W0`, `b0`,
+    `W1`, `b1`, ... and optionally `mean` and `scale`.
+    """
+
+    def __init__(self, features: Sequence[str], layers: Sequence[tuple], mean=None, scale=None):
+        if not layers:
+            raise ValueError("A model needs at least one layer.")
+        if layers[0][0].shape[0] != len(features):
+            raise ValueError(f"First layer expects {layers[0][0].shape[0]} inputs, got {len(features)} features.")
+        self.features = tuple(features)
+        self.layers = [(np.asarray(w, dtype=np.float64), np.asarray(b, dtype=np.float64)) for w, b in layers]
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "NumpyModel":
+        with np.load(path, allow_pickle=False) as npz:
+            layers = []
+            while f"W{len(layers)}" in npz:
+                layers.append((npz[f"W{len(layers)}"], npz[f"b{len(layers)}"]))
+            return cls([str(name) for name in npz["features"]], layers,
+                       npz["mean"] if "mean" in npz else None, npz["scale"] if "scale" in npz else None)
+
+    def save(self, path: Union[str, Path]):
+        arrays = {"features": np.array(self.features)}
+        for i, (w, b) in enumerate(self.layers):
+            arrays[f"W{i}"], arrays[f"b{i}"] = w, b
+        if self.mean is not None:
+            arrays["mean"] = self.mean
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        np.savez(path, **arrays)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """Scores in [0, 1] for the rows of x, in one forward pass."""
+        if self.mean is not None:
+            x = x - self.mean
+        if self.scale is not None:
+            x = x / self.scale
+        last = len(self.layers) - 1
+        for i, (w, b) in enumerate(self.layers):
+            x = x @ w + b
+            if i < last:
+                np.maximum(x, 0.0, out=x)
+        x = x.reshape(len(x), -1)[:, 0]
+        return 1.0 / (1.0 + np.exp(-x))
+
+
+class OnnxModel:
+    """An ONNX model run with onnxruntime on the CPU; its first output (column 0) is the score."""
+
+    def __init__(self, path: Union[str, Path], features: Sequence[str]):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("ONNX models need the onnxruntime package (pip install onnxruntime).") from None
+        self.features = tuple(features)
+        self._session = onnxruntime.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0].name
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        output = self._session.run(None, {self._input: x.astype(np.float32)})[0]
+        return np.asarray(output, dtype=np.float64).reshape(len(x), -1)[:, 0]
+
+
+def load_model(path: Union[str, Path], features: Sequence[str] = ()):
+    """
+    Loads a .npz (NumpyModel) or .onnx model. ONNX files do not carry feature
+    names, so they must be given.
+    """
+    path = Path(path)
+    if path.suffix == ".onnx":
+        if not features:
+            raise ValueError(f"{path}: ONNX models need the list of feature names.")
+        return OnnxModel(path, features)
+    return NumpyModel.load(path)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item requests into batches.
+
+    submit() queues an item and returns a Future. A background thread takes up
+    to `max_batch` queued items, waiting at most `max_wait_ms` after the oldest
+    one arrived for the batch to fill, and runs `process` once on the whole
+    batch; `process` returns one result per item. A larger window means fuller
+    batches (throughput) at the cost of up to that much added latency. A
+    single caller waiting on each result in turn pays the whole window every
+    time; such callers should pass their events in batches instead.
+
+    The thread starts on the first submit (again in a forked child).
+    """
+
+    def __init__(self, process: Callable[[List[Any]], Sequence[Any]], max_batch: int = 64,
+                 max_wait_ms: float = 2.0, name: str = "micro-batcher"):
+        self.process = process
+        self.max_batch = max(1, max_batch)
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = deque()  # (arrival, item, future)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def tune(self, max_batch: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        with self._cond:
+            if max_batch is not None:
+                self.max_batch = max(1, max_batch)
+            if max_wait_ms is not None:
+                self.max_wait_ms = max_wait_ms
+            self._cond.notify()
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed.")
+            if self._pid != os.getpid():
+                self._start()
+            self._queue.append((time.monotonic(), item, future))
+            self._cond.notify()
+        return future
+
+    def _start(self):
+        # A forked child inherits the queue but not the thread
+        self._pid = os.getpid()
+        self._queue.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _next_batch(self) -> List[tuple]:
+        with self._cond:
+            while True:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return []
+                deadline = self._queue[0][0] + self.max_wait_ms / 1000.0
+                remaining = deadline - time.monotonic()
+                if len(self._queue) >= self.max_batch or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            futures = [future for _, _, future in batch]
+            try:
+                results = self.process([item for _, item, _ in batch])
+            except Exception as e:
+                logger.error(f"{self.name}: batch of {len(batch)} failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    @property
+    def mean_batch(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def close(self):
+        """Processes what is queued, then stops the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+
+
+class InferenceStage:
+    """
+    Model scores for events, blended into the rule score.
+
+    predict() runs one forward pass over a batch of events (the batch paths);
+    score() scores a single event through the MicroBatcher, so concurrent
+    single-event callers (API requests, consumer threads) share forward
+    passes. blend() mixes a model score into a rule score:
+    (1 - weight) * rule + weight * model.
+    """
+
+    def __init__(self, model, weight: float = 0.3, max_batch: int = 64, max_wait_ms: float = 2.0):
+        self.model = model
+        self.vectorizer = FeatureVectorizer(model.features)
+        self.weight = weight
+        self.batcher = MicroBatcher(self._forward, max_batch, max_wait_ms, name="model-inference")
+
+    @classmethod
+    def from_settings(cls, settings) -> Optional["InferenceStage"]:
+        """The stage configured by settings.inference, or None without a model."""
+        inference = settings.inference
+        if not inference.model_path:
+            return None
+        features = [name.strip() for name in inference.features.split(",") if name.strip()]
+        model = load_model(inference.model_path, features)
+        logger.info(f"Loaded model {inference.model_path} ({len(model.features)} features).")
+        return cls(model, inference.weight, inference.max_batch, inference.max_wait_ms)
+
+    def apply_settings(self, settings):
+        """Applies a reloaded blend weight and batching window."""
+        inference = settings.inference
+        self.weight = inference.weight
+        self.batcher.tune(inference.max_batch, inference.max_wait_ms)
+
+    def _forward(self, rows: List[np.ndarray]) -> List[float]:
+        return self.model.predict(np.vstack(rows)).tolist()
+
+    def predict(self, events: Sequence[CollectorEvent]) -> np.ndarray:
+        if not events:
+            return np.empty(0, dtype=np.float64)
+        return self.model.predict(self.vectorizer.matrix(events))
+
+    def score(self, event: CollectorEvent) -> float:
+        return self.batcher.submit(self.vectorizer.row(event)).result()
+
+    def blend(self, rule_score, model_score):
+        return (1.0 - self.weight) * rule_score + self.weight * model_score
+
+    def close(self):
+        self.batcher.close()
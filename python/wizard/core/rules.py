@@ -0,0 +1,339 @@
+# File: python/wizard/core/rules.py
+
+import logging
+import operator
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# Rule files live in config/rules at the repository root (copied to /app/config
+# in the images); WIZARD_RULES_DIR points elsewhere.
+RULES_DIR = Path(os.environ.get("WIZARD_RULES_DIR", Path(__file__).resolve().parents[3] / "config" / "rules"))
+
+# Event type matching every event
+WILDCARD = "*"
+
+# Rule actions
+ADD = "add"  # score += value, labels appended
+SET = "set"  # score = value, labels replaced
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "in": lambda actual, expected: actual in expected,
+    "not_in": lambda actual, expected: actual not in expected,
+}
+
+
+class RuleError(ValueError):
+    """Raised for a rule file that does not follow the rule format."""
+
+
+class Condition(NamedTuple):
+    """A `when` condition as declared: `op` compares data[field] (else default) with value."""
+    field: str
+    op: str
+    value: Any
+    default: Any
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    A compiled rule: applies its action when every condition holds for the
+    event payload. `when` holds the same conditions as declared, for callers
+    that evaluate them over whole columns (see analysis_engine.analyze_events).
+    """
+    name: str
+    types: Tuple[str, ...]
+    conditions: Tuple[Callable[[Mapping[str, Any]], bool], ...]
+    action: str
+    score: float
+    labels: Tuple[str, ...]
+    bits: int
+    when: Tuple[Condition, ...] = ()
+
+    def matches(self, data: Mapping[str, Any]) -> bool:
+        for condition in self.conditions:
+            if not condition(data):
+                return False
+        return True
+
+
+@dataclass(frozen=True)
+class Tier:
+    """Risk tier assigned to the first final score reaching `min_score`."""
+    min_score: float
+    label: str
+    detail: Optional[str]
+    bits: int
+
+
+def _parse_condition(spec: Mapping[str, Any], rule_name: str) -> Condition:
+    """Validates `{field, op, value, default}`."""
+    try:
+        field = spec["field"]
+        _OPERATORS[spec["op"]]
+        expected = spec["value"]
+    except KeyError as e:
+        raise RuleError(f"Rule '{rule_name}': invalid condition {spec!r} (missing or unknown {e}).") from None
+    if spec["op"] in ("in", "not_in"):
+        expected = frozenset(expected)
+    return Condition(field, spec["op"], expected, spec.get("default"))
+
+
+def _compile_condition(spec: Condition) -> Callable[[Mapping[str, Any]], bool]:
+    """Compiles a condition into a predicate over the event payload."""
+    field, compare, expected, default = spec.field, _OPERATORS[spec.op], spec.value, spec.default
+
+    def condition(data: Mapping[str, Any]) -> bool:
+        return compare(data.get(field, default), expected)
+
+    return condition
+
+
+class RuleSet:
+    """
+    An immutable, compiled rule file.
+
+    Rules are indexed by event type at compile time, so scoring an event only
+    evaluates the rules declared for its type (plus wildcard rules), in file
+    order. Labels get one bit each, in declaration order, for the columnar
+    batch path.
+    """
+
+    def __init__(self, spec: Mapping[str, Any], source: str = "<memory>"):
+        if not isinstance(spec, Mapping):
+            raise RuleError(f"{source}: expected a mapping at the top level.")
+        self.source = source
+        self.name = spec.get("name", source)
+        defaults = spec.get("defaults") or {}
+        self.default_score = float(defaults.get("score", 0.0))
+        self.default_labels = tuple(defaults.get("labels") or ())
+        self.default_detail = defaults.get("detail", "")
+        self.base_scores = {str(key): float(value) for key, value in (spec.get("base_scores") or {}).items()}
+        max_score = spec.get("max_score")
+        self.max_score = float(max_score) if max_score is not None else None
+        self.round_digits = spec.get("round")
+
+        self._bits: Dict[str, int] = {}
+        self.default_bits = self._label_bits(self.default_labels)
+        self.rules = tuple(self._compile_rule(rule, i) for i, rule in enumerate(spec.get("rules") or ()))
+        self.tiers = tuple(
+            Tier(float(tier["min"]), tier["label"], tier.get("detail"), self._label_bits((tier["label"],)))
+            for tier in spec.get("tiers") or ()
+        )
+        if len(self._bits) > 64:
+            raise RuleError(f"{source}: at most 64 distinct labels are supported.")
+        self.label_names = tuple(self._bits)
+        self._labels_by_bits: Dict[int, Tuple[str, ...]] = {}
+        self._default_details: Dict[Any, str] = {}
+
+        # Dispatch table: event type -> rules to evaluate, in file order.
+        wildcard_rules = tuple(rule for rule in self.rules if WILDCARD in rule.types)
+        self._wildcard_rules = wildcard_rules
+        self._dispatch: Dict[str, Tuple[Rule, ...]] = {}
+        for event_type in {t for rule in self.rules for t in rule.types if t != WILDCARD}:
+            self._dispatch[event_type] = tuple(
+                rule for rule in self.rules if event_type in rule.types or WILDCARD in rule.types
+            )
+
+    def _label_bits(self, labels: Sequence[str]) -> int:
+        bits = 0
+        for label in labels:
+            bits |= self._bits.setdefault(label, 1 << len(self._bits))
+        return bits
+
+    def _compile_rule(self, spec: Mapping[str, Any], index: int) -> Rule:
+        name = spec.get("name", f"rule-{index}")
+        types = spec.get("type", WILDCARD)
+        types = (types,) if isinstance(types, str) else tuple(types)
+        when = spec.get("when") or ()
+        if isinstance(when, Mapping):
+            when = (when,)
+        if (ADD in spec) == (SET in spec):
+            raise RuleError(f"Rule '{name}': exactly one of '{ADD}' or '{SET}' is required.")
+        action = ADD if ADD in spec else SET
+        labels = spec.get("labels")
+        if labels is None:
+            labels = (spec["label"],) if "label" in spec else ()
+        labels = tuple(labels)
+        when = tuple(_parse_condition(condition, name) for condition in when)
+        return Rule(
+            name=name,
+            types=types,
+            conditions=tuple(_compile_condition(condition) for condition in when),
+            action=action,
+            score=float(spec[action]),
+            labels=labels,
+            bits=self._label_bits(labels),
+            when=when,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def rules_for(self, event_type: Any) -> Tuple[Rule, ...]:
+        """The rules evaluated for an event type, in file order."""
+        return self._dispatch.get(event_type, self._wildcard_rules)
+
+    def base_score(self, event_type: Any) -> float:
+        return self.base_scores.get(event_type, self.default_score)
+
+    def evaluate(self, event_type: Any, data: Mapping[str, Any]) -> Tuple[float, List[str]]:
+        """Applies the base score and the event type's rules. Returns (score, labels)."""
+        score = self.base_scores.get(event_type, self.default_score)
+        labels = list(self.default_labels)
+        for rule in self._dispatch.get(event_type, self._wildcard_rules):
+            if rule.matches(data):
+                if rule.action == ADD:
+                    score += rule.score
+                    labels.extend(rule.labels)
+                else:
+                    score = rule.score
+                    labels = list(rule.labels)
+        return score, labels
+
+    def finalize(self, event_type: Any, score: float, labels: List[str]) -> Tuple[float, List[str], str]:
+        """Clamps the score and assigns the risk tier. Returns (score, labels, detail message)."""
+        if self.max_score is not None:
+            score = min(self.max_score, score)
+        detail = None
+        for tier in self.tiers:
+            if score >= tier.min_score:
+                labels.append(tier.label)
+                detail = tier.detail
+                break
+        if detail is None:
+            detail = self.default_detail_for(event_type)
+        if self.round_digits is not None:
+            score = round(score, self.round_digits)
+        return score, labels, detail
+
+    def score(self, event_type: Any, data: Mapping[str, Any]) -> Tuple[float, List[str], str]:
+        """Scores one event. Returns (score, labels, detail message)."""
+        score, labels = self.evaluate(event_type, data)
+        return self.finalize(event_type, score, labels)
+
+    def labels_for(self, bits: int) -> Tuple[str, ...]:
+        """Expands label bits into label names, in declaration order."""
+        labels = self._labels_by_bits.get(bits)
+        if labels is None:
+            labels = tuple(name for name, bit in self._bits.items() if bits & bit)
+            self._labels_by_bits[bits] = labels
+        return labels
+
+    def detail_for(self, event_type: Any, bits: int) -> str:
+        """The detail message of an event with the given final label bits."""
+        for tier in self.tiers:
+            if tier.detail is not None and bits & tier.bits:
+                return tier.detail
+        return self.default_detail_for(event_type)
+
+    def detail_for_labels(self, event_type: Any, labels: Sequence[str]) -> str:
+        """The detail message of an event with the given final labels (e.g. of a stored result)."""
+        for tier in self.tiers:
+            if tier.detail is not None and tier.label in labels:
+                return tier.detail
+        return self.default_detail_for(event_type)
+
+    def default_detail_for(self, event_type: Any) -> str:
+        """The default detail message of an event type, formatted once per type."""
+        detail = self._default_details.get(event_type)
+        if detail is None:
+            detail = self._default_details[event_type] = self.default_detail.format(type=event_type)
+        return detail
+
+
+def load_rules(path: Union[str, Path]) -> RuleSet:
+    """Reads and compiles a YAML rule file."""
+    with open(path, "r", encoding="utf-8") as fh:
+        spec = yaml.safe_load(fh)
+    return RuleSet(spec, source=str(path))
+
+
+class RuleEngine:
+    """
+    Holds the current RuleSet of a rule file and hot-reloads it.
+
+    A reload compiles the new file completely before replacing `current`
+    with a single attribute assignment, so readers never block and always see
+    a whole rule set. Callers should read `current` once per event (or batch).
+    A file that fails to compile is logged and the previous rules stay active.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._mtime = self._stat()
+        self.current = load_rules(self.path)
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Recompiles the rule file if it changed on disk. Returns True if new rules were swapped in."""
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            rules = load_rules(self.path)
+        except (OSError, yaml.YAMLError, RuleError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Failed to reload rules from {self.path}, keeping the current rules: {e}")
+            return False
+        self.current = rules
+        logger.info(f"Reloaded {len(rules)} rules from {self.path}.")
+        return True
+
+    def watch(self, interval: float = 2.0):
+        """Starts a daemon thread polling the rule file every `interval` seconds."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def poll():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=poll, name=f"rules-watcher-{self.path.name}", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+
+_engines: Dict[str, RuleEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def rule_engine(name: str) -> RuleEngine:
+    """
+    The process-wide RuleEngine of RULES_DIR/<name>.yaml, loaded on first use.
+    Raises OSError or RuleError (not cached) if the file cannot be loaded.
+    """
+    engine = _engines.get(name)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(name)
+            if engine is None:
+                engine = _engines[name] = RuleEngine(RULES_DIR / f"{name}.yaml")
+    return engine
@@ -3,9 +3,17 @@
 import os
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.responses import JSONResponse
-import uvicorn
 import logging
 
+from wizard.api.analysis import router as analysis_router
+from wizard.api.metrics import MetricsMiddleware, router as metrics_router
+from wizard.api.results import create_result_store
+from wizard.core.analysis_engine import risk_rules, set_feature_store, set_inference
+from wizard.core.features import FeatureStore
+from wizard.core.inference import InferenceStage
+from wizard.settings import get_settings, settings_store
+from wizard.utils.clients import registry
+
 # Set up basic logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,6 +43,35 @@ def verify_api_key(api_key: str = None):
         pass # Allow access for this minimal example
     return True
 
+# --- Startup and Shutdown Events ---
+
+@app.on_event("startup")
+async def startup_event():
+    """Creates the cached read path for persisted analysis results."""
+    app.state.results = create_result_store()
+    app.state.results.start_watching()
+    # Pick up scoring rule changes (config/rules/risk.yaml) without a redeploy
+    risk_rules.watch()
+    # Per-user history for the velocity rules, restored from the last snapshot.
+    # Read-only: requests do not add to it, so the same event scores the same.
+    set_feature_store(FeatureStore.from_settings(get_settings()), record=False)
+    # Optional model score, blended into the rule score
+    stage = InferenceStage.from_settings(get_settings())
+    if stage is not None:
+        set_inference(stage)
+        settings_store.on_reload(stage.apply_settings)
+        settings_store.watch()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    stage = set_inference(None)
+    if stage is not None:
+        stage.close()
+    set_feature_store(None)
+    settings_store.stop_watching()
+    await app.state.results.close()
+    registry.close()
+
 # --- API Endpoints ---
 
 @app.get("/", tags=["Root"])
@@ -55,21 +92,33 @@ async def health_check():
     return JSONResponse(content={"status": "UP", "service": "Wizard API"})
 
 @app.get("/api/v1/analysis/{item_id}", tags=["Core API"])
-async def get_analysis_result(item_id: int, authorized: bool = Depends(verify_api_key)):
+async def get_analysis_result(item_id: str, authorized: bool = Depends(verify_api_key)):
     """
-    Retrieves the analysis result for a given item ID.
+    Retrieves the persisted analysis result for a given event ID.
     Requires a simulated API key check.
     """
-    if item_id % 2 == 0:
-        # Placeholder for complex logic from .core
-        return {"item_id": item_id, "result": "Analyzed and OK", "details": "Processed by the core engine."}
-    else:
-        # Simulate a not-found or failed analysis
+    result = await app.state.results.get(item_id)
+    if result is None:
         raise HTTPException(status_code=404, detail=f"Analysis for Item ID {item_id} not found.")
+    return {"item_id": item_id, "result": result}
+
+@app.get("/api/v1/cache/stats", tags=["Monitoring"])
+async def cache_stats():
+    """Hit/miss/eviction counters of the result cache, for sizing it under load."""
+    return {"results": app.state.results.stats()}
+
+# Batch scoring and bulk result lookup
+app.include_router(analysis_router, dependencies=[Depends(verify_api_key)])
+
+# Prometheus scrape endpoint and per-route request latency
+app.include_router(metrics_router)
+app.add_middleware(MetricsMiddleware)
 
 # --- Main Run Block ---
 
 if __name__ == "__main__":
+    import uvicorn
+
     # Get port from environment variables, default to 8000
     port = int(os.environ.get("PORT", 8000))
     logger.info(f"Starting Uvicorn on port {port}")
@@ -0,0 +1,25 @@
+# File: python/wizard/models/__init__.py
+#
+# Python counterparts of the Go models in go/pkg/models/data.go.
+
+from .events import (
+    CollectorEvent,
+    EVENT_CLICK,
+    EVENT_LOGIN,
+    EVENT_PURCHASE,
+    EVENT_TELEMETRY,
+    event_columns,
+    normalize_event,
+)
+from .results import AnalysisResult
+
+__all__ = [
+    "AnalysisResult",
+    "CollectorEvent",
+    "EVENT_CLICK",
+    "EVENT_LOGIN",
+    "EVENT_PURCHASE",
+    "EVENT_TELEMETRY",
+    "event_columns",
+    "normalize_event",
+]
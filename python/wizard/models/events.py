@@ -0,0 +1,126 @@
+# File: python/wizard/models/events.py
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# EventType values (mirrors the EventType constants in go/pkg/models/data.go)
+EVENT_LOGIN = "LOGIN"
+EVENT_PURCHASE = "PURCHASE"
+EVENT_CLICK = "CLICK"
+EVENT_TELEMETRY = "TELEMETRY"
+
+
+@dataclass(slots=True)
+class CollectorEvent:
+    """
+    An ingested event, mirroring the Go CollectorEvent.
+
+    Slotted so an in-flight event carries no per-instance key table. Fields are
+    None when the source message did not carry them; `data` is always a mapping.
+    Instances are shared between pipeline stages and must not be mutated.
+    """
+    id: Optional[str] = None
+    timestamp: Optional[float] = None  # Unix epoch seconds
+    type: Optional[str] = None
+    user_id: Optional[str] = None
+    source_service: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+# Alternative spellings per field, tried in order when the Go JSON tag is
+# missing: the legacy collector names used by AnalyzerCore and the
+# transport.proto field names.
+_ID_KEYS = ("EventID", "event_id")
+_TYPE_KEYS = ("Action", "action")
+_DATA_KEYS = ("Payload", "payload")
+
+
+def _first(get, keys):
+    for key in keys:
+        value = get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def _event_id(value: Any) -> Optional[str]:
+    """Ids are stored and looked up as strings; numeric ids (e.g. 42) become "42"."""
+    return value if value is None or type(value) is str else str(value)
+
+
+def _epoch_seconds(value: Any) -> Optional[float]:
+    """Converts Unix timestamps and RFC 3339 strings (Go time.Time) to epoch seconds."""
+    if value is None or isinstance(value, (int, float)):
+        return value if value is None else float(value)
+    try:
+        # fromisoformat only accepts the "Z" UTC suffix from Python 3.11 on
+        if value[-1:] in ("Z", "z"):
+            value = value[:-1] + "+00:00"
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_event(raw: Any) -> CollectorEvent:
+    """
+    Builds a CollectorEvent from any event representation in use.
+
+    Accepts plain dicts in either the Go spelling (id/type/user_id/data) or the
+    legacy collector spelling (EventID/Action/UserID/Payload), typed JSON
+    structs and decoded protobuf messages (anything with a dict-style get()).
+    CollectorEvent instances are returned unchanged. A key holding null counts
+    as missing. Ids are always strings, so the unique event_id index of the
+    results collection and the by-id API lookup see one type.
+    """
+    if isinstance(raw, CollectorEvent):
+        return raw
+    # The Go spelling is checked first and inline; this runs once per ingested event.
+    get = raw.get
+    event_id = get("id")
+    if event_id is None:
+        event_id = _first(get, _ID_KEYS)
+    timestamp = get("timestamp")
+    if timestamp is None:
+        timestamp = get("Timestamp")
+    event_type = get("type")
+    if event_type is None:
+        event_type = _first(get, _TYPE_KEYS)
+    user_id = get("user_id")
+    if user_id is None:
+        user_id = get("UserID")
+    data = get("data")
+    if data is None:
+        data = _first(get, _DATA_KEYS)
+    return CollectorEvent(
+        _event_id(event_id),
+        _epoch_seconds(timestamp),
+        event_type,
+        user_id,
+        get("source_service"),
+        data if data is not None else {},
+    )
+
+
+def event_columns(batch: Sequence[Any]) -> Tuple[List[Any], List[Any], List[Mapping[str, Any]]]:
+    """
+    The ids, types and payloads of a batch of events, read as normalize_event
+    reads them but column by column, without building CollectorEvents (or
+    parsing timestamps). Events lacking a Go-spelled field go through
+    normalize_event.
+    """
+    if not set(map(type, batch)) <= {dict}:
+        events = [normalize_event(raw) for raw in batch]
+        return ([event.id for event in events], [event.type for event in events],
+                [event.data for event in events])
+    ids = [raw.get("id") for raw in batch]
+    if not set(map(type, ids)) <= {str}:
+        ids = [_event_id(event_id) for event_id in ids]
+    types = [raw.get("type") for raw in batch]
+    payloads = [raw.get("data") for raw in batch]
+    if None in ids or None in types or None in payloads:
+        for i, row in enumerate(zip(ids, types, payloads)):
+            if None in row:
+                event = normalize_event(batch[i])
+                ids[i], types[i], payloads[i] = event.id, event.type, event.data
+    return ids, types, payloads
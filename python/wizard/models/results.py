@@ -0,0 +1,42 @@
+# File: python/wizard/models/results.py
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .stored import scored_document
+
+
+@dataclass(slots=True)
+class AnalysisResult:
+    """
+    The outcome of analyzing one event, mirroring the Go AnalysisResult.
+
+    user_id is an addition used by the Analyzer service; it is omitted from
+    the serialized form when unset. event_type and rules (the name of the
+    rule file that scored the event) are only stored, see to_document().
+    """
+    event_id: Any
+    score: float
+    labels: List[str]
+    detail_message: str
+    processed_at: datetime
+    user_id: Optional[str] = None
+    event_type: Optional[str] = None
+    rules: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializes the result to the JSON document shape used by the API and MongoDB."""
+        doc = {"event_id": self.event_id}
+        if self.user_id is not None:
+            doc["user_id"] = self.user_id
+        doc["score"] = self.score
+        doc["labels"] = self.labels
+        doc["detail_message"] = self.detail_message
+        doc["processed_at"] = self.processed_at.isoformat()
+        return doc
+
+    def to_document(self) -> Dict[str, Any]:
+        """The compact document stored in MongoDB (see wizard.models.stored; expand_document() reverses it)."""
+        return scored_document(self.event_id, self.user_id, self.score, self.labels, self.event_type,
+                               self.rules, self.processed_at)
@@ -0,0 +1,140 @@
+# File: python/wizard/models/stored.py
+#
+# Versioned schema of the result documents stored in MongoDB.
+#
+# Version 1 documents carry "v": 1 and store
+#   - timestamps (processed_at, event_time) as native datetimes (BSON dates, UTC)
+#   - labels as integer codes of config/rules/labels.yaml (unknown labels as strings)
+#   - no detail_message for scored results: it is derived on read from the
+#     event type ("type") and the final labels with the rules that scored the
+#     event ("rules", the rule file's name)
+#   - the event payload (event_details) only if results.payload is "copy"
+# expand_document() turns them back into the JSON shape the API has always
+# returned; documents without "v" (written before the schema) are returned
+# as stored.
+
+import logging
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import yaml
+
+from wizard.core.rules import RULES_DIR, RuleError, rule_engine
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+LABELS_PATH = RULES_DIR / "labels.yaml"
+
+# Payload modes of analyzer.core's results (results.payload setting)
+PAYLOAD_COPY = "copy"
+PAYLOAD_NONE = "none"
+
+
+class LabelCodes:
+    """
+    Two-way mapping between result labels and their stored integer codes.
+
+    Codes are append-only: a stored code must keep its meaning, so codes are
+    never renumbered or reused. Labels without a code are stored as strings,
+    and codes unknown to this table are read back as their string form.
+    """
+
+    def __init__(self, codes: Mapping[str, int]):
+        self.codes = {str(label): int(code) for label, code in codes.items()}
+        self.names = {code: label for label, code in self.codes.items()}
+        if len(self.names) != len(self.codes):
+            raise ValueError("Label codes must be unique.")
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = LABELS_PATH) -> "LabelCodes":
+        with open(path, "r", encoding="utf-8") as fh:
+            spec = yaml.safe_load(fh) or {}
+        return cls(spec.get("codes") or {})
+
+    def encode(self, labels: Sequence[str]) -> List[Union[int, str]]:
+        codes = self.codes
+        return [codes.get(label, label) for label in labels]
+
+    def decode(self, values: Sequence[Union[int, str]]) -> List[str]:
+        names = self.names
+        return [names.get(value, str(value)) if isinstance(value, int) else value for value in values]
+
+
+_label_codes: Optional[LabelCodes] = None
+_label_codes_lock = threading.Lock()
+
+
+def label_codes() -> LabelCodes:
+    """The process-wide LabelCodes of LABELS_PATH, loaded on first use."""
+    global _label_codes
+    if _label_codes is None:
+        with _label_codes_lock:
+            if _label_codes is None:
+                _label_codes = LabelCodes.load()
+    return _label_codes
+
+
+def utc(value: datetime) -> datetime:
+    """An aware UTC datetime; naive values (as read from MongoDB) are UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def scored_document(event_id: Any, user_id: Optional[str], score: float, labels: Sequence[str],
+                    event_type: Optional[str], rules: Optional[str], processed_at: datetime) -> Dict[str, Any]:
+    """The version 1 document of a scored result (see AnalysisResult.to_document)."""
+    document = {"v": SCHEMA_VERSION, "event_id": event_id}
+    if user_id is not None:
+        document["user_id"] = user_id
+    document["score"] = score
+    document["labels"] = label_codes().encode(labels)
+    document["type"] = event_type
+    document["rules"] = rules
+    document["processed_at"] = utc(processed_at)
+    return document
+
+
+def _derived_detail(document: Mapping[str, Any], labels: Sequence[str]) -> str:
+    name = document.get("rules")
+    if not name:
+        return ""
+    try:
+        rules = rule_engine(name).current
+    except (OSError, RuleError) as e:
+        logger.warning(f"No detail message for result {document.get('event_id')}, rules '{name}' unavailable: {e}")
+        return ""
+    return rules.detail_for_labels(document.get("type"), labels)
+
+
+def detail_message(document: Mapping[str, Any]) -> Optional[str]:
+    """The detail message of a stored scored result of any version; None for other documents."""
+    if document.get("v") != SCHEMA_VERSION:
+        return document.get("detail_message")
+    if "score" not in document:
+        return None
+    return _derived_detail(document, label_codes().decode(document.get("labels") or ()))
+
+
+def expand_document(document: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The API shape of a stored result: ISO 8601 timestamps, label names and,
+    for scored results, the detail message. Documents of other schema
+    versions (and None) are returned as they are.
+    """
+    if document is None or document.get("v") != SCHEMA_VERSION:
+        return document
+    expanded = {}
+    for key, value in document.items():
+        if key in ("v", "type", "rules"):
+            continue
+        if isinstance(value, datetime):
+            value = utc(value).isoformat()
+        elif key == "labels":
+            value = label_codes().decode(value)
+        expanded[key] = value
+        if key == "labels" and "score" in document:
+            expanded["detail_message"] = _derived_detail(document, value)
+    return expanded
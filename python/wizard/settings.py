@@ -0,0 +1,452 @@
+# File: python/wizard/settings.py
+
+"""
+Typed, layered and memoized settings for the Python services.
+
+Settings are merged from, in increasing precedence:
+
+1. config/config.yaml (base defaults),
+2. config/<env>/config.yaml for the environment named by WIZARD_ENV
+   (dev/development/local, test, prod/production),
+3. environment variables, under the names the services have always read
+   (MONGODB_URI or MONGO_URI, ANALYZER_BATCH_SIZE, ...; see each field).
+
+get_settings() returns a frozen Settings object that is built once and
+rebuilt only when one of those environment variables changes. Fields marked
+hot (batch sizes, write buffering, log level) may also change while a service
+runs: settings_store.watch() re-reads the YAML files when they change, swaps
+in a new Settings whose structural values (brokers, URIs, pipeline mode,
+worker count...) stay as they were at startup, and calls the on_reload()
+callbacks so running components can apply the new values.
+"""
+
+import dataclasses
+import logging
+import os
+import threading
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# config/ at the repository root (next to python/, like config/rules in the
+# images); WIZARD_CONFIG_DIR points elsewhere.
+CONFIG_DIR = Path(os.environ.get("WIZARD_CONFIG_DIR", Path(__file__).resolve().parents[2] / "config"))
+
+# WIZARD_ENV value -> overlay directory under CONFIG_DIR
+ENVIRONMENTS = {
+    "dev": "dev", "development": "dev", "local": "dev",
+    "test": "test",
+    "prod": "prod", "production": "prod",
+}
+
+
+class SettingsError(ValueError):
+    """A setting has a value that cannot be converted to its type."""
+
+
+def setting(default: Any, *env: str, hot: bool = False):
+    """
+    A settings field. `env` lists the environment variables that set it (the
+    first one that is set and non-empty wins); hot fields may change at runtime.
+    """
+    return field(default=default, metadata={"env": env, "hot": hot})
+
+
+@dataclass(frozen=True)
+class ServiceSettings:
+    name: str = setting("Wizard-Analytics")
+    environment: str = setting("default", "WIZARD_ENV")
+    log_level: str = setting("INFO", "LOG_LEVEL", "WIZARD_LOG_LEVEL", hot=True)
+    # /health and /ready port of the consumer service (0 disables them)
+    health_port: int = setting(8080, "ANALYZER_HEALTH_PORT")
+    # Upper bound of the delay between restarts after fatal errors
+    restart_backoff_max: float = setting(30.0, "ANALYZER_RESTART_BACKOFF_MAX")
+    rules_reload_interval: float = setting(2.0, "ANALYZER_RULES_RELOAD_INTERVAL")
+    settings_reload_interval: float = setting(5.0, "WIZARD_SETTINGS_RELOAD_INTERVAL")
+
+
+@dataclass(frozen=True)
+class KafkaSettings:
+    # One broker or a comma-separated list
+    broker: str = setting("localhost:9092", "KAFKA_BROKER", "KAFKA_BROKERS")
+    topic_events: str = setting("events", "KAFKA_TOPIC", "KAFKA_INPUT_TOPIC")
+    group_id: str = setting("analyzer-group", "KAFKA_GROUP_ID")
+    # Broker version (e.g. "2.8.0"); skips the version probe on every consumer start
+    api_version: str = setting("", "WIZARD_KAFKA_API_VERSION")
+
+    @property
+    def brokers(self) -> List[str]:
+        return [broker.strip() for broker in self.broker.split(",") if broker.strip()]
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    # A full URI wins over host
+    host: str = setting("localhost:27017")
+    uri: str = setting("", "MONGODB_URI", "MONGO_URI")
+    name_raw: str = setting("wizard_raw")
+    name_analysis: str = setting("wizard_analysis", "MONGODB_ANALYSIS_DB", "MONGO_DB_NAME")
+    # Connection pool of the process-wide clients (wizard.utils.clients)
+    max_pool_size: int = setting(50, "WIZARD_MONGO_MAX_POOL_SIZE")
+    min_pool_size: int = setting(0, "WIZARD_MONGO_MIN_POOL_SIZE")
+    max_idle_ms: int = setting(60_000, "WIZARD_MONGO_MAX_IDLE_MS")
+    server_selection_timeout_ms: int = setting(2_000, "WIZARD_MONGO_SERVER_SELECTION_TIMEOUT_MS")
+    connect_timeout_ms: int = setting(2_000, "WIZARD_MONGO_CONNECT_TIMEOUT_MS")
+
+    @property
+    def mongodb_uri(self) -> str:
+        return self.uri or f"mongodb://{self.host}/"
+
+
+@dataclass(frozen=True)
+class PipelineSettings:
+    # "stream", "batch", "parallel", "partitioned" or "async" (see analyzer.core)
+    mode: str = setting("stream", "ANALYZER_PIPELINE_MODE")
+    batch_size: int = setting(500, "ANALYZER_BATCH_SIZE", hot=True)
+    linger_ms: int = setting(200, "ANALYZER_BATCH_LINGER_MS", hot=True)
+    # Worker processes of the parallel mode; 0 = one per CPU
+    workers: int = setting(0, "ANALYZER_WORKERS")
+    max_in_flight: int = setting(4, "ANALYZER_MAX_IN_FLIGHT")
+    lane_max_pending: int = setting(2000, "ANALYZER_LANE_MAX_PENDING", hot=True)
+    # Wire format of messages without a content-type header: "json" or "protobuf"
+    wire_format: str = setting("json", "ANALYZER_WIRE_FORMAT")
+    # Seconds to retry unreachable Kafka/MongoDB at startup
+    connect_timeout: float = setting(60.0, "ANALYZER_CONNECT_TIMEOUT")
+
+    def __post_init__(self):
+        # Names are case-insensitive
+        object.__setattr__(self, "mode", self.mode.lower())
+        object.__setattr__(self, "wire_format", self.wire_format.lower())
+
+    @property
+    def worker_count(self) -> int:
+        return self.workers or os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class WriterSettings:
+    flush_size: int = setting(500, "ANALYZER_WRITE_FLUSH_SIZE", hot=True)
+    flush_ms: int = setting(1000, "ANALYZER_WRITE_FLUSH_MS", hot=True)
+    buffer_size: int = setting(10_000, "ANALYZER_WRITE_BUFFER_SIZE", hot=True)
+    retries: int = setting(5, "ANALYZER_WRITE_RETRIES", hot=True)
+    upsert: bool = setting(False, "ANALYZER_WRITE_UPSERT")
+
+
+@dataclass(frozen=True)
+class ResultSettings:
+    # Event payload in analyzer.core's stored results: "copy" keeps it in
+    # event_details, "none" leaves it in the raw event archive (see wizard.models.stored)
+    payload: str = setting("copy", "ANALYZER_RESULT_PAYLOAD")
+
+
+@dataclass(frozen=True)
+class DedupSettings:
+    # Skip redelivered events before analysis (see analyzer.dedup)
+    enabled: bool = setting(True, "ANALYZER_DEDUP")
+    # Recently stored event_ids remembered in memory
+    window: int = setting(100_000, "ANALYZER_DEDUP_WINDOW")
+    # 0 keeps the window exact; otherwise a Bloom filter with this false positive rate
+    error_rate: float = setting(0.0, "ANALYZER_DEDUP_ERROR_RATE")
+    # Persisted per-partition high-water marks, saved at most every save_ms in stream mode
+    watermarks: bool = setting(True, "ANALYZER_DEDUP_WATERMARKS")
+    save_ms: int = setting(1000, "ANALYZER_DEDUP_SAVE_MS", hot=True)
+
+
+@dataclass(frozen=True)
+class ColumnarSettings:
+    # Parquet copy of the stored results for analytics (see analyzer.columnar; needs pyarrow)
+    enabled: bool = setting(False, "ANALYZER_PARQUET")
+    directory: str = setting("data/results", "ANALYZER_PARQUET_DIR")
+    # Rows per record batch (row group); buffered rows are written after flush_s at the latest
+    batch_rows: int = setting(10_000, "ANALYZER_PARQUET_BATCH_ROWS")
+    flush_s: float = setting(60.0, "ANALYZER_PARQUET_FLUSH_S")
+    # A file is closed and a new one started at this size or age
+    roll_mb: int = setting(128, "ANALYZER_PARQUET_ROLL_MB")
+    roll_s: float = setting(3600.0, "ANALYZER_PARQUET_ROLL_S")
+    compression: str = setting("zstd", "ANALYZER_PARQUET_COMPRESSION")
+
+
+@dataclass(frozen=True)
+class FeatureSettings:
+    # Per-user history for the velocity rules (see wizard.core.features and config/rules)
+    enabled: bool = setting(True, "WIZARD_FEATURES")
+    # Rolling window of the per-user counts, aggregated into bucket_s buckets
+    window_s: float = setting(600.0, "WIZARD_FEATURES_WINDOW_S")
+    bucket_s: float = setting(10.0, "WIZARD_FEATURES_BUCKET_S")
+    max_users: int = setting(100_000, "WIZARD_FEATURES_MAX_USERS")
+    ttl_s: float = setting(86_400.0, "WIZARD_FEATURES_TTL_S")
+    # Restored at startup and rewritten every snapshot_s seconds and on shutdown (empty disables)
+    snapshot_path: str = setting("", "WIZARD_FEATURES_SNAPSHOT")
+    snapshot_s: float = setting(60.0, "WIZARD_FEATURES_SNAPSHOT_S")
+
+
+@dataclass(frozen=True)
+class BaselineSettings:
+    # Per-service (or per-user) latency baselines scoring TELEMETRY events (see wizard.core.baselines)
+    enabled: bool = setting(True, "ANALYZER_BASELINES")
+    # EWMA weight of each new value; roughly the last 2 / alpha values count
+    alpha: float = setting(0.02, "ANALYZER_BASELINE_ALPHA", hot=True)
+    # Tail quantile a value is compared with, and values needed before a key is scored
+    quantile: float = setting(0.99, "ANALYZER_BASELINE_QUANTILE", hot=True)
+    min_samples: int = setting(30, "ANALYZER_BASELINE_MIN_SAMPLES", hot=True)
+    max_keys: int = setting(10_000, "ANALYZER_BASELINE_MAX_KEYS")
+    ttl_s: float = setting(86_400.0, "ANALYZER_BASELINE_TTL_S")
+    # Restored at startup and rewritten every snapshot_s seconds and on exit (empty disables)
+    snapshot_path: str = setting("", "ANALYZER_BASELINE_SNAPSHOT")
+    snapshot_s: float = setting(60.0, "ANALYZER_BASELINE_SNAPSHOT_S")
+
+
+@dataclass(frozen=True)
+class InferenceSettings:
+    # Model blended into the risk score (see wizard.core.inference): a .npz
+    # (NumpyModel) or .onnx file; empty disables the model
+    model_path: str = setting("", "WIZARD_MODEL_PATH")
+    # Comma-separated feature names, only needed for ONNX models
+    features: str = setting("", "WIZARD_MODEL_FEATURES")
+    # final = (1 - weight) * rule score + weight * model score
+    weight: float = setting(0.3, "WIZARD_MODEL_WEIGHT", hot=True)
+    # Single-event requests are batched up to max_batch, waiting at most max_wait_ms
+    max_batch: int = setting(64, "WIZARD_MODEL_MAX_BATCH", hot=True)
+    max_wait_ms: float = setting(2.0, "WIZARD_MODEL_MAX_WAIT_MS", hot=True)
+
+
+@dataclass(frozen=True)
+class CacheSettings:
+    results_size: int = setting(10_000, "WIZARD_RESULTS_CACHE_SIZE")
+    results_ttl: float = setting(30.0, "WIZARD_RESULTS_CACHE_TTL")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """All settings; each section is also a top-level key of the YAML files."""
+
+    service: ServiceSettings = field(default_factory=ServiceSettings)
+    kafka: KafkaSettings = field(default_factory=KafkaSettings)
+    database: DatabaseSettings = field(default_factory=DatabaseSettings)
+    pipeline: PipelineSettings = field(default_factory=PipelineSettings)
+    writer: WriterSettings = field(default_factory=WriterSettings)
+    results: ResultSettings = field(default_factory=ResultSettings)
+    dedup: DedupSettings = field(default_factory=DedupSettings)
+    columnar: ColumnarSettings = field(default_factory=ColumnarSettings)
+    features: FeatureSettings = field(default_factory=FeatureSettings)
+    baselines: BaselineSettings = field(default_factory=BaselineSettings)
+    inference: InferenceSettings = field(default_factory=InferenceSettings)
+    cache: CacheSettings = field(default_factory=CacheSettings)
+
+
+SECTIONS = {section.name: section.default_factory for section in dataclasses.fields(Settings)}
+ENV_VARS = tuple(
+    name
+    for section in SECTIONS.values()
+    for option in dataclasses.fields(section)
+    for name in option.metadata["env"]
+)
+
+
+def _convert(value: Any, type_: type, name: str) -> Any:
+    if type_ is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    try:
+        return type_(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError) as e:
+        raise SettingsError(f"Invalid value {value!r} for setting {name}: {e}") from e
+
+
+def layer_files(environ: Dict[str, str] = os.environ, config_dir: Union[str, Path] = CONFIG_DIR) -> List[Path]:
+    """The YAML layers for this environment, base first."""
+    config_dir = Path(config_dir)
+    files = [config_dir / "config.yaml"]
+    overlay = ENVIRONMENTS.get(environ.get("WIZARD_ENV", "").strip().lower())
+    if overlay:
+        files.append(config_dir / overlay / "config.yaml")
+    return files
+
+
+def _read_layer(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+    if not isinstance(data, dict):
+        raise SettingsError(f"{path} must contain a mapping")
+    return data
+
+
+def build_settings(environ: Dict[str, str] = os.environ, config_dir: Union[str, Path] = CONFIG_DIR) -> Settings:
+    """Builds Settings from the YAML layers and environment variables (no caching)."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for path in layer_files(environ, config_dir):
+        for section, values in _read_layer(path).items():
+            # Sections for other services (e.g. the Go collector) are ignored
+            if section in SECTIONS and isinstance(values, dict):
+                merged.setdefault(section, {}).update(values)
+
+    sections = {}
+    for section, cls in SECTIONS.items():
+        values = {}
+        for option in dataclasses.fields(cls):
+            name = f"{section}.{option.name}"
+            for variable in option.metadata["env"]:
+                if environ.get(variable):
+                    values[option.name] = _convert(environ[variable], option.type, variable)
+                    break
+            else:
+                if merged.get(section, {}).get(option.name) is not None:
+                    values[option.name] = _convert(merged[section][option.name], option.type, name)
+        sections[section] = cls(**values)
+    return Settings(**sections)
+
+
+def _keep_structural(current: Settings, new: Settings) -> Settings:
+    """new, with every field that is not hot reset to its current value."""
+    sections = {}
+    for section in SECTIONS:
+        old_values, new_values = getattr(current, section), getattr(new, section)
+        kept = {}
+        for option in dataclasses.fields(old_values):
+            old, value = getattr(old_values, option.name), getattr(new_values, option.name)
+            if not option.metadata["hot"] and value != old:
+                logger.warning(f"Setting {section}.{option.name} changed to {value!r}; it applies after a restart.")
+                kept[option.name] = old
+        sections[section] = dataclasses.replace(new_values, **kept)
+    return Settings(**sections)
+
+
+class SettingsStore:
+    """
+    Memoized Settings with hot reload (see the module docstring).
+
+    get() is cheap: it only rebuilds when a settings environment variable
+    changed, which in practice means once per process.
+    """
+
+    def __init__(self, config_dir: Union[str, Path] = CONFIG_DIR, environ: Dict[str, str] = os.environ,
+                 load_dotenv: bool = True):
+        self.config_dir = Path(config_dir)
+        self._environ = environ
+        self._load_dotenv = load_dotenv
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple] = None
+        self._current: Optional[Settings] = None
+        self._mtimes: Tuple = ()
+        self._callbacks: List[Callable[[], Optional[Callable[[Settings], None]]]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _environment_key(self) -> Tuple:
+        return tuple(self._environ.get(name) for name in ENV_VARS)
+
+    def _stat(self) -> Tuple:
+        mtimes = []
+        for path in layer_files(self._environ, self.config_dir):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def get(self) -> Settings:
+        """The current settings."""
+        key = self._environment_key()
+        if key == self._key:
+            return self._current
+        with self._lock:
+            if self._load_dotenv:
+                self._load_dotenv = False
+                _load_dotenv()
+                key = self._environment_key()
+            if key != self._key:
+                self._mtimes = self._stat()
+                self._current = build_settings(self._environ, self.config_dir)
+                self._key = key
+            return self._current
+
+    def reload(self) -> bool:
+        """
+        Re-reads the layers and applies changed hot values. Returns True (after
+        calling the on_reload callbacks) if anything changed.
+        """
+        current = self.get()
+        with self._lock:
+            self._mtimes = self._stat()
+            settings = _keep_structural(current, build_settings(self._environ, self.config_dir))
+            if settings == current:
+                return False
+            self._current = settings
+        logger.info("Reloaded settings.")
+        for callback in self._live_callbacks():
+            try:
+                callback(settings)
+            except Exception as e:
+                logger.error(f"Settings reload callback {callback!r} failed: {e}")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """reload() if a YAML layer changed on disk. Invalid files are logged and ignored."""
+        if self._stat() == self._mtimes:
+            return False
+        try:
+            return self.reload()
+        except (OSError, yaml.YAMLError, SettingsError) as e:
+            logger.error(f"Failed to reload settings, keeping the current ones: {e}")
+            return False
+
+    def on_reload(self, callback: Callable[[Settings], None]):
+        """
+        Registers callback(settings) for hot reloads. Bound methods are held
+        weakly, so registering does not keep their object alive.
+        """
+        if hasattr(callback, "__self__"):
+            self._callbacks.append(weakref.WeakMethod(callback))
+        else:
+            self._callbacks.append(lambda: callback)
+
+    def _live_callbacks(self) -> List[Callable[[Settings], None]]:
+        callbacks = [ref() for ref in self._callbacks]
+        self._callbacks = [ref for ref, callback in zip(self._callbacks, callbacks) if callback is not None]
+        return [callback for callback in callbacks if callback is not None]
+
+    def watch(self, interval: Optional[float] = None):
+        """Starts a daemon thread checking the YAML layers every `interval` seconds."""
+        if self._watcher is not None:
+            return
+        interval = interval or self.get().service.settings_reload_interval
+        self._stop.clear()
+
+        def poll():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=poll, name="settings-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+
+def _load_dotenv():
+    # A local .env file (development); python-dotenv is a dev-only dependency
+    try:
+        import dotenv
+    except ImportError:
+        return
+    dotenv.load_dotenv()
+
+
+# Process-wide settings
+settings_store = SettingsStore()
+
+
+def get_settings() -> Settings:
+    """The process's current Settings (see SettingsStore.get)."""
+    return settings_store.get()
@@ -0,0 +1,182 @@
+# File: python/wizard/transport.py
+
+from collections.abc import Mapping
+from typing import Any
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from google.protobuf.message import DecodeError
+
+from wizard.models import normalize_event
+from wizard.utils import codec
+
+# Wire formats understood by the analyzers
+JSON = "json"
+PROTOBUF = "protobuf"
+
+# Kafka header selecting the wire format of a single message; messages without
+# it use the consumer's configured default format.
+FORMAT_HEADER = "content-type"
+CONTENT_TYPES = {
+    b"application/json": JSON,
+    b"application/x-protobuf": PROTOBUF,
+    b"application/protobuf": PROTOBUF,
+}
+
+# Exceptions raised for malformed input in either format
+DECODE_ERRORS = codec.DECODE_ERRORS + (DecodeError,)
+
+
+def _build_event_class():
+    """
+    Builds the wizard.transport.Event message class at import time.
+
+    Mirrors shared/proto/transport.proto field for field (the transport tests
+    check the two stay in sync), so no generated code has to be checked in.
+    """
+    FieldProto = descriptor_pb2.FieldDescriptorProto
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="wizard/transport.proto", package="wizard.transport", syntax="proto3"
+    )
+    event = file_proto.message_type.add(name="Event")
+    entry = event.nested_type.add(name="PayloadEntry")
+    entry.options.map_entry = True
+    entry.field.add(name="key", number=1, type=FieldProto.TYPE_STRING, label=FieldProto.LABEL_OPTIONAL)
+    entry.field.add(name="value", number=2, type=FieldProto.TYPE_STRING, label=FieldProto.LABEL_OPTIONAL)
+
+    for name, number, field_type in (
+        ("event_id", 1, FieldProto.TYPE_STRING),
+        ("user_id", 2, FieldProto.TYPE_STRING),
+        ("timestamp", 3, FieldProto.TYPE_INT64),
+        ("action", 4, FieldProto.TYPE_STRING),
+    ):
+        event.field.add(name=name, number=number, type=field_type, label=FieldProto.LABEL_OPTIONAL)
+    event.field.add(
+        name="payload", number=5, type=FieldProto.TYPE_MESSAGE, label=FieldProto.LABEL_REPEATED,
+        type_name=".wizard.transport.Event.PayloadEntry",
+    )
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName("wizard.transport.Event"))
+
+
+Event = _build_event_class()
+
+
+def _coerce(value: str) -> Any:
+    """Recovers numbers from the string-only protobuf payload map."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class ProtoPayload(Mapping):
+    """
+    Read-only view over the payload map that converts values on access.
+
+    Rules usually read one or two keys, so values are coerced lazily instead
+    of copying the whole map into a dict. BSON encodes any Mapping, so the view
+    can be persisted as-is.
+    """
+
+    __slots__ = ("_map",)
+
+    def __init__(self, payload_map):
+        self._map = payload_map
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._map:
+            raise KeyError(key)
+        return _coerce(self._map[key])
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self._map:
+            return default
+        return _coerce(self._map[key])
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+
+class ProtoEvent:
+    """
+    Read-only adapter exposing a decoded Event through the dict-style get()
+    used by the analysis functions, without building an intermediate dict.
+
+    Every field spelling in use is understood: the Go JSON names (id, type,
+    user_id, data), the legacy collector names (EventID, UserID, Action,
+    Timestamp, Payload) and the proto names. Empty proto3 scalars count as
+    missing, so callers' defaults apply exactly as for JSON input.
+    """
+
+    __slots__ = ("message",)
+
+    _FIELDS = {
+        "id": "event_id", "EventID": "event_id", "event_id": "event_id",
+        "user_id": "user_id", "UserID": "user_id",
+        "type": "action", "Action": "action", "action": "action",
+        "timestamp": "timestamp", "Timestamp": "timestamp",
+    }
+    _PAYLOAD_KEYS = ("data", "Payload", "payload")
+
+    def __init__(self, message):
+        self.message = message
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._PAYLOAD_KEYS:
+            payload = self.message.payload
+            return ProtoPayload(payload) if payload else default
+        field = self._FIELDS.get(key)
+        if field is None:
+            return default
+        value = getattr(self.message, field)
+        return value if value else default
+
+
+def encode_event(event: Any) -> bytes:
+    """
+    Serializes an event (any representation accepted by normalize_event) as a
+    protobuf Event. Payload values are converted to strings, as the proto map requires.
+    """
+    event = normalize_event(event)
+    message = Event(
+        event_id=str(event.id or ""),
+        user_id=str(event.user_id or ""),
+        timestamp=int(event.timestamp or 0),
+        action=str(event.type or ""),
+    )
+    for key, value in event.data.items():
+        message.payload[str(key)] = str(value)
+    return message.SerializeToString()
+
+
+def message_format(headers, default_format: str = JSON) -> str:
+    """Determines the wire format of a Kafka message from its headers."""
+    for key, value in headers or ():
+        if key.lower() == FORMAT_HEADER:
+            return CONTENT_TYPES.get(value.lower() if value else value, default_format)
+    return default_format
+
+
+def decode_message(value: bytes, headers=None, default_format: str = JSON, typed: bool = False):
+    """
+    Decodes a Kafka message value in JSON or protobuf format.
+
+    Args:
+        value: Raw message bytes.
+        headers: Kafka headers as (key, bytes) pairs; may select the format.
+        default_format: Format used when no header is present.
+        typed: Use typed CollectorEvent decoding for JSON (see codec.decode_event).
+
+    Returns:
+        A dict-like event: a dict (or typed struct) for JSON, a ProtoEvent for protobuf.
+    """
+    if message_format(headers, default_format) == PROTOBUF:
+        message = Event()
+        message.ParseFromString(value)
+        return ProtoEvent(message)
+    return codec.decode_event(value) if typed else codec.loads(value)
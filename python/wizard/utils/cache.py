@@ -0,0 +1,181 @@
+# File: python/wizard/utils/cache.py
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Mapping, Optional
+
+
+def _spawn(coro: Awaitable[Any]) -> asyncio.Task:
+    """Runs a shared load in its own task, so no single caller's cancellation stops it."""
+    task = asyncio.ensure_future(coro)
+    # Retrieve the error of a load whose callers have all gone away
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    return task
+
+
+class AsyncReadThroughCache:
+    """
+    In-process LRU/TTL cache in front of an async loader.
+
+    Concurrent get() calls for a key that is not cached share one loader call
+    (request coalescing), so N simultaneous readers cost one backend read.
+    Loader results of None ("not found") are returned but not cached.
+
+    Loads run in their own task: a caller that is cancelled (including the
+    one that started the load) stops waiting, but the load goes on for the
+    other callers and still fills the cache.
+
+    invalidate() drops an entry; if a load for the key is in flight at that
+    moment, its result is still returned to the waiting callers but not cached,
+    so a stale read can never outlive an invalidation.
+
+    get_many() loads every missing key with one call to `bulk_loader` when one
+    is given (e.g. a single `$in` query), with the same coalescing rules.
+
+    Not thread-safe: use it from a single event loop.
+    """
+
+    def __init__(self, loader: Callable[[Hashable], Awaitable[Any]], max_entries: int = 10_000,
+                 ttl_seconds: float = 30.0, clock: Callable[[], float] = time.monotonic,
+                 bulk_loader: Optional[Callable[[List[Hashable]], Awaitable[Mapping[Hashable, Any]]]] = None):
+        self._loader = loader
+        self._bulk_loader = bulk_loader
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stale_loads = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cached(self, key: Hashable) -> tuple:
+        """Returns (True, value) for a fresh entry, (False, None) otherwise."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            del self._entries[key]
+            self.expirations += 1
+        return False, None
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for key, loading it (once for all concurrent callers) on a miss."""
+        hit, value = self._cached(key)
+        if hit:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            inflight = self._inflight[key] = _spawn(self._load(key))
+        # shield: a cancelled caller (even the one that started the load) must
+        # not cancel the load the others are waiting for
+        return await asyncio.shield(inflight)
+
+    async def _load(self, key: Hashable) -> Optional[Any]:
+        try:
+            value = await self._loader(key)
+            if value is not None and key not in self._stale_loads:
+                self._store(key, value)
+            return value
+        finally:
+            del self._inflight[key]
+            self._stale_loads.discard(key)
+
+    async def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Optional[Any]]:
+        """Returns {key: value or None} for the distinct keys, loading all misses at once."""
+        if self._bulk_loader is None:
+            keys = list(dict.fromkeys(keys))
+            values = await asyncio.gather(*(self.get(key) for key in keys))
+            return dict(zip(keys, values))
+
+        results: Dict[Hashable, Optional[Any]] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        futures: Dict[Hashable, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+        for key in dict.fromkeys(keys):
+            hit, value = self._cached(key)
+            if hit:
+                results[key] = value
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                self.misses += 1
+                futures[key] = self._inflight[key] = loop.create_future()
+
+        if futures:
+            _spawn(self._load_many(futures))
+            waiting.update(futures)
+        for key, future in waiting.items():
+            results[key] = await asyncio.shield(future)
+        return results
+
+    async def _load_many(self, futures: Dict[Hashable, asyncio.Future]):
+        try:
+            loaded = await self._bulk_loader(list(futures))
+        except BaseException as e:
+            for future in futures.values():
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            for key, future in futures.items():
+                value = loaded.get(key)
+                if value is not None and key not in self._stale_loads:
+                    self._store(key, value)
+                future.set_result(value)
+        finally:
+            for key in futures:
+                del self._inflight[key]
+                self._stale_loads.discard(key)
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drops the entry for key (and the result of any load for it in flight)."""
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+        if key in self._inflight:
+            self._stale_loads.add(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._stale_loads.update(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
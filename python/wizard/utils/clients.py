@@ -0,0 +1,215 @@
+# File: python/wizard/utils/clients.py
+
+"""
+Process-wide MongoDB clients, tuned Kafka settings and reconnect backoff.
+
+MongoDB clients are thread-safe connection pools, so every component of a
+process (API read path, consumer, result writer) shares one client per URI
+from `registry` instead of building its own. Clients are created lazily
+(connect=False: no sockets until the first operation) with tuned pool
+settings, reused after a ping when a component (re)starts, and forgotten in
+forked children, which must not share a parent's sockets.
+
+Kafka consumers cannot be shared (each one is a group member); for them this
+module provides tuned options and retry() to build them with exponential
+backoff instead of fixed sleeps.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from wizard.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+# One pool per process serves every thread; idle connections are closed
+# after a minute. Short selection/connect timeouts make a dead server fail
+# fast so the caller's backoff, not the driver, decides when to try again.
+# Pool sizes and timeouts are the `database` settings (see wizard.settings).
+def mongo_options() -> Dict[str, Any]:
+    """MongoClient keyword arguments for the process-wide clients."""
+    database = get_settings().database
+    return {
+        "maxPoolSize": database.max_pool_size,
+        "minPoolSize": database.min_pool_size,
+        "maxIdleTimeMS": database.max_idle_ms,
+        "serverSelectionTimeoutMS": database.server_selection_timeout_ms,
+        "connectTimeoutMS": database.connect_timeout_ms,
+        "retryWrites": True,
+    }
+
+
+# kafka-python consumer settings: reconnect to a restarted broker within a
+# second and refresh metadata quickly after a leader change.
+KAFKA_CONSUMER_OPTIONS = {
+    "reconnect_backoff_ms": 50,
+    "reconnect_backoff_max_ms": 1_000,
+    "retry_backoff_ms": 100,
+    "metadata_max_age_ms": 30_000,
+}
+
+def kafka_consumer_options(**overrides: Any) -> Dict[str, Any]:
+    """
+    KafkaConsumer keyword arguments: KAFKA_CONSUMER_OPTIONS updated with
+    overrides. Setting the broker version (kafka.api_version, e.g. "2.8.0")
+    skips the version probe that otherwise delays every consumer start.
+    """
+    options = dict(KAFKA_CONSUMER_OPTIONS)
+    api_version = get_settings().kafka.api_version
+    if api_version:
+        options["api_version"] = tuple(int(part) for part in api_version.split("."))
+    options.update(overrides)
+    return options
+
+
+class Backoff:
+    """
+    Exponentially growing delays with jitter: attempt n waits a random time
+    between half and all of min(maximum, initial * multiplier ** n).
+    """
+
+    def __init__(self, initial: float = 0.1, maximum: float = 5.0, multiplier: float = 2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.attempts = 0
+
+    def next(self) -> float:
+        cap = min(self.maximum, self.initial * self.multiplier ** self.attempts)
+        self.attempts += 1
+        return random.uniform(cap / 2, cap)
+
+    def reset(self):
+        self.attempts = 0
+
+
+def retry(func: Callable[[], Any], description: str, retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+          timeout: Optional[float] = None, backoff: Optional[Backoff] = None,
+          sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic) -> Any:
+    """
+    Calls func until it returns, sleeping with backoff after every `retry_on`
+    error. Re-raises the last error once `timeout` seconds have passed.
+    """
+    backoff = backoff or Backoff()
+    deadline = None if timeout is None else clock() + timeout
+    while True:
+        try:
+            return func()
+        except retry_on as e:
+            delay = backoff.next()
+            if deadline is not None and clock() + delay > deadline:
+                raise
+            logger.warning(f"{description} unavailable ({e}); retrying in {delay:.2f}s")
+            sleep(delay)
+
+
+async def async_retry(func: Callable[[], Awaitable[Any]], description: str,
+                      retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                      timeout: Optional[float] = None, backoff: Optional[Backoff] = None) -> Any:
+    """retry() for coroutines: awaits func() until it returns."""
+    backoff = backoff or Backoff()
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while True:
+        try:
+            return await func()
+        except retry_on as e:
+            delay = backoff.next()
+            if deadline is not None and loop.time() + delay > deadline:
+                raise
+            logger.warning(f"{description} unavailable ({e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class Unavailable(ConnectionError):
+    """A dependency did not pass its health check in time."""
+
+
+class ClientRegistry:
+    """Shared, lazily created MongoDB clients (sync and motor), one per URI and options."""
+
+    def __init__(self):
+        self._clients: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, uri: str, options: Dict[str, Any], factory: Callable[[], Any]) -> Any:
+        key = (kind, uri, tuple(sorted(options.items())))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = factory()
+            return client
+
+    def mongo(self, uri: str, **options: Any):
+        """The process's pymongo MongoClient for uri (mongo_options() updated with options)."""
+        from pymongo import MongoClient
+
+        settings = dict(mongo_options(), **options)
+        return self._get("mongo", uri, options, lambda: MongoClient(uri, connect=False, **settings))
+
+    def async_mongo(self, uri: str, **options: Any):
+        """The process's motor AsyncIOMotorClient for uri (mongo_options() updated with options)."""
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        settings = dict(mongo_options(), **options)
+        return self._get("motor", uri, options, lambda: AsyncIOMotorClient(uri, **settings))
+
+    def ping_mongo(self, uri: str, timeout: float = 1.0) -> bool:
+        """Health check: True if the server for uri answers a ping within timeout seconds."""
+        import pymongo
+        from pymongo.errors import PyMongoError
+
+        try:
+            with pymongo.timeout(timeout):
+                self.mongo(uri).admin.command("ping")
+            return True
+        except PyMongoError as e:
+            logger.debug(f"MongoDB ping failed: {e}")
+            return False
+
+    def wait_for_mongo(self, uri: str, timeout: Optional[float] = None, sleep: Callable[[float], None] = time.sleep):
+        """
+        Returns the shared client for uri once it answers a ping, retrying with
+        backoff; raises Unavailable after `timeout` seconds.
+        """
+        def check():
+            if not self.ping_mongo(uri):
+                raise Unavailable(f"no answer from {uri}")
+
+        retry(check, "MongoDB", retry_on=(Unavailable,), timeout=timeout, sleep=sleep)
+        return self.mongo(uri)
+
+    async def async_wait_for_mongo(self, uri: str, timeout: Optional[float] = None):
+        """wait_for_mongo() for asyncio code, using the motor client."""
+        from pymongo.errors import PyMongoError
+
+        client = self.async_mongo(uri)
+        await async_retry(lambda: client.admin.command("ping"), "MongoDB",
+                          retry_on=(PyMongoError,), timeout=timeout)
+        return client
+
+    def close(self):
+        """Closes every client (e.g. on service shutdown)."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def _forget(self):
+        # Forked child: the parent's clients (and their sockets) stay with the parent.
+        self._clients = {}
+        self._lock = threading.Lock()
+
+
+# Process-wide registry
+registry = ClientRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry._forget)
@@ -0,0 +1,166 @@
+# File: python/wizard/utils/codec.py
+
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Optional fast JSON backends. The stdlib codec is always available.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - depends on the environment
+    msgspec = None
+
+
+class StdlibCodec:
+    """JSON codec backed by the standard library json module."""
+
+    name = "json"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # json.loads(bytes) runs encoding detection first; an explicit UTF-8
+        # decode is measurably faster for the stdlib parser.
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, default=str)
+
+    def decode_event(self, data: Union[bytes, str]) -> Dict[str, Any]:
+        return self.loads(data)
+
+
+class OrjsonCodec:
+    """JSON codec backed by orjson."""
+
+    name = "orjson"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+
+    def decode_event(self, data: Union[bytes, str]) -> Dict[str, Any]:
+        return orjson.loads(data)
+
+
+if msgspec is not None:
+    class CollectorEventStruct(msgspec.Struct, gc=False):
+        """
+        Typed decoding target mirroring the Go CollectorEvent (go/pkg/models/data.go).
+
+        Holds every key normalize_event reads, in the Go and the legacy
+        collector spelling (EventID/Timestamp/Action/UserID/Payload); other
+        keys are skipped while parsing. Values are not validated (ids and
+        timestamps may be strings or numbers), matching untyped decoding.
+        Fields missing from the message stay UNSET; get() mimics dict.get so
+        analysis code written against plain dicts keeps working.
+        """
+        id: Any = msgspec.UNSET
+        timestamp: Any = msgspec.UNSET
+        type: Any = msgspec.UNSET
+        user_id: Any = msgspec.UNSET
+        source_service: Any = msgspec.UNSET
+        data: Any = msgspec.UNSET
+        event_id: Any = msgspec.UNSET
+        action: Any = msgspec.UNSET
+        payload: Any = msgspec.UNSET
+        EventID: Any = msgspec.UNSET
+        Timestamp: Any = msgspec.UNSET
+        Action: Any = msgspec.UNSET
+        UserID: Any = msgspec.UNSET
+        Payload: Any = msgspec.UNSET
+
+        def get(self, key: str, default: Any = None) -> Any:
+            value = getattr(self, key, msgspec.UNSET)
+            return default if value is msgspec.UNSET else value
+
+
+class MsgspecCodec:
+    """JSON codec backed by msgspec, with typed CollectorEvent decoding."""
+
+    name = "msgspec"
+
+    def __init__(self):
+        self._decoder = msgspec.json.Decoder()
+        self._event_decoder = msgspec.json.Decoder(CollectorEventStruct)
+        self._encoder = msgspec.json.Encoder(enc_hook=str)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._decoder.decode(data)
+
+    def dumps(self, obj: Any) -> str:
+        return self._encoder.encode(obj).decode("utf-8")
+
+    def decode_event(self, data: Union[bytes, str]) -> Union["CollectorEventStruct", Any]:
+        try:
+            return self._event_decoder.decode(data)
+        except msgspec.ValidationError:
+            # Valid JSON that is not an object: decoded as is, like the other codecs
+            return self._decoder.decode(data)
+
+
+CODECS = {
+    "json": StdlibCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+
+# Exceptions raised by any backend for malformed input
+DECODE_ERRORS = (ValueError, UnicodeDecodeError) + ((msgspec.DecodeError,) if msgspec is not None else ())
+
+
+def available_codecs():
+    """Returns the names of the codecs usable in this environment."""
+    names = ["json"]
+    if orjson is not None:
+        names.append("orjson")
+    if msgspec is not None:
+        names.append("msgspec")
+    return names
+
+
+def get_codec(name: Optional[str] = None):
+    """
+    Creates a codec by name ("json", "orjson", "msgspec").
+
+    Without a name the WIZARD_JSON_CODEC environment variable is used; if that
+    is unset (or "auto") the fastest installed backend is picked, falling back
+    to the standard library.
+    """
+    name = (name or os.environ.get("WIZARD_JSON_CODEC", "auto")).lower()
+    if name == "auto":
+        name = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+    if name not in available_codecs():
+        logger.warning(f"JSON codec '{name}' is not available, falling back to the standard library.")
+        name = "json"
+    return CODECS[name]()
+
+
+# Process-wide default codec, plus module-level (and therefore picklable)
+# shortcuts for hot paths such as Kafka deserializers and worker processes.
+default_codec = get_codec()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decodes a JSON document (bytes or str) with the default codec."""
+    return default_codec.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """Encodes obj to a JSON string with the default codec."""
+    return default_codec.dumps(obj)
+
+
+def decode_event(data: Union[bytes, str]):
+    """Decodes a CollectorEvent-shaped message, typed when the backend supports it."""
+    return default_codec.decode_event(data)
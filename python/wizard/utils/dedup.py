@@ -0,0 +1,118 @@
+# File: python/wizard/utils/dedup.py
+
+import hashlib
+import math
+from collections import deque
+from typing import Hashable, Union
+
+
+class RecentIds:
+    """
+    Exact set of the last `capacity` ids added (oldest forgotten first).
+
+    Costs roughly 100 bytes per id (set entry, deque slot and the id itself);
+    use BloomFilter for windows of millions of ids.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._ids = set()
+        self._order = deque()
+
+    def __contains__(self, event_id: Hashable) -> bool:
+        return event_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, event_id: Hashable):
+        if event_id in self._ids:
+            return
+        self._ids.add(event_id)
+        self._order.append(event_id)
+        if len(self._order) > self.capacity:
+            self._ids.discard(self._order.popleft())
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory use."""
+        return 100 * len(self._ids)
+
+
+class _Bits:
+    """A fixed-size Bloom filter generation."""
+
+    def __init__(self, size: int, hashes: int):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+        self.count = 0
+
+    def positions(self, event_id: Hashable):
+        # Double hashing (Kirsch-Mitzenmacher) from one 128-bit digest
+        digest = hashlib.blake2b(str(event_id).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def has(self, positions) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def set(self, positions):
+        bits = self.bits
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class BloomFilter:
+    """
+    Approximate set of the most recent ids, for windows too large to keep exactly.
+
+    Two generations sized for `capacity` ids each are kept; once the current
+    one holds `capacity` ids the older one is discarded, so the window covers
+    the last `capacity` to 2 * `capacity` ids. Membership has no false
+    negatives within the window and a false positive rate of about
+    `error_rate` (split between the generations). Memory is
+    2 * capacity * -ln(error_rate / 2) / ln(2)^2 bits, e.g. about 4 MB for
+    a million ids at 0.1%.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1, got {error_rate}")
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        generation_rate = error_rate / 2
+        self._size = max(8, math.ceil(-self.capacity * math.log(generation_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / self.capacity * math.log(2)))
+        self._current = _Bits(self._size, self._hashes)
+        self._previous = None
+
+    def __contains__(self, event_id: Hashable) -> bool:
+        positions = self._current.positions(event_id)
+        return self._current.has(positions) or (self._previous is not None and self._previous.has(positions))
+
+    def __len__(self) -> int:
+        return self._current.count + (self._previous.count if self._previous is not None else 0)
+
+    def add(self, event_id: Hashable):
+        positions = self._current.positions(event_id)
+        if self._current.has(positions):
+            return
+        if self._current.count >= self.capacity:
+            self._previous, self._current = self._current, _Bits(self._size, self._hashes)
+        self._current.set(positions)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of both generations."""
+        return 2 * len(self._current.bits)
+
+
+def recent_ids(capacity: int, error_rate: float = 0.0) -> Union[RecentIds, BloomFilter]:
+    """A window over the last `capacity` ids: exact for error_rate 0, else a BloomFilter."""
+    if error_rate:
+        return BloomFilter(capacity, error_rate)
+    return RecentIds(capacity)
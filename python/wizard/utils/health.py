@@ -0,0 +1,78 @@
+# File: python/wizard/utils/health.py
+
+"""
+Liveness and readiness endpoints for services without a web framework
+(e.g. the Kafka consumer), for Kubernetes probes.
+
+GET /health answers 200 while the process runs; GET /ready answers 200 once
+the service reported its dependencies ready (set_ready()) and 503 before
+that or after set_ready(False). Built on socketserver instead of http.server,
+which would add tens of milliseconds of imports to the cold start.
+"""
+
+import logging
+import socketserver
+import threading
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {200: b"OK", 404: b"Not Found", 503: b"Service Unavailable"}
+
+
+class _ProbeHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request_line = self.rfile.readline(1024).split()
+        # Drain the headers; probes send no body
+        while self.rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line[1].split(b"?", 1)[0] if len(request_line) > 1 else b""
+        if path == b"/health":
+            status = 200
+        elif path == b"/ready":
+            status = 200 if self.server.ready.is_set() else 503
+        else:
+            status = 404
+        body = _REASONS[status].lower() + b"\n"
+        self.wfile.write(
+            b"HTTP/1.1 %d %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s"
+            % (status, _REASONS[status], len(body), body)
+        )
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class HealthServer:
+    """Serves /health and /ready on `port` (0 picks a free port) from a daemon thread."""
+
+    def __init__(self, port: int, host: str = "0.0.0.0"):
+        self._server = _Server((host, port), _ProbeHandler, bind_and_activate=False)
+        self._server.ready = threading.Event()
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "HealthServer":
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="health-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Health endpoints listening on port {self.port}.")
+        return self
+
+    def set_ready(self, ready: bool = True):
+        if ready:
+            self._server.ready.set()
+        else:
+            self._server.ready.clear()
+
+    def close(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
@@ -1,12 +1,30 @@
+import atexit
 import logging
-import json
-from datetime import datetime, timezone
+import logging.handlers
+import os
+import queue
+import random
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from wizard.utils import codec
+
+# Standard LogRecord attributes; anything else in record.__dict__ came from `extra`.
+_RESERVED_ATTRS = frozenset([
+    'name', 'levelno', 'levelname', 'pathname', 'filename',
+    'module', 'exc_info', 'exc_text', 'stack_info', 'lineno',
+    'funcName', 'created', 'asctime', 'msecs', 'relativeCreated',
+    'thread', 'threadName', 'process', 'processName', 'taskName',
+    'message', 'msg', 'args',
+])
 
 # Define a custom formatter to output logs in a JSON structure
 class JsonFormatter(logging.Formatter):
     """A custom logging formatter that outputs records as JSON objects."""
-    
+
     def format(self, record):
         # Base log data
         log_record = {
@@ -21,46 +39,206 @@ class JsonFormatter(logging.Formatter):
         # Handle exception information if present
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        
+
         # Add extra fields (stored in record.__dict__)
         for key, value in record.__dict__.items():
-            if key not in ['name', 'levelno', 'levelname', 'pathname', 'filename', 
-                           'module', 'exc_info', 'exc_text', 'stack_info', 'lineno', 
-                           'funcName', 'created', 'asctime', 'msecs', 'relativeCreated', 
-                           'thread', 'threadName', 'process', 'message', 'msg', 'args']:
+            if key not in _RESERVED_ATTRS:
                 log_record[key] = value
 
-        return json.dumps(log_record)
+        return codec.dumps(log_record)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-logger rate limiting and sampling of log records.
+
+    Settings apply to a logger and its children ("wizard.core" covers
+    "wizard.core.analysis_engine"); the most specific configured name wins.
+    Rate limits are token buckets of `rate` records per second with a burst of
+    one second's worth. Sampling keeps each record with the given probability.
+    Records at WARNING and above are never dropped.
+    """
+
+    def __init__(self, rate_limits: Optional[Dict[str, float]] = None,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rate_limits = dict(rate_limits or {})
+        self.sample_rates = dict(sample_rates or {})
+        self.dropped = 0
+        self._policies: Dict[str, Tuple[Optional[list], float]] = {}
+        self._buckets: Dict[str, list] = {}  # configured name -> [rate, tokens, last refill]
+        self._lock = threading.Lock()
+
+    def _lookup(self, settings: Dict[str, float], name: str) -> Optional[str]:
+        while name:
+            if name in settings:
+                return name
+            name = name.rpartition('.')[0]
+        return None
+
+    def _policy(self, name: str) -> Tuple[Optional[list], float]:
+        """Resolves (token bucket or None, sample rate) once per logger name."""
+        policy = self._policies.get(name)
+        if policy is None:
+            limited = self._lookup(self.rate_limits, name)
+            bucket = None
+            if limited is not None:
+                # Buckets are shared by every logger under the configured name.
+                bucket = self._buckets.get(limited)
+                if bucket is None:
+                    rate = self.rate_limits[limited]
+                    bucket = self._buckets[limited] = [rate, rate, time.monotonic()]
+            sampled = self._lookup(self.sample_rates, name)
+            policy = self._policies[name] = (bucket, self.sample_rates[sampled] if sampled is not None else 1.0)
+        return policy
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        bucket, sample_rate = self._policy(record.name)
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            self.dropped += 1
+            return False
+        if bucket is not None:
+            with self._lock:
+                rate, tokens, last = bucket
+                now = time.monotonic()
+                tokens = min(rate, tokens + (now - last) * rate)
+                if tokens < 1.0:
+                    bucket[1], bucket[2] = tokens, now
+                    self.dropped += 1
+                    return False
+                bucket[1], bucket[2] = tokens - 1.0, now
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats every record on the calling thread before
+    enqueueing it; this one only merges %-style arguments into the message.
+    The queue is bounded: when it is full, records are dropped (and counted)
+    instead of blocking the caller.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
 
-def setup_logging(level: str = "INFO"):
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_settings(value: str) -> Dict[str, float]:
+    """Parses "logger=value,other.logger=value" into a dict."""
+    settings = {}
+    for item in value.split(','):
+        name, sep, setting = item.strip().partition('=')
+        if sep:
+            settings[name.strip()] = float(setting)
+    return settings
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DeferredQueueHandler] = None
+
+
+def stop_logging():
+    """Flushes queued records and stops the background logging thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+
+def _restart_listener_in_child():
+    """Forked children (e.g. worker pools) inherit the handler but not the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.Queue(_queue_handler.queue.maxsize)
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_listener.handlers)
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
+
+
+def setup_logging(level: str = "INFO", queued: Optional[bool] = None, queue_size: int = 10_000,
+                  rate_limits: Optional[Dict[str, float]] = None,
+                  sample_rates: Optional[Dict[str, float]] = None,
+                  formatter: Optional[logging.Formatter] = None):
     """
     Configures the root Python logger with a stream handler and JSON formatter.
+
+    Args:
+        level: Root log level.
+        queued: Format and write records on a background thread behind a
+            bounded queue (WIZARD_LOG_QUEUE, on by default).
+        queue_size: Queue capacity; records beyond it are dropped.
+        rate_limits: {logger name: records per second} (WIZARD_LOG_RATE_LIMITS,
+            e.g. "wizard.core.analysis_engine=100").
+        sample_rates: {logger name: fraction of records kept}
+            (WIZARD_LOG_SAMPLE_RATES, e.g. "wizard.core=0.01").
+        formatter: Formatter for the output stream (defaults to JsonFormatter).
     """
+    global _listener, _queue_handler
     root_logger = logging.getLogger()
     root_logger.setLevel(level.upper())
 
     if root_logger.hasHandlers():
         return
 
+    if queued is None:
+        queued = os.environ.get("WIZARD_LOG_QUEUE", "1").lower() not in ("0", "false", "no")
+    if rate_limits is None:
+        rate_limits = _parse_settings(os.environ.get("WIZARD_LOG_RATE_LIMITS", ""))
+    if sample_rates is None:
+        sample_rates = _parse_settings(os.environ.get("WIZARD_LOG_SAMPLE_RATES", ""))
+
     handler = logging.StreamHandler(sys.stdout)
-    formatter = JsonFormatter()
-    handler.setFormatter(formatter)
+    handler.setFormatter(formatter or JsonFormatter())
+
+    if queued:
+        _queue_handler = DeferredQueueHandler(queue.Queue(queue_size))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, handler)
+        _listener.start()
+        atexit.register(stop_logging)
+        handler = _queue_handler
+    if rate_limits or sample_rates:
+        handler.addFilter(RateLimitFilter(rate_limits, sample_rates))
     root_logger.addHandler(handler)
-    
+
     # Suppress verbose logs from external libraries
     logging.getLogger('uvicorn').setLevel(logging.WARNING)
     logging.getLogger('fastapi').setLevel(logging.WARNING)
     logging.getLogger('asyncpg').setLevel(logging.WARNING)
 
-    root_logger.info("Logging configured with JSON output.", extra={'config_level': level})
+    root_logger.info("Logging configured.", extra={'config_level': level, 'queued': queued})
+
+def set_level(level: str):
+    """Changes the root log level of a running process (e.g. after a settings reload)."""
+    logging.getLogger().setLevel(level.upper())
 
 # --- Example Usage (Self-test) ---
 if __name__ == "__main__":
     setup_logging(level="DEBUG")
     logger = logging.getLogger("wizard.main")
-    
+
     logger.info("Application started.", extra={'api_port': 8000})
-    
+
     try:
         1 / 0
     except ZeroDivisionError as e:
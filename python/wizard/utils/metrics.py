@@ -0,0 +1,428 @@
+# File: python/wizard/utils/metrics.py
+
+"""
+Counters, gauges and fixed-bucket histograms with Prometheus text exposition.
+
+Updates are lock-free on the hot path: every thread writes to its own cell
+(a plain list) and readers sum the cells when metrics are rendered.
+
+Process safety: when WIZARD_METRICS_DIR is set, every process (API workers,
+analysis worker processes) periodically writes a snapshot of its metrics to
+<dir>/<pid>.json and render() merges the snapshots of all processes.
+Counters and histograms of exited processes keep counting; gauges only
+include live processes. Empty the directory when the service starts.
+"""
+
+import atexit
+import json
+import multiprocessing.util
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: sub-millisecond stages up to multi-second writes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Record counts per batch
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+METRICS_DIR_ENV = "WIZARD_METRICS_DIR"
+FLUSH_INTERVAL_ENV = "WIZARD_METRICS_FLUSH_INTERVAL"
+
+
+class _Cells:
+    """
+    Per-thread value cells of one metric child; summed on read.
+
+    Subclasses fetch their cell inline (`self._local.cell`, falling back to
+    _new_cell() on a thread's first update) since every call layer counts
+    on the hot path.
+    """
+
+    __slots__ = ("_width", "_local", "_cells", "_cells_lock")
+
+    def __init__(self, width: int):
+        self._width = width
+        self._local = threading.local()
+        self._cells: List[list] = []
+        self._cells_lock = threading.Lock()
+
+    def _new_cell(self) -> list:
+        cell = self._local.cell = [0] * self._width
+        with self._cells_lock:
+            self._cells.append(cell)
+        return cell
+
+    def values(self) -> list:
+        totals = [0] * self._width
+        with self._cells_lock:
+            cells = list(self._cells)
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+    def reset(self):
+        with self._cells_lock:
+            for cell in self._cells:
+                cell[:] = [0] * self._width
+
+
+class _Timer:
+    """Context manager observing the elapsed wall time into a histogram."""
+
+    __slots__ = ("_observe", "_start")
+
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observe(perf_counter() - self._start)
+
+
+class _CounterChild(_Cells):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1):
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:
+            self._new_cell()[0] += amount
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self._value -= amount
+
+    def values(self) -> list:
+        return [self._value]
+
+    def reset(self):
+        self._value = 0.0
+
+
+class _HistogramChild(_Cells):
+    # Cell layout: one count per bucket (the last is +Inf), then sum, then count.
+    __slots__ = ("_bounds",)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        super().__init__(len(bounds) + 3)
+        self._bounds = bounds
+
+    def observe(self, value: float):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[bisect_left(self._bounds, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def time(self) -> _Timer:
+        """Times a `with` block."""
+        return _Timer(self.observe)
+
+
+class _Metric:
+    """A metric family: one child per combination of label values."""
+
+    kind = ""
+    # Methods of the child that an unlabelled metric exposes directly
+    _methods: Tuple[str, ...] = ()
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Unlabelled metrics expose their only child's methods directly.
+            child = self.labels()
+            for method in self._methods:
+                setattr(self, method, getattr(child, method))
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Returns the child for the given label values (bind it once on hot paths)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+        return child
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], list]]:
+        with self._lock:
+            children = list(self._children.items())
+        return [(values, child.values()) for values, child in children]
+
+    def reset(self):
+        with self._lock:
+            for child in self._children.values():
+                child.reset()
+
+    def describe(self) -> dict:
+        return {"kind": self.kind, "help": self.documentation, "labelnames": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    """Monotonically increasing value (name it *_total)."""
+
+    kind = "counter"
+    _methods = ("inc",)
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    """Value that can go up and down. Updates take a lock; keep them off per-event paths."""
+
+    kind = "gauge"
+    _methods = ("set", "inc", "dec")
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed, cumulative buckets."""
+
+    kind = "histogram"
+    _methods = ("observe", "time")
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def describe(self) -> dict:
+        return dict(super().describe(), buckets=list(self.buckets))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int) or (value.is_integer() and abs(value) < 1e15):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    """Named metrics of this process, with optional cross-process aggregation."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.directory: Optional[str] = None
+        self.flush_interval = 5.0
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **options) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **options)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a different {metric.kind}.")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def reset(self):
+        """Zeroes every metric (kept registered)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def snapshot(self) -> dict:
+        """JSON-serializable {name: description + samples} of this process's metrics."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {}
+        for metric in metrics:
+            entry = metric.describe()
+            entry["samples"] = [[list(values), totals] for values, totals in metric.samples()]
+            snapshot[metric.name] = entry
+        return snapshot
+
+    # --- Cross-process aggregation ---
+
+    def enable_multiprocess(self, directory: str, flush_interval: float = 5.0):
+        """
+        Writes this process's snapshot to <directory>/<pid>.json every
+        `flush_interval` seconds (and at exit) and makes render() merge the
+        snapshots of every process. Forked children start from zero and flush
+        their own file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        atexit.register(self.flush)
+        self._start_flusher()
+
+    def _start_flusher(self):
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Atomically writes this process's snapshot file (multiprocess mode only)."""
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _after_fork_in_child(self):
+        self.reset()
+        if self.directory is not None:
+            self._start_flusher()
+
+    def _register_finalizer(self):
+        # multiprocessing children exit through os._exit, skipping atexit.
+        if self.directory is not None:
+            multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+
+    def _process_snapshots(self) -> List[Tuple[bool, dict]]:
+        """(alive, snapshot) of every other process that wrote a snapshot file."""
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            pid, ext = os.path.splitext(filename)
+            if ext != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshots.append((_pid_alive(int(pid)), json.load(f)))
+            except (OSError, ValueError):
+                continue  # removed or replaced while listing
+        return snapshots
+
+    def collect(self) -> dict:
+        """This process's snapshot merged with those of other processes (if enabled)."""
+        merged = self.snapshot()
+        if self.directory is None:
+            return merged
+        for alive, snapshot in self._process_snapshots():
+            for name, entry in snapshot.items():
+                if entry["kind"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, dict(entry, samples=[]))
+                if target["kind"] != entry["kind"] or target.get("buckets") != entry.get("buckets"):
+                    continue
+                samples = {tuple(values): totals for values, totals in target["samples"]}
+                for values, totals in entry["samples"]:
+                    current = samples.get(tuple(values))
+                    samples[tuple(values)] = totals if current is None else [a + b for a, b in zip(current, totals)]
+                target["samples"] = [[list(values), totals] for values, totals in samples.items()]
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition (format 0.0.4) of collect()."""
+        lines = []
+        for name, entry in sorted(self.collect().items()):
+            labelnames = entry["labelnames"]
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['kind']}")
+            for values, totals in entry["samples"]:
+                if entry["kind"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(totals[0])}")
+                    continue
+                cumulative = 0
+                bounds = [repr(float(b)) for b in entry["buckets"]] + ["+Inf"]
+                for bound, count in zip(bounds, totals):
+                    cumulative += count
+                    labels = _format_labels(labelnames, values, ("le", bound))
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(labelnames, values)
+                lines.append(f"{name}_sum{labels} {_format_value(totals[-2])}")
+                lines.append(f"{name}_count{labels} {totals[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide default registry
+REGISTRY = Registry()
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=REGISTRY._after_fork_in_child)
+multiprocessing.util.register_after_fork(REGISTRY, Registry._register_finalizer)
+
+if os.environ.get(METRICS_DIR_ENV):
+    REGISTRY.enable_multiprocess(
+        os.environ[METRICS_DIR_ENV],
+        flush_interval=float(os.environ.get(FLUSH_INTERVAL_ENV, "5")),
+    )